@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Rewrite a real .mbox into a synthetic one with the same structure, sizes, threads and date spacing.
+Usage: python3 anonymize-mbox.py <input.mbox> <output> [--key SECRET] [--workers N] [--shift-weeks N]
+Example: python3 anonymize-mbox.py ~/export/inbox.mbox anonymized.mbox --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from mboxgen import anonymize
+from mboxgen import sinks
+
+
+def print_report(output, totals, seconds):
+    size_mb = totals["input_bytes"] / 1024 / 1024
+    print(f"\n✅ Anonymized {totals['messages']:,} messages into {output}")
+    print(f"   Size: {size_mb:,.2f} MB in, {totals['output_bytes'] / 1024 / 1024:,.2f} MB out")
+    print(
+        f"   MIME: {totals['multipart']:,} multiparts, {totals['text_parts']:,} text parts, "
+        f"{totals['attachments']:,} attachments, {totals['nested_messages']:,} attached messages"
+    )
+    print(f"   Message-IDs remapped: {totals['message_ids']:,}, dates shifted: {totals['dates']:,}")
+    print(f"   Rewritten in {seconds:.1f}s ({size_mb / max(seconds, 1e-9):.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rewrite a real .mbox into a synthetic one with the same structure, sizes, threads and date spacing.",
+        epilog="Example: python3 anonymize-mbox.py ~/export/inbox.mbox anonymized.mbox --workers 8",
+    )
+    parser.add_argument("input_file", help="Path of the .mbox file to anonymize")
+    parser.add_argument("output_file", help='Path of the .mbox file to write, "-" for stdout, a named pipe, or tcp://host:port / unix:/path')
+    parser.add_argument(
+        "--key",
+        default=None,
+        help="Secret the replacements are derived from; the same key gives the same output (default: a new random key)",
+    )
+    parser.add_argument(
+        "--shift-weeks",
+        type=int,
+        default=None,
+        help=f"Move dates back this many weeks (default: 1 to {anonymize.MAX_SHIFT_WEEKS}, derived from the key)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--chunk-mb",
+        type=int,
+        default=anonymize.CHUNK_BYTES // 1024 // 1024,
+        help="Input handed to a worker at a time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=("gzip", "zstd"),
+        default=None,
+        help="Compress the output (default: inferred from a .gz / .zst output name)",
+    )
+    parser.add_argument("--json", default=None, metavar="PATH", help="Also write the totals as JSON")
+    args = parser.parse_args()
+    sinks.reserve_stdout(args.output_file)
+
+    if not os.path.isfile(args.input_file):
+        print(f"Error: {args.input_file} is not a file")
+        sys.exit(1)
+    if os.path.exists(args.output_file) and os.path.samefile(args.input_file, args.output_file):
+        print("Error: the output must not be the input file")
+        sys.exit(1)
+    if args.workers < 1 or args.chunk_mb < 1:
+        print("Error: --workers and --chunk-mb must be at least 1")
+        sys.exit(1)
+    if args.shift_weeks is not None and args.shift_weeks < 0:
+        print("Error: --shift-weeks must not be negative")
+        sys.exit(1)
+    try:
+        compression = sinks.infer_compression(args.output_file, args.compress)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    key = anonymize.derive_key(args.key) if args.key is not None else os.urandom(32)
+    size = os.path.getsize(args.input_file)
+    print(f"Anonymizing {args.input_file} ({size / 1024 / 1024:,.1f} MB) with {args.workers} worker(s)...")
+    if args.key is None:
+        print("  - Random key: pass --key to make the output reproducible")
+
+    def on_chunk(totals):
+        done = totals["input_bytes"] / max(size, 1) * 100
+        print(f"Progress: {done:.1f}% ({totals['messages']:,} messages, {totals['input_bytes'] / 1024 / 1024:.1f} MB)")
+
+    start = time.perf_counter()
+    try:
+        totals = anonymize.anonymize_file(
+            args.input_file,
+            args.output_file,
+            key,
+            shift_weeks=args.shift_weeks,
+            workers=args.workers,
+            chunk_bytes=args.chunk_mb * 1024 * 1024,
+            compression=compression,
+            on_chunk=on_chunk,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+        sys.exit(130)
+    seconds = time.perf_counter() - start
+
+    print_report(args.output_file, totals, seconds)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"input": args.input_file, "output": args.output_file, "seconds": round(seconds, 3), "totals": totals}, f, indent=2)
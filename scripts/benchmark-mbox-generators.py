@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the .mbox corpus generators, with regression tracking.
+
+Runs each generator mode with a fixed seed, reports MB/s, messages/s, peak RSS
+and per-stage time, appends the results to a JSON-lines history file and fails
+(exit code 1) when a mode's MB/s drops more than --threshold below the stored
+baseline.
+Usage: python3 benchmark-mbox-generators.py [--size-mb N] [--cases a,b] [--save-baseline]
+Example: python3 benchmark-mbox-generators.py --size-mb 200 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mboxgen import index as mbox_index
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+THREADED_GENERATOR = SCRIPTS_DIR / "generate-test-mbox.py"
+ATTACHMENT_GENERATOR = SCRIPTS_DIR / "generate-test-mbox-with-attachments.py"
+
+# name -> (generator, extra arguments)
+CASES = {
+    "plain": (ATTACHMENT_GENERATOR, ["--attachment-percentage", "0"]),
+    "threaded": (THREADED_GENERATOR, []),
+    "attachment-heavy": (ATTACHMENT_GENERATOR, ["--attachment-percentage", "100"]),
+    "large-attachment": (ATTACHMENT_GENERATOR, ["--attachment-size-mb", "50"]),
+}
+
+DEFAULT_HISTORY = Path(".benchmarks") / "mbox-generators-history.jsonl"
+DEFAULT_BASELINE = Path(".benchmarks") / "mbox-generators-baseline.json"
+BENCHMARK_SEED = 1234
+
+
+def run_generator(generator, args, output_file, metrics_file):
+    """Run a generator in a child process; returns (seconds, peak RSS in MB or None, final metrics line)."""
+    command = [sys.executable, str(generator), *args, str(output_file), "--metrics", str(metrics_file)]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    peak_rss_mb = None
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is KB on Linux and bytes on macOS.
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        peak_rss_mb = usage.ru_maxrss / divisor
+    else:
+        process.wait()
+    elapsed = time.perf_counter() - start
+    stderr = process.stderr.read().decode("utf-8", "replace")
+    process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"{generator.name} failed ({process.returncode}): {stderr.strip()}")
+    with open(metrics_file, encoding="utf-8") as metrics:
+        final = [json.loads(line) for line in metrics if line.strip()][-1]
+    return elapsed, peak_rss_mb, final
+
+
+def stage_seconds(final_metrics, seconds):
+    """Per-stage seconds from a generator's final --metrics line.
+
+    "other" is the rest of the wall time: interpreter start-up, joining shards
+    and bookkeeping outside the generation loop.
+    """
+    stages = {stage: round(value, 3) for stage, value in final_metrics["stages"].items()}
+    stages["other"] = round(max(seconds - sum(final_metrics["stages"].values()), 0.0), 3)
+    return stages
+
+
+def benchmark_case(name, size_mb, repeat, work_dir, workers):
+    generator, extra_args = CASES[name]
+    args = [str(size_mb), *extra_args, "--seed", str(BENCHMARK_SEED)]
+    if workers > 1 and generator == THREADED_GENERATOR:
+        args += ["--workers", str(workers)]
+    output_file = Path(work_dir) / f"{name}.mbox"
+    metrics_file = Path(work_dir) / f"{name}.metrics.jsonl"
+
+    best = None
+    for _ in range(repeat):
+        result = run_generator(generator, args, output_file, metrics_file)
+        if best is None or result[0] < best[0]:
+            best = result
+    seconds, peak_rss_mb, final_metrics = best
+
+    size_bytes = output_file.stat().st_size
+    with mbox_index.IndexReader(mbox_index.index_path(output_file)) as index:
+        messages = len(index)
+
+    return {
+        "generator": generator.name,
+        "args": args,
+        "seconds": round(seconds, 3),
+        "bytes": size_bytes,
+        "messages": messages,
+        "mb_per_s": round(size_bytes / 1024 / 1024 / seconds, 2),
+        "messages_per_s": round(messages / seconds, 1),
+        "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        # With --workers the stage seconds are summed over shards (CPU time, not wall time).
+        "stage_seconds": stage_seconds(final_metrics, seconds),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SCRIPTS_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"\n{'case':<18} {'MB/s':>8} {'msgs/s':>10} {'peak RSS':>10}   stage seconds")
+    for name, result in results.items():
+        rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a"
+        stages = ", ".join(
+            f"{stage} {seconds:.2f}" for stage, seconds in result["stage_seconds"].items() if seconds >= 0.01
+        )
+        print(f"{name:<18} {result['mb_per_s']:>8.1f} {result['messages_per_s']:>10,.0f} {rss:>10}   {stages}")
+
+
+def check_regressions(results, baseline, threshold):
+    """Return a list of human-readable regressions against the baseline."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get("results", {}).get(name)
+        if not expected:
+            continue
+        floor = expected["mb_per_s"] * (1 - threshold)
+        if result["mb_per_s"] < floor:
+            regressions.append(
+                f"{name}: {result['mb_per_s']:.1f} MB/s is below {floor:.1f} MB/s "
+                f"(baseline {expected['mb_per_s']:.1f} MB/s - {threshold:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the .mbox corpus generators and track throughput regressions.",
+        epilog="Example: python3 benchmark-mbox-generators.py --size-mb 200 --repeat 3",
+    )
+    parser.add_argument("--size-mb", type=int, default=50, help="Corpus size per case (default: 50)")
+    parser.add_argument(
+        "--cases",
+        default=",".join(CASES),
+        help=f"Comma-separated cases to run (default: {','.join(CASES)})",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest counts (default: 1)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Pass --workers N to the threaded generator (default: 1)",
+    )
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY, help=f"JSON-lines history file (default: {DEFAULT_HISTORY})")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help=f"Baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Allowed MB/s drop versus the baseline before failing, as a fraction (default: 0.15)",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--work-dir", default=None, help="Directory for generated corpora (default: a temp dir)")
+    args = parser.parse_args()
+
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        print(f"Error: unknown case(s): {', '.join(unknown)}")
+        sys.exit(1)
+    if args.size_mb < 1 or args.repeat < 1 or args.workers < 1:
+        print("Error: --size-mb, --repeat and --workers must be at least 1")
+        sys.exit(1)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="mbox-bench-", dir=args.work_dir) as work_dir:
+        for name in cases:
+            print(f"Benchmarking {name} ({args.size_mb} MB x {args.repeat})...")
+            results[name] = benchmark_case(name, args.size_mb, args.repeat, work_dir, args.workers)
+
+    print_results(results)
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "size_mb": args.size_mb,
+        "results": results,
+    }
+    args.history.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as history:
+        history.write(json.dumps(record, sort_keys=True) + "\n")
+    print(f"\n📈 Appended results to {args.history}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(record, indent=2, sort_keys=True), encoding="utf-8")
+        print(f"   Saved baseline to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"   No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("size_mb") != args.size_mb:
+        print(f"   Note: baseline was recorded with --size-mb {baseline.get('size_mb')}")
+    regressions = check_regressions(results, baseline, args.threshold)
+    if regressions:
+        print("\n❌ Throughput regression:")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"✅ No case dropped more than {args.threshold:.0%} below the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-message cost of building the standard mbox header block.
+
+Compares the original construction (two strftime calls, uuid4, an f-string
+list joined and encoded per message) with the precompiled fragments, DateClock
+and MessageIdMinter in mboxgen.templates.
+Usage: python3 benchmark-message-headers.py [messages]
+Example: python3 benchmark-message-headers.py 200000
+"""
+
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from mboxgen import templates
+
+SENDERS = [
+    ("Alice Johnson", "alice@example.com"),
+    ("Bob Smith", "bob@company.com"),
+    ("Charlie Davis", "charlie@startup.io"),
+    ("David Wilson", "david@enterprise.org"),
+]
+TO_ADDRESSES = ["you@yourcompany.com", "team@company.com", "engineering@startup.io"]
+SUBJECTS = ["Q4 Financial Report", "Team Meeting Notes", "Project Status Update"]
+BASE_DATE = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def legacy_headers(index, sender_name, sender_email, to_email, subject):
+    email_date = BASE_DATE + timedelta(minutes=index * 15)
+    date_str = email_date.strftime("%a, %d %b %Y %H:%M:%S +0000")
+    message_id = f"<{uuid.uuid4()}@mail.example.com>"
+    header_lines = [
+        f"From sender@example.com {email_date.strftime('%a %b %d %H:%M:%S %Y')}",
+        f"Return-Path: <{sender_email}>",
+        f"Delivered-To: {to_email}",
+        "Received: from mail.example.com (mail.example.com [192.168.1.1])",
+        "    by mx.example.com (Postfix) with ESMTP id ABC123",
+        f"    for <{to_email}>; {date_str}",
+        f"Message-ID: {message_id}",
+        f"Date: {date_str}",
+        f"From: {sender_name} <{sender_email}>",
+        f"To: {to_email}",
+        f"Subject: {subject}",
+    ]
+    return ("\n".join(header_lines) + "\n").encode("utf-8")
+
+
+def template_headers(index, clock, minter, sender_name, sender_email, to_email, subject):
+    mbox_date, date_str = clock.dates(index)
+    return templates.render_headers(
+        mbox_date, date_str, minter.mint(index), sender_name, sender_email, to_email, subject
+    )
+
+
+def run(label, build, messages, picks):
+    start = time.perf_counter()
+    total = 0
+    for index in range(messages):
+        sender_name, sender_email, to_email, subject = picks[index & 1023]
+        total += len(build(index, sender_name, sender_email, to_email, subject))
+    elapsed = time.perf_counter() - start
+    per_message_us = elapsed / messages * 1e6
+    print(f"{label:<22} {per_message_us:6.2f} µs/message  ({total / messages:.0f} bytes/message)")
+    return per_message_us
+
+
+def main(messages):
+    random.seed(0)
+    picks = [
+        (*random.choice(SENDERS), random.choice(TO_ADDRESSES), random.choice(SUBJECTS))
+        for _ in range(1024)
+    ]
+    clock = templates.DateClock(BASE_DATE)
+    minter = templates.MessageIdMinter()
+
+    # Both paths must render the same layout apart from the Message-ID.
+    sample = dict(sender_name="A", sender_email="a@x.io", to_email="b@x.io", subject="S")
+    legacy = legacy_headers(5000, **sample).decode().splitlines()
+    current = template_headers(5000, clock, minter, **sample).decode().splitlines()
+    assert [l for l in legacy if not l.startswith("Message-ID")] == [
+        l for l in current if not l.startswith("Message-ID")
+    ], "template output drifted from the legacy header layout"
+
+    print(f"Building {messages:,} header blocks...")
+    before = run("strftime + uuid4", legacy_headers, messages, picks)
+    after = run(
+        "precompiled templates",
+        lambda index, *fields: template_headers(index, clock, minter, *fields),
+        messages,
+        picks,
+    )
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Usage: python3 benchmark-message-headers.py [messages]")
+        sys.exit(1)
+    try:
+        main(int(sys.argv[1]) if len(sys.argv) == 2 else 200000)
+    except ValueError:
+        print("Error: messages must be a number")
+        sys.exit(1)
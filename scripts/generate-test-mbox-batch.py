@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Generate many .mbox test files (tenants x mailboxes) from one job spec on a process pool.
+Usage: python3 generate-test-mbox-batch.py <spec.json> [--workers N] [--output-dir DIR] [--report PATH] [--dry-run]
+Example: python3 generate-test-mbox-batch.py tenants.json --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from mboxgen import batch
+
+
+def print_plan(jobs, workers):
+    total_mb = sum(job["target_size"] for job in jobs) / 1024 / 1024
+    print(f"{len(jobs)} mailboxes, {total_mb:,.0f} MB on {workers} worker(s), largest first:")
+    for job in jobs:
+        details = [f"seed {job['seed']}" if job["seed"] is not None else "unseeded"]
+        if job["options"]["mix"]:
+            details.append(", ".join(f"{name}={weight:g}" for name, weight in job["options"]["mix"].items()))
+        if job["options"]["profile"]:
+            details.append(f"profile {job['options']['profile']['name']}")
+        print(f"  {job['target_size'] / 1024 / 1024:>10,.1f} MB  {job['output']}  ({'; '.join(details)})")
+
+
+def print_report(report):
+    print(f"\n✅ Generated {len(report['mailboxes'])} mailboxes")
+    print(f"\n   {'mailbox':<32} {'MB':>10} {'emails':>10} {'seconds':>8} {'MB/s':>8} {'emails/s':>10}")
+    for mailbox in report["mailboxes"]:
+        print(
+            f"   {mailbox['name']:<32} {mailbox['bytes'] / 1024 / 1024:>10,.1f} {mailbox['emails']:>10,} "
+            f"{mailbox['seconds']:>8.1f} {mailbox['mb_per_s']:>8.1f} {mailbox['emails_per_s']:>10,.0f}"
+        )
+    print()
+    for tenant, totals in report["tenants"].items():
+        print(
+            f"   Tenant {tenant}: {totals['mailboxes']:,} mailboxes, {totals['bytes'] / 1024 / 1024:,.1f} MB, "
+            f"{totals['emails']:,} emails"
+        )
+    print(
+        f"   Total: {report['bytes'] / 1024 / 1024:,.1f} MB, {report['emails']:,} emails in "
+        f"{report['wall_seconds']:.1f}s ({report['mb_per_s']:.1f} MB/s, {report['emails_per_s']:,.0f} emails/s)"
+    )
+    print(
+        f"   Workers: {report['workers']} busy for {report['busy_seconds']:.1f}s "
+        f"({report['utilization']:.0%} utilization)"
+    )
+    stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in report["stage_seconds"].items())
+    print(f"   Stage time (all workers): {stages}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate many .mbox test files (tenants x mailboxes) from one job spec on a process pool.",
+        epilog="Example: python3 generate-test-mbox-batch.py tenants.json --workers 8",
+    )
+    parser.add_argument("spec", help="JSON job spec listing tenants, mailboxes, sizes and shapes (see mboxgen/batch.py)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes; each generates one mailbox at a time (default: CPU count)",
+    )
+    parser.add_argument("--output-dir", default=None, help='Write mailboxes here instead of the spec\'s "output_dir"')
+    parser.add_argument(
+        "--report",
+        default=None,
+        metavar="PATH",
+        help="Also write the throughput report (per mailbox, per tenant and in total) to PATH as JSON",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Print the job plan without generating anything")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        print("Error: --workers must be at least 1")
+        sys.exit(1)
+
+    try:
+        jobs = batch.load_spec(args.spec, args.output_dir)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    workers = min(args.workers, len(jobs))
+    print_plan(jobs, workers)
+    if args.dry_run:
+        sys.exit(0)
+
+    def on_done(stats, done, total):
+        print(
+            f"[{done}/{total}] {stats['name']} done ({stats['emails']:,} emails, "
+            f"{stats['size'] / 1024 / 1024:.1f} MB in {stats['seconds']:.1f}s)"
+        )
+
+    try:
+        results, wall_seconds = batch.run_batch(jobs, workers, on_done)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    report = batch.summarize(results, wall_seconds, workers)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   Report: {args.report}")
@@ -0,0 +1,7 @@
+"""
+Shared helpers for the generate-test-mbox*.py corpus generators.
+
+The generator scripts put scripts/ on sys.path when run directly
+(python3 scripts/generate-test-mbox.py ...), so this package is importable
+without installation.
+"""
@@ -0,0 +1,803 @@
+"""
+Anonymizer: rewrite a real mbox into a shareable benchmark corpus.
+
+Every message keeps its structure and everything identifying is replaced:
+
+- MIME trees, content types, charsets, transfer encodings, header order and
+  line layout are kept. Text is replaced token by token with tokens of the
+  same encoded length, and encoded bodies are re-encoded into the original
+  line layout, so part and message sizes stay the same (give or take a
+  byte where a date gains a digit).
+- Words (in headers, bodies, display names, addresses and file names) become
+  words of the same length from the Zipf vocabulary of mboxgen.bodytext, and
+  digit runs become other digit runs. Non-ASCII letters become letters with
+  the same encoded length in the part's charset. The case pattern is kept,
+  and so are HTML tags, entities and <style> blocks.
+- Message-IDs, In-Reply-To, References, Content-IDs and MIME boundaries get a
+  same-length scramble of their letters and digits, so the thread graph
+  survives. Reply/forward prefixes are kept, so subject-based threading does
+  too.
+- Dates (Date and Received headers, envelope lines) move back by one whole
+  number of weeks, which keeps the spacing between messages, the weekday and
+  the time of day.
+- Attachment bytes become random bytes of the same length, keeping only a
+  known file signature (%PDF-, PNG, ZIP, ...) at the start.
+
+Every replacement is derived from a keyed hash of the original, so the same
+address, word or Message-ID becomes the same replacement everywhere in the
+corpus. This is what lets the file be split across worker processes with no
+shared state. The mapping cannot be reversed without the key, but it is
+consistent, so word frequencies are kept (which full-text benchmarks need).
+Do not share the key with the corpus.
+
+The input is mapped with mmap and cut into chunks at envelope lines (see
+mboxgen.verify). Chunks are rewritten on a process pool and written in
+order, with a bounded number in flight.
+"""
+
+import base64
+import binascii
+import codecs
+import hashlib
+import mmap
+import multiprocessing
+import os
+import random
+import re
+import string
+from collections import deque
+from datetime import date, timedelta
+from functools import lru_cache, partial
+from urllib.parse import unquote_to_bytes
+
+from mboxgen import bodytext
+from mboxgen import emit
+from mboxgen import templates
+from mboxgen import verify
+
+# Input bytes per chunk handed to a worker.
+CHUNK_BYTES = 32 * 1024 * 1024
+# Dates move back by 1 to MAX_SHIFT_WEEKS weeks.
+MAX_SHIFT_WEEKS = 520
+# Entries per replacement cache before it is cleared.
+CACHE_ENTRIES = 1 << 20
+
+# Kept as they are: reply/forward prefixes (subject threading), URL
+# scaffolding, and "from", so no body line can become an envelope line.
+PRESERVED_WORDS = frozenset(
+    ("re", "fw", "fwd", "aw", "wg", "sv", "vs", "tr", "from", "http", "https", "mailto", "www", "com", "net", "org")
+)
+# Non-ASCII replacement letters; each text picks those with the same encoded length in its charset.
+POOL_CHARACTERS = (
+    "àáâãäåæçèéêëìíîïñòóôõöøùúûüýÿÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÑÒÓÔÕÖØÙÚÛÜÝ"
+    "ąćčďęěłńňőřśšťůűźżžĄĆČĎĘĚŁŃŇŐŘŚŠŤŮŰŹŻŽ"
+    "αβγδεζηθικλμνξοπρστυφχψωабвгдежзийклмнопрстуфхцчшщыэюяАБВГДЕЖЗИКЛМНОПРСТУФХЦЧШЩЭЮЯ"
+    "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+    "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+    "日本語会議資料報告書月年時間人大中小上下前後新古高安長短東西南北手足口目耳心力文字学校生先名電話番号住所"
+    "가나다라마바사아자차카타파하거너더러머버서어저처커터퍼허"
+    "𠀀𠀁𠀂𠀃𠀄𠀅𠀆𠀇𠀈𠀉𠀊𠀋"
+)
+# File signatures kept at the start of replaced attachments, so type sniffing still works.
+FILE_SIGNATURES = (
+    b"%PDF-",
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"PK\x03\x04",
+    b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+    b"Rar!\x1a\x07",
+    b"\x1f\x8b",
+    b"7z\xbc\xaf\x27\x1c",
+    b"II*\x00",
+    b"MM\x00*",
+    b"RIFF",
+    b"%!PS",
+    b"{\\rtf",
+)
+
+# Headers kept verbatim; the rest are anonymized according to their kind.
+KEPT_HEADERS = frozenset(
+    (
+        b"mime-version",
+        b"content-transfer-encoding",
+        b"content-language",
+        b"importance",
+        b"priority",
+        b"x-priority",
+        b"precedence",
+        b"auto-submitted",
+    )
+)
+ID_HEADERS = frozenset(
+    (
+        b"message-id",
+        b"in-reply-to",
+        b"references",
+        b"content-id",
+        b"resent-message-id",
+        b"original-message-id",
+        b"x-original-message-id",
+    )
+)
+DATE_HEADERS = frozenset((b"date", b"resent-date", b"delivery-date", b"x-original-date"))
+PARAMETER_HEADERS = frozenset((b"content-type", b"content-disposition"))
+KEPT_PARAMETERS = frozenset(
+    (
+        b"charset",
+        b"format",
+        b"delsp",
+        b"type",
+        b"protocol",
+        b"micalg",
+        b"report-type",
+        b"method",
+        b"reply-type",
+        b"smime-type",
+        b"size",
+    )
+)
+KEPT_ATTRIBUTES = frozenset(
+    (
+        "style", "class", "id", "width", "height", "align", "valign", "border", "cellpadding", "cellspacing",
+        "bgcolor", "color", "face", "size", "type", "charset", "http-equiv", "lang", "dir", "rel", "target",
+        "colspan", "rowspan", "role",
+    )
+)
+
+TOTALS = (
+    "messages",
+    "input_bytes",
+    "output_bytes",
+    "multipart",
+    "text_parts",
+    "attachments",
+    "nested_messages",
+    "message_ids",
+    "dates",
+)
+
+MONTH_NUMBERS = {month.lower().encode("ascii"): number for number, month in enumerate(templates.MONTHS, 1)}
+MONTH_PATTERN = b"|".join(month.encode("ascii") for month in templates.MONTHS)
+DATE_RE = re.compile(rb"\b(\d{1,2})([ \t]+)(" + MONTH_PATTERN + rb")([ \t]+)(\d{4}|\d{2})\b", re.I)
+ASCTIME_RE = re.compile(rb"\b(" + MONTH_PATTERN + rb")( +)(\d{1,2})( \d\d:\d\d:\d\d(?: [+-]\d{4})? )(\d{4})\b")
+ANGLE_RE = re.compile(rb"<([^<>\s]+)>")
+ENCODED_WORD_RE = re.compile(rb"=\?([^?\s]+)\?([BbQq])\?([^?\s]*)\?=")
+PARAMETER_RE = re.compile(rb'(;[ \t\r\n]*)([!#$%&\'*+\-.^_`|~0-9A-Za-z]+)([ \t]*=[ \t]*)("(?:[^"\\]|\\.)*"?|[^;\s]*)')
+# Escapes and soft line breaks in quoted-printable text, and %XX escapes in RFC 2231 values.
+QP_RE = re.compile(rb"(=[0-9A-Fa-f]{2}|=\r?\n|=\Z)")
+PERCENT_RE = re.compile(rb"(%[0-9A-Fa-f]{2})")
+TEXT_RE = re.compile(r"([A-Za-z]+)|([0-9]+)|([^\x00-\x7f])")
+HTML_RE = re.compile(
+    r"(<style\b.*?</style\s*>)|<!--(.*?)-->|(<[^>]*>)|(&#?\w+;)|([A-Za-z]+)|([0-9]+)|([^\x00-\x7f])", re.I | re.S
+)
+TAG_ATTRIBUTE_RE = re.compile(r"""([\w:.-]+)(\s*=\s*)("[^"]*"|'[^']*'|[^\s"'>]+)""")
+
+LOWER = string.ascii_lowercase.encode("ascii")
+UPPER = string.ascii_uppercase.encode("ascii")
+DIGITS = string.digits.encode("ascii")
+
+
+def new_totals():
+    return dict.fromkeys(TOTALS, 0)
+
+
+def derive_key(secret):
+    """The 32-byte hashing key for a secret string."""
+    return hashlib.blake2b(secret.encode("utf-8"), digest_size=32).digest()
+
+
+@lru_cache(maxsize=None)
+def word_buckets():
+    """Replacement words by length: the alphabetic ASCII terms of the Zipf vocabulary, minus PRESERVED_WORDS."""
+    buckets = {}
+    for word in bodytext.vocabulary():
+        if word.isalpha() and word.isascii():
+            word = word.decode("ascii").lower()
+            if word not in PRESERVED_WORDS:
+                buckets.setdefault(len(word), set()).add(word)
+    buckets[1] = set(string.ascii_lowercase)
+    return {length: sorted(words) for length, words in buckets.items()}
+
+
+@lru_cache(maxsize=256)
+def codec_name(charset):
+    """Python codec for a MIME charset (bytes or str); unknown charsets are read byte for byte as latin-1."""
+    if isinstance(charset, bytes):
+        charset = charset.decode("ascii", "replace")
+    if not charset:
+        return "utf-8"
+    try:
+        return codecs.lookup(charset.strip().strip('"').lower()).name
+    except LookupError:
+        return "latin-1"
+
+
+@lru_cache(maxsize=64)
+def character_pools(codec):
+    """POOL_CHARACTERS grouped by their encoded length in codec."""
+    pools = {}
+    for character in POOL_CHARACTERS:
+        try:
+            length = len(character.encode(codec))
+        except (UnicodeError, LookupError):
+            continue
+        pools.setdefault(length, []).append(character)
+    return pools
+
+
+def file_signature(data):
+    for signature in FILE_SIGNATURES:
+        if data.startswith(signature):
+            return signature
+    return b""
+
+
+def split_entity(raw):
+    """(header block, blank line, body) of a message or MIME part."""
+    if raw.startswith(b"\n"):
+        return b"", b"\n", raw[1:]
+    if raw.startswith(b"\r\n"):
+        return b"", b"\r\n", raw[2:]
+    lf = raw.find(b"\n\n")
+    crlf = raw.find(b"\n\r\n")
+    if crlf >= 0 and (lf < 0 or crlf < lf):
+        return raw[:crlf + 1], b"\r\n", raw[crlf + 3:]
+    if lf >= 0:
+        return raw[:lf + 1], b"\n", raw[lf + 2:]
+    return raw, b"", b""
+
+
+def header_fields(block):
+    """Raw header fields of a header block, each with its continuation lines and line endings."""
+    fields = []
+    for line in block.splitlines(keepends=True):
+        if fields and line[:1] in (b" ", b"\t"):
+            fields[-1] += line
+        else:
+            fields.append(line)
+    return fields
+
+
+def parameters(value):
+    """Lower-cased parameter names -> unquoted values of an unfolded Content-Type style value."""
+    found = {}
+    for match in PARAMETER_RE.finditer(value):
+        raw = match.group(4)
+        if raw[:1] == b'"':
+            raw = raw[1:-1] if len(raw) > 1 and raw.endswith(b'"') else raw[1:]
+        found.setdefault(match.group(2).lower(), raw)
+    return found
+
+
+def rewrite_escaped(encoded, split_re, prefix, transform):
+    """Apply a same-length bytes transform to escaped text (quoted-printable, %XX) in its original layout.
+
+    Returns None when the transform changed the length.
+    """
+    pieces = split_re.split(encoded)
+    decoded = bytearray()
+    for number, piece in enumerate(pieces):
+        if number % 2 == 0:
+            decoded += piece
+        elif len(piece) == 3 and piece[1:2] not in (b"\r", b"\n"):
+            decoded.append(int(piece[1:], 16))
+    replaced = transform(bytes(decoded))
+    if len(replaced) != len(decoded):
+        return None
+    out = []
+    at = 0
+    for number, piece in enumerate(pieces):
+        if number % 2 == 0:
+            out.append(replaced[at:at + len(piece)])
+            at += len(piece)
+        elif len(piece) == 3 and piece[1:2] not in (b"\r", b"\n"):
+            out.append(b"%s%02X" % (prefix, replaced[at]))
+            at += 1
+        else:
+            out.append(piece)
+    return b"".join(out)
+
+
+def delimiters(body, boundary):
+    """(start, end, closing) of each delimiter line of boundary in a multipart body, without its line break."""
+    marker = b"--" + boundary
+    at = -1
+    while True:
+        at = body.find(marker, at + 1)
+        if at < 0:
+            return
+        if at and body[at - 1] != 10:
+            continue
+        after = at + len(marker)
+        closing = body.startswith(b"--", after)
+        line_end = body.find(b"\n", after)
+        if line_end < 0:
+            line_end = len(body)
+        if not body[after + 2 * closing:line_end].strip(b" \t\r"):
+            yield at, line_end, closing
+
+
+def base64_layout(original, raw):
+    """raw as base64 laid out like the base64 text original (line width, line endings, surrounding whitespace)."""
+    content = original.strip()
+    lead = original[:original.find(content[:1])] if content else b""
+    tail = original[len(lead) + len(content):]
+    encoded = base64.b64encode(raw)
+    line_end = content.find(b"\n")
+    if line_end < 0:
+        return lead + encoded + tail
+    eol = b"\r\n" if content[line_end - 1:line_end] == b"\r" else b"\n"
+    width = line_end - len(eol) + 1
+    if width <= 0:
+        return lead + encoded + tail
+    if width == 76 and eol == b"\n":
+        body = base64.encodebytes(raw)[:-1]
+    else:
+        body = eol.join(encoded[at:at + width] for at in range(0, len(encoded), width))
+    return lead + body + tail
+
+
+def decode_base64(body):
+    """(compact base64 text, decoded bytes) of a base64 body, or (compact, None) when it does not decode."""
+    compact = body.translate(None, b" \t\r\n")
+    try:
+        return compact, binascii.a2b_base64(compact)
+    except binascii.Error:
+        return compact, None
+
+
+class Anonymizer:
+    """Keyed, deterministic replacements: every instance with the same key makes the same ones."""
+
+    def __init__(self, key, shift_weeks=None):
+        self.key = key
+        if shift_weeks is None:
+            shift_weeks = 1 + self._hash(b"date-shift", b"") % MAX_SHIFT_WEEKS
+        self.shift = timedelta(weeks=-shift_weeks)
+        self.buckets = word_buckets()
+        self.totals = new_totals()
+        self._words = {}
+        self._characters = {}
+        self._scrambled = {}
+
+    def _hash(self, kind, data):
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8, key=self.key, person=kind).digest(), "little")
+
+    # Tokens
+
+    def word(self, token):
+        mapped = self._words.get(token)
+        if mapped is None:
+            if len(self._words) >= CACHE_ENTRIES:
+                self._words.clear()
+            mapped = self._new_word(token.lower())
+            if token.isupper() and len(token) > 1:
+                mapped = mapped.upper()
+            elif token[0].isupper():
+                mapped = mapped.capitalize()
+            self._words[token] = mapped
+        return mapped
+
+    def _new_word(self, lower):
+        if lower in PRESERVED_WORDS:
+            return lower
+        seed = self._hash(b"word", lower.encode("ascii"))
+        bucket = self.buckets.get(len(lower))
+        if bucket:
+            return bucket[seed % len(bucket)]
+        rng = random.Random(seed)
+        pieces = []
+        while sum(map(len, pieces)) < len(lower):
+            pieces.append(rng.choice(self.buckets[rng.randrange(6, 12)]))
+        return "".join(pieces)[:len(lower)]
+
+    def digits(self, token):
+        mapped = self._words.get(token)
+        if mapped is None:
+            rng = random.Random(self._hash(b"digits", token.encode("ascii")))
+            mapped = "".join(rng.choices(string.digits, k=len(token)))
+            if len(token) > 1 and token[0] != "0" and mapped[0] == "0":
+                mapped = rng.choice("123456789") + mapped[1:]
+            self._words[token] = mapped
+        return mapped
+
+    def character(self, character, codec):
+        if not character.isalnum():
+            return character
+        mapped = self._characters.get((codec, character))
+        if mapped is None:
+            try:
+                pool = character_pools(codec).get(len(character.encode(codec)))
+            except UnicodeError:
+                pool = None
+            mapped = character
+            if pool:
+                mapped = pool[self._hash(b"char", character.encode("utf-8")) % len(pool)]
+            self._characters[(codec, character)] = mapped
+        return mapped
+
+    def scramble(self, kind, value):
+        """Same-length replacement of the letters and digits of an identifier (Message-ID, boundary)."""
+        mapped = self._scrambled.get((kind, value))
+        if mapped is None:
+            if len(self._scrambled) >= CACHE_ENTRIES:
+                self._scrambled.clear()
+            stream = hashlib.shake_256(self.key + kind + b"\0" + value).digest(len(value))
+            mapped = bytes(
+                LOWER[draw % 26] if 97 <= byte <= 122
+                else UPPER[draw % 26] if 65 <= byte <= 90
+                else DIGITS[draw % 10] if 48 <= byte <= 57
+                else byte
+                for byte, draw in zip(value, stream)
+            )
+            self._scrambled[(kind, value)] = mapped
+        return mapped
+
+    # Text
+
+    def text(self, text, codec):
+        def token(match):
+            if match.lastindex == 1:
+                return self.word(match.group(1))
+            if match.lastindex == 2:
+                return self.digits(match.group(2))
+            return self.character(match.group(3), codec)
+
+        return TEXT_RE.sub(token, text)
+
+    def html(self, text, codec):
+        def token(match):
+            kind = match.lastindex
+            if kind in (1, 4):  # <style> blocks and entities
+                return match.group()
+            if kind == 2:
+                return f"<!--{self.text(match.group(2), codec)}-->"
+            if kind == 3:
+                return TAG_ATTRIBUTE_RE.sub(partial(self._attribute, codec=codec), match.group(3))
+            if kind == 5:
+                return self.word(match.group(5))
+            if kind == 6:
+                return self.digits(match.group(6))
+            return self.character(match.group(7), codec)
+
+        return HTML_RE.sub(token, text)
+
+    def _attribute(self, match, codec):
+        if match.group(1).lower() in KEPT_ATTRIBUTES:
+            return match.group()
+        return match.group(1) + match.group(2) + self.html(match.group(3), codec)
+
+    def text_bytes(self, data, charset=None, html=False):
+        """Anonymize encoded text; the result has the same length unless the charset is stateful."""
+        codec = codec_name(charset)
+        if codec in ("ascii", "utf-8"):
+            try:
+                text = data.decode("utf-8")
+                codec = "utf-8"
+            except UnicodeDecodeError:
+                codec = "latin-1"
+                text = data.decode(codec)
+        else:
+            text = data.decode(codec, "surrogateescape")
+        text = self.html(text, codec) if html else self.text(text, codec)
+        return text.encode(codec, "surrogateescape")
+
+    def encoded(self, body, encoding, transform):
+        """Apply a bytes transform to a body under its Content-Transfer-Encoding, keeping the layout."""
+        if encoding == b"base64":
+            _, raw = decode_base64(body)
+            if raw is None:
+                return self.text_bytes(body, "latin-1")
+            return base64_layout(body, transform(raw))
+        if encoding == b"quoted-printable":
+            rewritten = rewrite_escaped(body, QP_RE, b"=", transform)
+            return rewritten if rewritten is not None else binascii.b2a_qp(transform(binascii.a2b_qp(body)))
+        return transform(body)
+
+    # Headers
+
+    def dates(self, value):
+        def rfc2822(match):
+            self.totals["dates"] += 1
+            day, month, year = int(match.group(1)), MONTH_NUMBERS[match.group(3).lower()], int(match.group(5))
+            if len(match.group(5)) == 2:
+                year += 2000 if year < 50 else 1900
+            shifted = self._shift(year, month, day)
+            if shifted is None:
+                return match.group()
+            day_text = b"%0*d" % (len(match.group(1)), shifted.day)
+            year_text = b"%02d" % (shifted.year % 100) if len(match.group(5)) == 2 else b"%d" % shifted.year
+            return day_text + match.group(2) + self._month(shifted.month, match.group(3)) + match.group(4) + year_text
+
+        def asctime(match):
+            self.totals["dates"] += 1
+            shifted = self._shift(int(match.group(5)), MONTH_NUMBERS[match.group(1).lower()], int(match.group(3)))
+            if shifted is None:
+                return match.group()
+            width = len(match.group(2)) + len(match.group(3)) - 1
+            day_text = b"%02d" % shifted.day if match.group(3).startswith(b"0") else b"%*d" % (width, shifted.day)
+            return self._month(shifted.month, match.group(1)) + b" " + day_text + match.group(4) + b"%d" % shifted.year
+
+        return ASCTIME_RE.sub(asctime, DATE_RE.sub(rfc2822, value))
+
+    def _shift(self, year, month, day):
+        try:
+            return date(year, month, day) + self.shift
+        except (ValueError, OverflowError):
+            return None
+
+    @staticmethod
+    def _month(number, original):
+        name = templates.MONTHS[number - 1].encode("ascii")
+        return name.upper() if original.isupper() else name.lower() if original.islower() else name
+
+    def ids(self, value):
+        def identifier(match):
+            self.totals["message_ids"] += 1
+            return b"<" + self.scramble(b"id", match.group(1)) + b">"
+
+        if b"<" not in value:
+            return self.scramble(b"id", value)
+        return ANGLE_RE.sub(identifier, value)
+
+    def header_text(self, value):
+        """Anonymize free header text; RFC 2047 encoded words are decoded, anonymized and re-encoded."""
+        pieces = ENCODED_WORD_RE.split(value)
+        out = []
+        for at in range(0, len(pieces), 4):
+            if pieces[at]:
+                out.append(self.text_bytes(pieces[at]))
+            if at + 3 < len(pieces):
+                out.append(self._encoded_word(*pieces[at + 1:at + 4]))
+        return b"".join(out)
+
+    def _encoded_word(self, charset, encoding, payload):
+        transform = partial(self.text_bytes, charset=charset.split(b"*")[0])
+        if encoding in b"Bb":
+            try:
+                raw = base64.b64decode(payload + b"=" * (-len(payload) % 4))
+            except binascii.Error:
+                return b"=?%s?%s?%s?=" % (charset, encoding, self.scramble(b"encoded-word", payload))
+            payload = base64.b64encode(transform(raw))
+        else:
+            payload = rewrite_escaped(payload, QP_RE, b"=", transform) or self.scramble(b"encoded-word", payload)
+        return b"=?%s?%s?%s?=" % (charset, encoding, payload)
+
+    def filename(self, value):
+        dot = value.rfind(b".")
+        if 0 < dot and len(value) - dot <= 6 and b" " not in value[dot:]:
+            return self.header_text(value[:dot]) + value[dot:]
+        return self.header_text(value)
+
+    def extended_value(self, value):
+        """An RFC 2231 value (charset'language'%XX...), anonymized in its own charset and escapes."""
+        charset, quote, rest = value.partition(b"'")
+        if not quote:
+            charset, rest, prefix = b"utf-8", value, b""
+        else:
+            language, _, rest = rest.partition(b"'")
+            prefix = charset + b"'" + language + b"'"
+        dot = rest.rfind(b".")
+        extension = rest[dot:] if 0 < dot and len(rest) - dot <= 6 else b""
+        stem = rest[:len(rest) - len(extension)]
+        transform = partial(self.text_bytes, charset=charset)
+        rewritten = rewrite_escaped(stem, PERCENT_RE, b"%", transform)
+        if rewritten is None:
+            rewritten = b"".join(b"%%%02X" % byte for byte in transform(unquote_to_bytes(stem)))
+        return prefix + rewritten + extension
+
+    def parameter_value(self, value):
+        """Content-Type / Content-Disposition: the type is kept, parameters by name."""
+
+        def parameter(match):
+            name = match.group(2).lower()
+            raw = match.group(4)
+            quoted = raw[:1] == b'"'
+            closed = quoted and len(raw) > 1 and raw.endswith(b'"')
+            inner = raw[1:len(raw) - closed] if quoted else raw
+            if name in KEPT_PARAMETERS:
+                return match.group()
+            if name == b"boundary":
+                inner = self.scramble(b"boundary", inner)
+            elif name.endswith(b"*"):
+                inner = self.extended_value(inner)
+            elif name.startswith((b"name", b"filename")):
+                inner = self.filename(inner)
+            else:
+                inner = self.header_text(inner)
+            if quoted:
+                inner = b'"' + inner + (b'"' if closed else b"")
+            return match.group(1) + match.group(2) + match.group(3) + inner
+
+        return PARAMETER_RE.sub(parameter, value)
+
+    def field(self, field):
+        colon = field.find(b":")
+        if colon <= 0 or field[:1] in (b" ", b"\t"):
+            return self.header_text(field)
+        name = field[:colon + 1]
+        value = field[colon + 1:]
+        lower = name[:-1].strip().lower()
+        if lower in KEPT_HEADERS:
+            return field
+        if lower in ID_HEADERS:
+            return name + self.ids(value)
+        if lower in DATE_HEADERS:
+            return name + self.dates(value)
+        if lower == b"received":
+            at = value.rfind(b";")
+            if at >= 0:
+                return name + self.header_text(value[:at]) + self.dates(value[at:])
+        if lower in PARAMETER_HEADERS:
+            return name + self.parameter_value(value)
+        return name + self.header_text(value)
+
+    # Messages
+
+    def message(self, raw):
+        """One mbox message: envelope line plus message."""
+        line_end = raw.find(b"\n") + 1 or len(raw)
+        envelope = raw[:line_end]
+        sender, space, when = envelope[5:].partition(b" ")
+        self.totals["messages"] += 1
+        self.totals["input_bytes"] += len(raw)
+        return b"From " + self.header_text(sender) + space + self.dates(when) + self.entity(raw[line_end:])
+
+    def entity(self, raw, default_type=b"text/plain"):
+        """A message or MIME part: headers, blank line, body (recursing into multiparts and attached messages)."""
+        headers, separator, body = split_entity(raw)
+        fields = header_fields(headers)
+        content_type = default_type
+        options = {}
+        encoding = None
+        for field in fields:
+            name, _, value = field.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-type":
+                value = value.replace(b"\r", b"").replace(b"\n", b"")
+                content_type = value.split(b";", 1)[0].strip().lower() or default_type
+                options = parameters(value)
+            elif name == b"content-transfer-encoding":
+                encoding = value.strip().lower()
+        out = b"".join(self.field(field) for field in fields)
+        if not separator:
+            return out
+        return out + separator + self.body(body, content_type, options, encoding)
+
+    def body(self, body, content_type, options, encoding):
+        charset = options.get(b"charset")
+        if content_type.startswith(b"multipart/") and options.get(b"boundary"):
+            self.totals["multipart"] += 1
+            default_type = b"message/rfc822" if content_type == b"multipart/digest" else b"text/plain"
+            return self.multipart(body, options[b"boundary"], default_type)
+        if content_type in (b"message/rfc822", b"message/global"):
+            self.totals["nested_messages"] += 1
+            return self.encoded(body, encoding, self.entity)
+        if content_type.startswith(b"text/"):
+            self.totals["text_parts"] += 1
+            return self.encoded(body, encoding, partial(self.text_bytes, charset=charset, html=content_type == b"text/html"))
+        self.totals["attachments"] += 1
+        if encoding == b"base64":
+            return self.attachment(body)
+        return self.encoded(body, encoding, partial(self.text_bytes, charset=charset or "latin-1"))
+
+    def attachment(self, body):
+        """Random bytes of the same length (same input, same bytes), base64-encoded in the original layout."""
+        compact, raw = decode_base64(body)
+        if raw is None:
+            return self.text_bytes(body, "latin-1")
+        signature = file_signature(raw)
+        rng = random.Random(self._hash(b"payload", compact))
+        return base64_layout(body, signature + rng.randbytes(len(raw) - len(signature)))
+
+    def multipart(self, body, boundary, default_type):
+        mapped = b"--" + self.scramble(b"boundary", boundary)
+        out = []
+        position = 0
+        first = True
+        for start, end, closing in delimiters(body, boundary):
+            segment = body[position:start]
+            if first:
+                out.append(self.text_bytes(segment))  # preamble
+                first = False
+            else:
+                out.append(self._part(segment, default_type))
+            out.append(mapped + body[start + len(mapped):end])
+            position = end
+            if closing:
+                out.append(self.text_bytes(body[position:]))  # epilogue
+                return b"".join(out)
+        if first:
+            return self.text_bytes(body)
+        out.append(self._part(body[position:], default_type))
+        return b"".join(out)
+
+    def _part(self, segment, default_type):
+        if segment.startswith(b"\n"):
+            return b"\n" + self.entity(segment[1:], default_type)
+        return self.entity(segment, default_type)
+
+
+_anonymizer = None
+
+
+def init_worker(key, shift_weeks=None):
+    """Pool initializer (also called in-process for one worker)."""
+    global _anonymizer
+    _anonymizer = Anonymizer(key, shift_weeks)
+
+
+def is_envelope(data, offset):
+    """An envelope is a From line at the start of the file or after a blank line (LF or CRLF)."""
+    return offset == 0 or data[offset - 2:offset] == b"\n\n" or data[offset - 3:offset] == b"\n\r\n"
+
+
+def anonymize_range(path, start, end):
+    """Rewrite the messages whose envelope starts in [start, end); returns (bytes, totals)."""
+    anonymizer = _anonymizer
+    anonymizer.totals = new_totals()
+    out = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        envelopes = []
+        stop = size
+        for offset, _ in verify.from_lines(data, start):
+            if not is_envelope(data, offset):
+                continue
+            if offset >= end:
+                stop = offset
+                break
+            envelopes.append(offset)
+        for message_start, message_end in zip(envelopes, envelopes[1:] + [stop]):
+            out.append(anonymizer.message(data[message_start:message_end]))
+    finally:
+        data.close()
+    output = b"".join(out)
+    anonymizer.totals["output_bytes"] = len(output)
+    return output, anonymizer.totals
+
+
+def anonymize_file(path, output, key, shift_weeks=None, workers=1, chunk_bytes=CHUNK_BYTES, compression=None, on_chunk=None):
+    """Rewrite the mbox at path into output (a path, "-", a pipe or a socket); returns totals.
+
+    on_chunk(totals so far) is called after every chunk is written. Raises
+    ValueError when path is not an mbox file.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if f.read(5) != b"From ":
+            raise ValueError(f"{path} is not an mbox file (it does not start with a From line)")
+    ranges = verify.plan_ranges(size, max(1, -(-size // chunk_bytes)))
+    totals = new_totals()
+    # Built before the pool starts, so forked workers share it.
+    word_buckets()
+
+    with emit.BatchWriter(output, size, compression=compression) as out:
+
+        def write(result):
+            data, chunk_totals = result
+            out.write(data)
+            for name, value in chunk_totals.items():
+                totals[name] += value
+            if on_chunk:
+                on_chunk(totals)
+
+        if workers == 1:
+            init_worker(key, shift_weeks)
+            for start, end in ranges:
+                write(anonymize_range(path, start, end))
+        else:
+            with multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=(key, shift_weeks)) as pool:
+                # At most two chunks per worker in flight (or waiting to be written).
+                pending = deque()
+                for start, end in ranges:
+                    pending.append(pool.apply_async(anonymize_range, (path, start, end)))
+                    if len(pending) >= 2 * workers:
+                        write(pending.popleft().get())
+                while pending:
+                    write(pending.popleft().get())
+    return totals
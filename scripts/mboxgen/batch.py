@@ -0,0 +1,332 @@
+"""
+Batch generation of many mailboxes from one job spec, for multi-tenant load tests.
+
+A job spec is a JSON file listing tenants and their mailboxes:
+
+    {
+      "output_dir": "/tmp/tenants",
+      "seed": 42,
+      "defaults": {"size_mb": 50, "mix": "plain=80,attachment=20"},
+      "tenants": [
+        {
+          "name": "acme",
+          "defaults": {"body_text": "zipf"},
+          "mailboxes": [
+            {"name": "ceo", "size_mb": 2000, "size_profile": "heavy-tail", "manifest": true},
+            {"name": "user", "count": 20, "size_mb": 100}
+          ]
+        }
+      ]
+    }
+
+Each mailbox becomes <output_dir>/<tenant>/<name>.mbox (<name>-NNN with a
+count; .zip for ZIP formats, .gz/.zst when compressed). Mailbox settings fall
+back to the tenant's "defaults", then the spec's; the keys are listed in
+MAILBOX_KEYS and mean the same as the matching generate-test-mbox.py options.
+
+Jobs run on a process pool, largest first: a large mailbox that started last
+would leave the other workers idle while it finishes. Every job gets its own
+seed, derived from the spec seed and the tenant/mailbox name, so the output
+does not depend on the number of workers or on which worker runs a job.
+
+Read-only tables shared by all jobs (the Zipf vocabulary and its alias table,
+the Cc recipient pool, the filler text block, pre-encoded envelope, address
+and attachment part headers) are built once in the parent before the pool
+starts; forked workers share those pages instead of rebuilding them per job.
+Where workers are spawned rather than forked they are built once per worker.
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import time
+from datetime import datetime
+
+from mboxgen import bodytext
+from mboxgen import content
+from mboxgen import distributions
+from mboxgen import engine
+from mboxgen import manifest as mbox_manifest
+from mboxgen import replay
+from mboxgen import shapes
+from mboxgen import sinks
+from mboxgen import templates
+from mboxgen import ziparchive
+from mboxgen.telemetry import Telemetry, merge_stages
+from mboxgen.threads import DEFAULT_MAX_ACTIVE_THREADS
+
+BASE_DATE = datetime(2024, 1, 1, 9, 0, 0)
+
+# Mailbox settings and their defaults.
+MAILBOX_KEYS = {
+    "size_mb": None,
+    "count": 1,
+    "seed": None,
+    "threads": True,
+    "max_active_threads": DEFAULT_MAX_ACTIVE_THREADS,
+    "mix": None,
+    "attachment_size_mb": None,
+    "size_profile": None,
+    "body_text": "templates",
+    "duplicate_ratio": 0.0,
+    "duplicate_mode": "exact",
+    "exact_size": False,
+    "compress": None,
+    "format": "mbox",
+    "manifest": False,
+}
+
+
+def job_seed(base_seed, tenant, mailbox):
+    """Seed for one mailbox; stable across runs and independent of scheduling."""
+    if base_seed is None:
+        return None
+    return random.Random(f"{base_seed}/{tenant}/{mailbox}").getrandbits(64)
+
+
+def output_name(mailbox, compression, archive_format):
+    if archive_format != "mbox":
+        return f"{mailbox}.zip"
+    return f"{mailbox}.mbox" + {"gzip": ".gz", "zstd": ".zst"}.get(compression, "")
+
+
+def build_job(tenant, mailbox, settings, output_dir, profiles):
+    """A picklable job dict from merged mailbox settings; raises ValueError."""
+    size_mb = settings["size_mb"]
+    if not isinstance(size_mb, (int, float)) or size_mb <= 0:
+        raise ValueError("size_mb must be a number greater than 0")
+    archive_format = settings["format"]
+    if archive_format not in ziparchive.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(ziparchive.FORMATS)}")
+    compression = settings["compress"]
+    if compression is not None and compression not in sinks.COMPRESSIONS:
+        raise ValueError(f"compress must be one of {', '.join(sinks.COMPRESSIONS)}")
+    if compression and archive_format != "mbox":
+        raise ValueError("compress cannot be combined with a ZIP format")
+    if settings["body_text"] not in engine.BODY_TEXTS:
+        raise ValueError(f"body_text must be one of {', '.join(engine.BODY_TEXTS)}")
+    for key in ("threads", "exact_size", "manifest"):
+        if not isinstance(settings[key], bool):
+            raise ValueError(f"{key} must be true or false")
+    for key in ("mix", "size_profile"):
+        if settings[key] is not None and not isinstance(settings[key], str):
+            raise ValueError(f"{key} must be a string")
+    if not isinstance(settings["duplicate_mode"], str):
+        raise ValueError("duplicate_mode must be a string")
+    duplicate_ratio = settings["duplicate_ratio"]
+    if not isinstance(duplicate_ratio, (int, float)) or isinstance(duplicate_ratio, bool) or not 0 <= duplicate_ratio < 1:
+        raise ValueError("duplicate_ratio must be a number at least 0 and below 1")
+    max_active_threads = settings["max_active_threads"]
+    if not isinstance(max_active_threads, int) or isinstance(max_active_threads, bool) or max_active_threads < 1:
+        raise ValueError("max_active_threads must be a whole number of at least 1")
+
+    profile = None
+    if settings["size_profile"] is not None:
+        name = settings["size_profile"]
+        if name not in profiles:
+            profiles[name] = distributions.load_profile(name)
+        profile = profiles[name]
+    mix = shapes.parse_mix(settings["mix"]) if settings["mix"] is not None else None
+    if mix is None and profile is not None and "attachments_per_message" in profile:
+        mix = {"attachment": 1}
+    attachment_size = None
+    if settings["attachment_size_mb"] is not None:
+        if not isinstance(settings["attachment_size_mb"], (int, float)) or settings["attachment_size_mb"] <= 0:
+            raise ValueError("attachment_size_mb must be a number greater than 0")
+        attachment_size = int(settings["attachment_size_mb"] * 1024 * 1024)
+
+    output = os.path.join(output_dir, tenant, output_name(mailbox, compression, archive_format))
+    compression = sinks.infer_compression(output, compression)
+    return {
+        "name": f"{tenant}/{mailbox}",
+        "tenant": tenant,
+        "output": output,
+        "target_size": int(size_mb * 1024 * 1024),
+        "seed": job_seed(settings["seed"], tenant, mailbox),
+        "compression": compression,
+        "archive_format": archive_format,
+        "manifest_path": mbox_manifest.manifest_path(output) if settings["manifest"] else None,
+        "options": {
+            "exact_size": settings["exact_size"],
+            "threads": settings["threads"],
+            "max_active_threads": settings["max_active_threads"],
+            "mix": mix,
+            "shape_options": {"attachment_size": attachment_size},
+            "profile": profile,
+            "body_text": settings["body_text"],
+            "duplicate_ratio": settings["duplicate_ratio"],
+            "duplicate_modes": replay.parse_modes(settings["duplicate_mode"]),
+        },
+    }
+
+
+def _settings(layer, where):
+    if not isinstance(layer, dict):
+        raise ValueError(f"{where} must be a JSON object")
+    unknown = set(layer) - set(MAILBOX_KEYS)
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))} (expected {', '.join(MAILBOX_KEYS)})")
+    return layer
+
+
+def load_spec(path, output_dir=None):
+    """Read a job spec into a list of job dicts, largest first; raises ValueError.
+
+    output_dir overrides the spec's "output_dir".
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} is not valid JSON: {e}") from None
+    if not isinstance(spec, dict) or not isinstance(spec.get("tenants"), list) or not spec["tenants"]:
+        raise ValueError(f'{path} must be a JSON object with a non-empty "tenants" list')
+    output_dir = output_dir or spec.get("output_dir")
+    if not output_dir:
+        raise ValueError(f'{path} has no "output_dir" (or pass one on the command line)')
+
+    base = dict(MAILBOX_KEYS, seed=spec.get("seed"))
+    base.update(_settings(spec.get("defaults", {}), "defaults"))
+    profiles = {}
+    jobs = []
+    names = set()
+    for tenant in spec["tenants"]:
+        if not isinstance(tenant, dict) or not tenant.get("name") or not tenant.get("mailboxes"):
+            raise ValueError('every tenant needs a "name" and a non-empty "mailboxes" list')
+        tenant_name = str(tenant["name"])
+        tenant_base = dict(base, **_settings(tenant.get("defaults", {}), f"tenant {tenant_name} defaults"))
+        for mailbox in tenant["mailboxes"]:
+            if not isinstance(mailbox, dict) or not mailbox.get("name"):
+                raise ValueError(f'tenant {tenant_name}: every mailbox needs a "name"')
+            mailbox_name = str(mailbox["name"])
+            settings = dict(mailbox)
+            del settings["name"]
+            settings = dict(tenant_base, **_settings(settings, f"{tenant_name}/{mailbox_name}"))
+            count = settings["count"]
+            if not isinstance(count, int) or count < 1:
+                raise ValueError(f"{tenant_name}/{mailbox_name}: count must be a whole number of at least 1")
+            for number in range(1, count + 1):
+                name = f"{mailbox_name}-{number:03d}" if count > 1 else mailbox_name
+                if (tenant_name, name) in names:
+                    raise ValueError(f"{tenant_name}/{name} is listed twice")
+                names.add((tenant_name, name))
+                try:
+                    jobs.append(build_job(tenant_name, name, settings, output_dir, profiles))
+                except ValueError as e:
+                    raise ValueError(f"{tenant_name}/{name}: {e}") from None
+    # Largest first (longest-processing-time scheduling); ties keep spec order.
+    jobs.sort(key=lambda job: job["target_size"], reverse=True)
+    return jobs
+
+
+def warm_shared_tables(zipf):
+    """Build the read-only tables every job uses, once per process."""
+    content.recipient_pool()
+    content.filler_block()
+    for sender_email in content.FROM_ADDRESSES:
+        for to_email in content.TO_ADDRESSES:
+            templates.envelope_block(sender_email, to_email)
+            for name in content.FROM_NAMES:
+                templates.address_block(name, sender_email, to_email)
+    for content_type, filename, _ in shapes.ATTACHMENT_TYPES:
+        shapes.attachment_part_headers(content_type, filename)
+    if zipf:
+        bodytext.vocabulary()
+        distributions.shared_alias_table(bodytext.zipf_weights())
+
+
+def generate_job(job):
+    """Worker entry point: write one mailbox; returns its stats with name and seconds."""
+    start = time.perf_counter()
+    random.seed(job["seed"])
+    telemetry = Telemetry(job["target_size"], progress=False, timing=True)
+    try:
+        stats = engine.write_file(
+            job["output"],
+            job["target_size"],
+            BASE_DATE,
+            telemetry,
+            dict(job["options"]),
+            compression=job["compression"],
+            archive_format=job["archive_format"],
+            manifest_path=job["manifest_path"],
+        )
+    except Exception as e:
+        raise RuntimeError(f"{job['name']}: {e}") from None
+    stats["name"] = job["name"]
+    stats["tenant"] = job["tenant"]
+    stats["output"] = job["output"]
+    stats["seed"] = job["seed"]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def run_batch(jobs, workers, on_done=None):
+    """Generate every job on a pool of workers; returns (results in completion order, wall seconds).
+
+    on_done(stats, done, total) is called in the parent as jobs finish.
+    """
+    start = time.perf_counter()
+    for job in jobs:
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+    zipf = any(job["options"]["body_text"] == "zipf" for job in jobs)
+    warm_shared_tables(zipf)
+    results = []
+
+    def finished(stats):
+        results.append(stats)
+        if on_done:
+            on_done(stats, len(results), len(jobs))
+
+    if workers == 1:
+        for job in jobs:
+            finished(generate_job(job))
+    else:
+        with multiprocessing.Pool(processes=workers, initializer=warm_shared_tables, initargs=(zipf,)) as pool:
+            # chunksize 1 hands jobs out in list order, so the largest start first.
+            for stats in pool.imap_unordered(generate_job, jobs, chunksize=1):
+                finished(stats)
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall_seconds, workers):
+    """Consolidated throughput figures for a finished batch, as a JSON-friendly dict."""
+    total_bytes = sum(stats["size"] for stats in results)
+    total_emails = sum(stats["emails"] for stats in results)
+    busy_seconds = sum(stats["seconds"] for stats in results)
+    tenants = {}
+    for stats in results:
+        tenant = tenants.setdefault(stats["tenant"], {"mailboxes": 0, "bytes": 0, "emails": 0, "seconds": 0.0})
+        tenant["mailboxes"] += 1
+        tenant["bytes"] += stats["size"]
+        tenant["emails"] += stats["emails"]
+        tenant["seconds"] += stats["seconds"]
+    mailboxes = [
+        {
+            "name": stats["name"],
+            "output": stats["output"],
+            "seed": stats["seed"],
+            "bytes": stats["size"],
+            "emails": stats["emails"],
+            "seconds": round(stats["seconds"], 3),
+            "mb_per_s": round(stats["size"] / 1024 / 1024 / max(stats["seconds"], 1e-9), 2),
+            "emails_per_s": round(stats["emails"] / max(stats["seconds"], 1e-9), 1),
+        }
+        for stats in sorted(results, key=lambda stats: stats["name"])
+    ]
+    return {
+        "workers": workers,
+        "mailboxes": mailboxes,
+        "tenants": dict(sorted(tenants.items())),
+        "bytes": total_bytes,
+        "emails": total_emails,
+        "wall_seconds": round(wall_seconds, 3),
+        "busy_seconds": round(busy_seconds, 3),
+        "mb_per_s": round(total_bytes / 1024 / 1024 / max(wall_seconds, 1e-9), 2),
+        "emails_per_s": round(total_emails / max(wall_seconds, 1e-9), 1),
+        "utilization": round(busy_seconds / max(wall_seconds * workers, 1e-9), 3),
+        "stage_seconds": {
+            stage: round(seconds, 3) for stage, seconds in merge_stages(stats["stages"] for stats in results).items()
+        },
+    }
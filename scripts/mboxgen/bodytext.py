@@ -0,0 +1,212 @@
+"""
+Zipf-distributed body text for full-text indexing stress.
+
+Template bodies give a corpus only a few dozen distinct terms, which makes
+search indexing look unrealistically cheap. ZipfText writes bodies from a
+large vocabulary whose term frequencies follow Zipf's law: a few hundred
+common English words make up most of the text, while domain terms,
+multilingual words (German, French, Spanish, Polish, Russian, Greek, Japanese,
+Chinese) and tens of thousands of rare synthetic words and codes fill the
+long tail. Every body also carries fresh numbers (amounts, dates, ticket
+numbers), so the number of distinct terms keeps growing with the corpus.
+
+Text is produced as cached byte runs: a pool of wrapped paragraphs is built
+from term ranks drawn in vectorized batches (mboxgen.distributions alias
+tables), and a body is a random selection of pooled paragraphs cut to the
+requested length. The pool is refreshed a few paragraphs at a time as bodies
+are written, so new terms keep appearing while the per-message cost stays
+close to that of the templates.
+"""
+
+import random
+from functools import lru_cache
+
+from mboxgen.distributions import Distribution
+
+VOCABULARY_SIZE = 100_000
+ZIPF_EXPONENT = 1.07
+# The vocabulary is built from a fixed seed so it is the same for every corpus.
+VOCABULARY_SEED = 0x5EED
+
+PARAGRAPH_POOL_SIZE = 4096
+PARAGRAPH_WORDS = (20, 90)
+LINE_WIDTH = 72
+# One pooled paragraph is regenerated after this many bodies.
+REFRESH_INTERVAL = 4
+
+# Body lengths (bytes of text) when no size profile gives body_bytes.
+DEFAULT_BODY_BYTES = {"buckets": [[150, 600, 45], [600, 2000, 35], [2000, 8000, 17], [8000, 40000, 3]]}
+
+COMMON_WORDS = (
+    "the of and to a in is that for it as was with be on not he by are this at from but have or "
+    "an they which you were her all she there would their we him been has when who will no more if "
+    "out so up said what its about than into them can only other time new some could these two may "
+    "first then do any like my now over such our man me even most made after also did many off "
+    "before must well back through years much where your way down should because each just those "
+    "people how too little state good very make world still see own men work long here get both "
+    "between life being under never day same another know while last might us great old year come "
+    "since against go came right used take three himself few house use during without again place "
+    "around however home small found thought went say part once general high upon school every "
+    "does got united left number course war until always away something fact though water less "
+    "public put think almost hand enough far took head yet government system better set told "
+    "nothing night end why called didn't eyes find going look asked later knew point next program"
+).split()
+
+DOMAIN_WORDS = (
+    "meeting agenda invoice budget forecast quarterly revenue deadline deliverable stakeholder "
+    "roadmap milestone sprint release deployment migration rollout backlog escalation approval "
+    "contract renewal vendor procurement compliance audit retention policy onboarding offboarding "
+    "headcount payroll reimbursement expense travel itinerary conference webinar presentation "
+    "spreadsheet dashboard metrics analytics pipeline customer prospect pricing discount proposal "
+    "signature attachment archive mailbox inbox calendar invitation reschedule follow-up feedback "
+    "review draft revision version changelog incident outage postmortem ticket support warranty "
+    "shipment delivery tracking inventory warehouse logistics supplier subscription license "
+    "renewal encryption backup restore storage quota latency throughput bandwidth firewall "
+    "certificate credentials password reset account workspace tenant permissions handover"
+).split()
+
+MULTILINGUAL_WORDS = (
+    "danke bitte besprechung rechnung termin übersicht größe straße ärger müssen "
+    "merci réunion facture échéance à bientôt déjà très été français "
+    "gracias reunión factura mañana año señor niño información está también "
+    "dziękuję spotkanie faktura żółty źródło łąka więcej także proszę "
+    "спасибо встреча счёт завтра письмо отчёт пожалуйста сегодня "
+    "ευχαριστώ συνάντηση τιμολόγιο αύριο "
+    "ありがとう 会議 請求書 明日 よろしく お願いします 資料 "
+    "谢谢 会议 发票 明天 报告 邮件"
+).split()
+
+SYLLABLE_ONSETS = ("b", "br", "c", "ch", "d", "dr", "f", "g", "gr", "h", "k", "l", "m", "n", "p", "pr",
+                   "qu", "r", "s", "sh", "st", "t", "th", "tr", "v", "w", "z")
+SYLLABLE_VOWELS = ("a", "e", "i", "o", "u", "ai", "ea", "io", "ou", "y")
+SYLLABLE_CODAS = ("", "", "", "", "", "n", "r", "s", "t", "l", "nd", "st", "x")
+
+
+@lru_cache(maxsize=None)
+def vocabulary(size=VOCABULARY_SIZE):
+    """Encoded terms ordered by Zipf rank, built once from VOCABULARY_SEED.
+
+    Common words take the top ranks; domain and multilingual words are spread
+    over the following few thousand ranks among synthetic words; the tail
+    mixes synthetic words with rare codes and identifiers.
+    """
+    rng = random.Random(VOCABULARY_SEED)
+    words = list(dict.fromkeys(COMMON_WORDS))
+    seen = set(words)
+    special = [word for word in dict.fromkeys(DOMAIN_WORDS + MULTILINGUAL_WORDS) if word not in seen]
+    seen.update(special)
+    positions = sorted(rng.sample(range(len(words), len(words) + 3000), len(special)))
+    while len(words) < size:
+        if positions and len(words) >= positions[0]:
+            positions.pop(0)
+            words.append(special.pop(0))
+            continue
+        if len(words) > 20_000 and rng.random() < 0.15:
+            kind = rng.randrange(3)
+            if kind == 0:
+                word = f"{rng.choice('ABCDEFGHJKLMNPRSTX')}{rng.choice('ABCDEFGHJKLMNPRSTX')}-{rng.randrange(10000, 99999)}"
+            elif kind == 1:
+                word = f"v{rng.randrange(1, 20)}.{rng.randrange(0, 40)}.{rng.randrange(0, 100)}"
+            else:
+                word = f"{rng.getrandbits(32):08x}"
+        else:
+            word = "".join(
+                rng.choice(SYLLABLE_ONSETS) + rng.choice(SYLLABLE_VOWELS) + rng.choice(SYLLABLE_CODAS)
+                for _ in range(rng.choice((1, 2, 2, 2, 3, 3, 4)))
+            )
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return [word.encode("utf-8") for word in words]
+
+
+@lru_cache(maxsize=None)
+def zipf_weights(size=VOCABULARY_SIZE, exponent=ZIPF_EXPONENT):
+    return tuple(1.0 / rank ** exponent for rank in range(1, size + 1))
+
+
+def wrap(tokens, width=LINE_WIDTH):
+    """Join encoded words into lines of at most width bytes (longer words get their own line)."""
+    lines = []
+    line = []
+    used = -1
+    for token in tokens:
+        if used + 1 + len(token) > width and line:
+            lines.append(b" ".join(line))
+            line = []
+            used = -1
+        line.append(token)
+        used += 1 + len(token)
+    lines.append(b" ".join(line))
+    return b"\n".join(lines)
+
+
+def fresh_number():
+    """A number-like term that is new to the corpus most of the time."""
+    kind = random.randrange(4)
+    if kind == 0:
+        return f"{random.randrange(10, 99999):,}.{random.randrange(100):02d} EUR"
+    if kind == 1:
+        return f"2024-{random.randrange(1, 13):02d}-{random.randrange(1, 29):02d}"
+    if kind == 2:
+        return f"#{random.randrange(100000, 9999999)}"
+    return f"+1 {random.randrange(200, 999)} {random.randrange(100, 999)} {random.randrange(1000, 9999)}"
+
+
+class ZipfText:
+    """Body text generator; draws come from the global `random` stream.
+
+    lengths is a Distribution of body sizes in bytes, or None for
+    DEFAULT_BODY_BYTES.
+    """
+
+    def __init__(self, lengths=None, vocabulary_size=VOCABULARY_SIZE):
+        self._words = vocabulary(vocabulary_size)
+        self._ranks = Distribution(
+            "terms", {"values": range(vocabulary_size), "weights": zipf_weights(vocabulary_size)}
+        )
+        self._lengths = lengths or Distribution("body_bytes", DEFAULT_BODY_BYTES)
+        self._pool = self._paragraphs(PARAGRAPH_POOL_SIZE)
+        self._pool_bytes = sum(len(paragraph) for paragraph in self._pool)
+        self._bodies = 0
+        self._refresh_at = 0
+
+    def _paragraphs(self, count):
+        """count new paragraphs, sampled as one batch of term ranks."""
+        low, high = PARAGRAPH_WORDS
+        lengths = [random.randint(low, high) for _ in range(count)]
+        words = self._words
+        terms = [words[rank] for rank in self._ranks.sample(sum(lengths))]
+        paragraphs = []
+        start = 0
+        for length in lengths:
+            tokens = terms[start:start + length]
+            start += length
+            # Sentence breaks every 6-17 words, so the text has some shape.
+            at = random.randint(6, 17)
+            while at < length:
+                tokens[at - 1] += b"."
+                at += random.randint(6, 17)
+            tokens[-1] += b"."
+            paragraphs.append(wrap(tokens))
+        return paragraphs
+
+    def body(self, size=None):
+        """About size bytes of text (a drawn length when size is None), ending in a fresh number."""
+        if size is None:
+            size = self._lengths.draw()
+        pool = self._pool
+        count = max(1, size * len(pool) // self._pool_bytes + 1)
+        text = b"\n\n".join(random.choices(pool, k=count))
+        if len(text) > size:
+            cut = text.rfind(b" ", 0, size)
+            text = text[:cut] if cut > 0 else text[:size]
+        text += f"\n\nRef {fresh_number()}".encode("utf-8")
+
+        self._bodies += 1
+        if self._bodies % REFRESH_INTERVAL == 0:
+            old = pool[self._refresh_at]
+            pool[self._refresh_at] = self._paragraphs(1)[0]
+            self._pool_bytes += len(pool[self._refresh_at]) - len(old)
+            self._refresh_at = (self._refresh_at + 1) % len(pool)
+        return text
@@ -0,0 +1,151 @@
+"""
+Content-addressed cache for seeded corpora.
+
+Sidecar files written next to a corpus (for example its .idx index) are
+cached and restored together with it.
+
+A corpus is keyed by the generator name, its generation parameters, the seed
+and a digest of the generator source code, so editing a generator invalidates
+its cached outputs. Cache hits are materialized as a reflink (copy-on-write
+clone) where the filesystem supports it, otherwise as a hard link, otherwise
+as a plain copy.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+CACHE_ENV_VAR = "EVERMAIL_CORPUS_CACHE"
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)): clone a whole file on btrfs/XFS.
+FICLONE = 0x40049409
+
+
+def default_cache_dir():
+    """Return the cache directory from $EVERMAIL_CORPUS_CACHE or the user cache dir."""
+    if os.environ.get(CACHE_ENV_VAR):
+        return Path(os.environ[CACHE_ENV_VAR]).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "evermail" / "corpora"
+
+
+def source_digest(paths):
+    """Hash generator source files (plus this package) so code changes change the key."""
+    package_dir = Path(__file__).resolve().parent
+    all_paths = sorted({Path(p).resolve() for p in paths} | set(package_dir.glob("*.py")))
+    digest = hashlib.sha256()
+    for path in all_paths:
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def corpus_key(generator, params, sources):
+    """Build the cache key for a corpus generated by `generator` with `params`."""
+    payload = json.dumps(
+        {
+            "generator": generator,
+            "params": params,
+            "source": source_digest(sources),
+            "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_paths(cache_dir, key):
+    cache_dir = Path(cache_dir)
+    return cache_dir / f"{key}.mbox", cache_dir / f"{key}.json"
+
+
+def _reflink(src, dst):
+    """Clone src to dst with copy-on-write; returns False when unsupported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def link_or_copy(src, dst):
+    """Materialize src at dst as a reflink, hard link or copy. Returns the method used."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if _reflink(src, dst):
+        return "reflink"
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copyfile(src, dst)
+        return "copy"
+
+
+def release(*paths):
+    """Unlink any path that shares an inode with another path (e.g. a cache entry).
+
+    Generators open their output with truncation; without this, regenerating
+    over a hard-linked cache hit would corrupt the cached corpus.
+    """
+    for path in paths:
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def fetch(key, output_file, cache_dir=None):
+    """Materialize a cached corpus at output_file.
+
+    Returns (method, metadata) on a hit, or None on a miss.
+    """
+    corpus_path, meta_path = _entry_paths(cache_dir or default_cache_dir(), key)
+    if not corpus_path.exists() or not meta_path.exists():
+        return None
+    metadata = json.loads(meta_path.read_text(encoding="utf-8"))
+    sidecars = metadata.get("sidecars", [])
+    if not all(Path(f"{corpus_path}{suffix}").exists() for suffix in sidecars):
+        return None
+    method = link_or_copy(corpus_path, output_file)
+    for suffix in sidecars:
+        link_or_copy(f"{corpus_path}{suffix}", f"{output_file}{suffix}")
+    return method, metadata
+
+
+def store(key, output_file, metadata, cache_dir=None, sidecars=()):
+    """Add a freshly generated corpus (and its sidecar files) to the cache.
+
+    The entry is linked in under a temporary name and renamed into place, so a
+    concurrent reader never sees a partially written corpus.
+    """
+    cache_dir = Path(cache_dir or default_cache_dir())
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    corpus_path, meta_path = _entry_paths(cache_dir, key)
+
+    for source, target in [(output_file, corpus_path)] + [
+        (f"{output_file}{suffix}", f"{corpus_path}{suffix}") for suffix in sidecars
+    ]:
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{key}.", dir=cache_dir)
+        os.close(fd)
+        try:
+            link_or_copy(source, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    metadata = dict(metadata, sidecars=list(sidecars))
+    meta_path.write_text(json.dumps(metadata, indent=2, sort_keys=True), encoding="utf-8")
+    return corpus_path
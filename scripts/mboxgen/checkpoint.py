@@ -0,0 +1,107 @@
+"""
+Durable checkpoints for resuming and appending to generated corpora.
+
+With checkpointing on, the engine writes <mbox>.ckpt every
+CHECKPOINT_INTERVAL_BYTES and once more at the end. A checkpoint records the
+mbox size and email count it belongs to, plus the complete generator state at
+that point: the `random` state, date clock, Message-ID minter, active threads,
+shape mix, samplers and counters. Before it is written the mbox and its index
+are flushed and fsynced, and it replaces the previous checkpoint atomically, so
+the checkpoint never describes bytes that are not on disk.
+
+Continuing from a checkpoint truncates the mbox and index back to it (dropping
+whatever an interrupted run wrote after it) and carries on from the saved
+state, without reading the existing messages. Resuming an interrupted run
+therefore produces the same bytes as an uninterrupted one, and appending N MB
+to a corpus costs only the N MB. The one exception is the duplicate replay
+cache (see mboxgen.replay), which is not saved: after a resume, duplicates
+replay only emails written since.
+
+Checkpoints are pickles of generator objects and are only meant to be read
+by the same checkout that wrote them.
+"""
+
+import os
+import pickle
+
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL_BYTES = 256 * 1024 * 1024
+
+
+def checkpoint_path(mbox_path):
+    return f"{mbox_path}{CHECKPOINT_SUFFIX}"
+
+
+def fsync_directory(path):
+    """Make a rename in path's directory durable; best effort (not possible on Windows)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Checkpointer:
+    """Write checkpoints for one mbox.
+
+    run describes the generation: base_date, target_size and the write_corpus
+    options; it is saved with every checkpoint next to the generator state.
+    """
+
+    def __init__(self, mbox_path, run, interval=CHECKPOINT_INTERVAL_BYTES):
+        self.path = checkpoint_path(mbox_path)
+        self.run = run
+        self.interval = interval
+        self.saved = 0
+
+    def save(self, f, index_writer, state):
+        """Make everything written so far durable, then atomically replace the checkpoint."""
+        f.flush()
+        os.fsync(f.fileno())
+        index_writer.sync()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as out:
+                pickle.dump(
+                    {"version": CHECKPOINT_VERSION, "run": self.run, "state": state},
+                    out,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        fsync_directory(self.path)
+        self.saved += 1
+
+
+def load(mbox_path, index_path):
+    """The checkpoint of mbox_path as {"run": ..., "state": ...}; raises ValueError.
+
+    The mbox and index must still hold at least the bytes and records the
+    checkpoint describes.
+    """
+    path = checkpoint_path(mbox_path)
+    if not os.path.exists(path):
+        raise ValueError(f"{mbox_path} has no checkpoint ({path}); generate it with --checkpoint")
+    with open(path, "rb") as f:
+        try:
+            saved = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            raise ValueError(f"{path} is not a readable checkpoint ({e})") from None
+    if not isinstance(saved, dict) or saved.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} checkpoint")
+    state = saved["state"]
+    if not os.path.exists(mbox_path) or os.path.getsize(mbox_path) < state["size"]:
+        raise ValueError(f"{mbox_path} is shorter than its checkpoint ({state['size']:,} bytes)")
+    if not os.path.exists(index_path):
+        raise ValueError(f"{index_path} is missing; the checkpoint needs the index sidecar")
+    return saved
@@ -0,0 +1,457 @@
+"""
+Command line shared by the generate-test-mbox*.py scripts.
+
+The scripts only declare their own options, defaults and banner. A script
+builds its parser with build_parser, adds its options and hands it to main
+with a configure(args, settings) function that turns its own options into
+a job:
+
+    {"title": "Generating ...",      # first banner line
+     "banner": ["  - ...", ...],     # script-specific banner lines
+     "options": {...},               # extra mboxgen.engine options
+     "params": {...}}                # extra corpus cache key parameters
+
+and a print_counts(stats) function for its part of the summary. The options
+both generators take, their checks, the corpus cache and the summary live
+here.
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime
+
+from mboxgen import cache as corpus_cache
+from mboxgen import checkpoint
+from mboxgen import distributions
+from mboxgen import emit
+from mboxgen import engine
+from mboxgen import index as mbox_index
+from mboxgen import manifest as mbox_manifest
+from mboxgen import replay
+from mboxgen import sinks
+from mboxgen import ziparchive
+
+BASE_DATE = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def build_parser(description, epilog):
+    """ArgumentParser with the size_mb and output_file arguments."""
+    parser = argparse.ArgumentParser(description=description, epilog=epilog)
+    parser.add_argument("size_mb", help="Target file size in MB")
+    parser.add_argument(
+        "output_file",
+        help='Path of the .mbox file to write, "-" for stdout, a named pipe, or tcp://host:port / unix:/path',
+    )
+    return parser
+
+
+def add_common_arguments(parser):
+    """Add the options both generators take (after the script's own)."""
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; each builds an independent shard (default: 1)",
+    )
+    parser.add_argument(
+        "--exact-size",
+        action="store_true",
+        help="Pad the last email so the file is exactly size_mb MiB",
+    )
+    parser.add_argument(
+        "--attachment-size-mb",
+        type=float,
+        default=None,
+        help="Give every attachment this size instead of the built-in 25-200KB mix (e.g. 50 or 2048)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sinks.COMPRESSIONS,
+        default=None,
+        help="Compress the output on the fly (default: inferred from a .gz/.zst file name)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=ziparchive.FORMATS,
+        default="mbox",
+        help="Write an mbox, a ZIP of .eml files, or a Google Takeout-style ZIP (default: mbox)",
+    )
+    parser.add_argument(
+        "--size-profile",
+        default=None,
+        metavar="NAME|PATH",
+        help="Draw body lengths, recipients and attachment counts/sizes from a distributions profile "
+        "(a JSON file or a built-in name such as heavy-tail)",
+    )
+    parser.add_argument(
+        "--body-text",
+        choices=engine.BODY_TEXTS,
+        default="templates",
+        help="Body text source: the built-in templates, or Zipf-distributed text from a large multilingual "
+        "vocabulary for full-text index stress (default: templates)",
+    )
+    parser.add_argument(
+        "--duplicate-ratio",
+        type=float,
+        default=0.0,
+        help="Share of emails (0-1) that replay an earlier email, to exercise ContentHash deduplication (default: 0)",
+    )
+    parser.add_argument(
+        "--duplicate-mode",
+        default="exact",
+        help="Comma-separated replay modes, picked at random: exact (same bytes), header (extra Received header, "
+        "same ContentHash), forward (re-forwarded copy, new ContentHash) (default: exact)",
+    )
+    parser.add_argument(
+        "--replay-cache-mb",
+        type=int,
+        default=replay.DEFAULT_CACHE_BYTES // 1024 // 1024,
+        help="Memory for recently written emails that duplicates are replayed from (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help=f"Write <output>{checkpoint.CHECKPOINT_SUFFIX} every {checkpoint.CHECKPOINT_INTERVAL_BYTES // 1024 // 1024}MB and at the end, "
+        "so an interrupted run can be resumed and the corpus grown later",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Finish an interrupted --checkpoint run of output_file from its last checkpoint "
+        "(size and generation options come from the checkpoint)",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Grow a --checkpoint corpus by size_mb MB, continuing its dates, threads and Message-IDs "
+        "with the options it was generated with",
+    )
+    parser.add_argument(
+        "--append-emails",
+        type=int,
+        default=None,
+        metavar="N",
+        help="With --append, add N emails (size_mb still caps the added bytes)",
+    )
+    parser.add_argument(
+        "--manifest",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help=f"Write the expected results (per-thread message counts and depths, recipient, attachment and size "
+        f"totals) to PATH as JSON lines (default PATH: <output>{mbox_manifest.MANIFEST_SUFFIX})",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for byte-identical output across runs",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        metavar="PATH",
+        help='Write JSON-lines metrics (throughput, counters, stage timings) to PATH, or "-" for stderr',
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="PATH",
+        help="Run under cProfile and write the stats to PATH (per-shard PATH.shard-NNNN with --workers)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse/store seeded corpora in the local corpus cache (requires --seed)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help=f"Corpus cache directory (default: ${corpus_cache.CACHE_ENV_VAR} or ~/.cache/evermail/corpora)",
+    )
+
+
+def parse_settings(args):
+    """Check the common options; returns the settings generate() uses. Raises ValueError."""
+    try:
+        size_mb = int(args.size_mb)
+    except ValueError:
+        raise ValueError("Size must be a number") from None
+    if size_mb < 1:
+        raise ValueError("Size must be at least 1 MB")
+
+    if args.workers < 1:
+        raise ValueError("--workers must be at least 1")
+    if args.exact_size and size_mb * 1024 * 1024 // args.workers < emit.EXACT_SIZE_RESERVE:
+        raise ValueError("--exact-size needs at least 4KB per worker")
+
+    compression = sinks.infer_compression(args.output_file, args.compress)
+    if compression and args.format != "mbox":
+        raise ValueError("--compress cannot be combined with a ZIP --format (ZIP entries are already deflated)")
+
+    attachment_size = None
+    if args.attachment_size_mb is not None:
+        if args.attachment_size_mb <= 0:
+            raise ValueError("--attachment-size-mb must be greater than 0")
+        attachment_size = int(args.attachment_size_mb * 1024 * 1024)
+
+    size_profile = None
+    if args.size_profile is not None:
+        try:
+            size_profile = distributions.load_profile(args.size_profile)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"--size-profile: {e}") from None
+
+    try:
+        duplicate_modes = replay.parse_modes(args.duplicate_mode)
+    except ValueError as e:
+        raise ValueError(f"--duplicate-mode: {e}") from None
+    if not 0 <= args.duplicate_ratio < 1:
+        raise ValueError("--duplicate-ratio must be at least 0 and below 1")
+    if args.replay_cache_mb < 1:
+        raise ValueError("--replay-cache-mb must be at least 1")
+
+    if args.cache and args.seed is None:
+        raise ValueError("--cache requires --seed")
+    if args.cache and not sinks.is_regular_output(args.output_file):
+        raise ValueError("--cache needs a file as output")
+
+    if args.resume and args.append:
+        raise ValueError("--resume and --append cannot be combined")
+    if args.append_emails is not None and (not args.append or args.append_emails < 1 or args.exact_size):
+        raise ValueError("--append-emails needs --append, at least 1 email and no --exact-size")
+    checkpointed = args.checkpoint or args.resume or args.append
+    if checkpointed and (args.workers > 1 or compression or args.format != "mbox" or args.cache):
+        raise ValueError("--checkpoint, --resume and --append need an uncompressed mbox from one worker, without --cache")
+    if checkpointed and not sinks.is_regular_output(args.output_file):
+        raise ValueError("--checkpoint, --resume and --append need a file as output")
+
+    manifest_path = args.manifest
+    if manifest_path is not None and (args.resume or args.append):
+        raise ValueError("--resume and --append update the manifest the corpus was generated with; drop --manifest")
+    if manifest_path == "":
+        if not sinks.is_regular_output(args.output_file):
+            raise ValueError("--manifest needs a PATH when the output is not a file")
+        manifest_path = mbox_manifest.manifest_path(args.output_file)
+    if manifest_path and args.cache and manifest_path != mbox_manifest.manifest_path(args.output_file):
+        raise ValueError(f"--cache only stores the manifest at the default path (<output>{mbox_manifest.MANIFEST_SUFFIX})")
+
+    return {
+        "size_mb": size_mb,
+        "output_file": args.output_file,
+        "workers": args.workers,
+        "exact_size": args.exact_size,
+        "attachment_size": attachment_size,
+        "compression": compression,
+        "archive_format": args.format,
+        "size_profile": size_profile,
+        "body_text": args.body_text,
+        "duplicate_ratio": args.duplicate_ratio,
+        "duplicate_modes": duplicate_modes,
+        "replay_cache_bytes": args.replay_cache_mb * 1024 * 1024,
+        "seed": args.seed,
+        "use_cache": args.cache,
+        "cache_dir": args.cache_dir,
+        "metrics_path": args.metrics,
+        "profile_path": args.profile,
+        "checkpoint_every": args.checkpoint,
+        "resume": args.resume,
+        "append": args.append,
+        "append_emails": args.append_emails,
+        "manifest_path": manifest_path,
+    }
+
+
+def main(script, parser, configure, print_counts):
+    """Run a generator script: parse and check its command line, then generate or extend the corpus."""
+    add_common_arguments(parser)
+    args = parser.parse_args()
+    sinks.reserve_stdout(args.output_file)
+
+    try:
+        settings = parse_settings(args)
+        job = configure(args, settings)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if settings["size_mb"] > 10000:
+        print(f"Warning: Generating {settings['size_mb']}MB file will take a while...")
+
+    try:
+        if settings["resume"] or settings["append"]:
+            extend(settings, print_counts)
+        else:
+            generate(script, settings, job, print_counts)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def generate(script, settings, job, print_counts):
+    """Generate the corpus for settings and a script's job; returns the stats dict.
+
+    With a seed the output is byte-identical across runs (for the same
+    parameters and Python version). With use_cache, seeded corpora are
+    looked up in and added to the local corpus cache, keyed by the script
+    (its file, __file__) and every parameter. print_counts(stats) prints the
+    script's part of the summary.
+    """
+    output_file = settings["output_file"]
+    size_profile = settings["size_profile"]
+    manifest_path = settings["manifest_path"]
+    cache_key = None
+    if settings["use_cache"] and settings["seed"] is not None:
+        params = {
+            "size_mb": settings["size_mb"],
+            "workers": settings["workers"],
+            "seed": settings["seed"],
+            "compression": settings["compression"],
+            "format": settings["archive_format"],
+            "exact_size": settings["exact_size"],
+            "attachment_size": settings["attachment_size"],
+            "size_profile": size_profile,
+            "body_text": settings["body_text"],
+            "duplicate_ratio": settings["duplicate_ratio"],
+            "duplicate_modes": list(settings["duplicate_modes"]),
+            "replay_cache_bytes": settings["replay_cache_bytes"],
+            "sampler": distributions.backend() if size_profile else None,
+            "manifest": manifest_path is not None,
+            **job["params"],
+        }
+        generator = os.path.splitext(os.path.basename(script))[0]
+        cache_key = corpus_cache.corpus_key(generator, params, [script])
+        hit = corpus_cache.fetch(cache_key, output_file, settings["cache_dir"])
+        if hit:
+            method, metadata = hit
+            print(f"♻️  Reused cached corpus ({method}, key {cache_key[:12]})")
+            stats = dict(metadata["stats"], manifest=manifest_path)
+            print_summary(output_file, stats, print_counts)
+            return stats
+
+    corpus_cache.release(output_file, mbox_index.index_path(output_file), mbox_manifest.manifest_path(output_file))
+    print(job["title"])
+    if settings["seed"] is not None:
+        print(f"  - Seed: {settings['seed']}")
+        random.seed(settings["seed"])
+    if size_profile:
+        print(f"  - Size profile: {size_profile['name']}")
+    if settings["body_text"] != "templates":
+        print(f"  - Body text: {settings['body_text']}")
+    if settings["duplicate_ratio"]:
+        print(f"  - {settings['duplicate_ratio']:.0%} of emails replay an earlier one ({', '.join(settings['duplicate_modes'])})")
+    if settings["attachment_size"] is not None:
+        print(f"  - Every attachment is {settings['attachment_size'] / 1024 / 1024:.1f} MB")
+    for line in job["banner"]:
+        print(line)
+
+    stats = engine.generate_corpus(
+        output_file,
+        settings["size_mb"] * 1024 * 1024,
+        BASE_DATE,
+        workers=settings["workers"],
+        compression=settings["compression"],
+        archive_format=settings["archive_format"],
+        metrics_path=settings["metrics_path"],
+        profile_path=settings["profile_path"],
+        exact_size=settings["exact_size"],
+        shape_options={"attachment_size": settings["attachment_size"]},
+        profile=size_profile,
+        body_text=settings["body_text"],
+        duplicate_ratio=settings["duplicate_ratio"],
+        duplicate_modes=settings["duplicate_modes"],
+        replay_cache_bytes=settings["replay_cache_bytes"],
+        checkpoint_interval=checkpoint.CHECKPOINT_INTERVAL_BYTES if settings["checkpoint_every"] else None,
+        manifest_path=manifest_path,
+        **job["options"],
+    )
+
+    print_summary(output_file, stats, print_counts)
+    if settings["profile_path"]:
+        suffix = ".shard-NNNN" if settings["workers"] > 1 else ""
+        print(f"   Profile: {settings['profile_path']}{suffix} (view with python3 -m pstats)")
+
+    if cache_key:
+        cached_path = corpus_cache.store(
+            cache_key,
+            output_file,
+            {"stats": stats},
+            settings["cache_dir"],
+            sidecars=([] if settings["archive_format"] == "eml-zip" else [mbox_index.INDEX_SUFFIX])
+            + ([mbox_manifest.MANIFEST_SUFFIX] if manifest_path else []),
+        )
+        print(f"   Cached as {cached_path}")
+    return stats
+
+
+def extend(settings, print_counts):
+    """Continue a corpus generated with --checkpoint from its last checkpoint; returns the stats dict.
+
+    With resume this finishes an interrupted run. With append the corpus
+    grows by size_mb MB (or append_emails emails, if that comes first) with
+    the options it was generated with, continuing its dates, threads and
+    Message-IDs; the existing messages are not read again. A manifest
+    written with the corpus is updated as well.
+    """
+    output_file = settings["output_file"]
+    size_mb = settings["size_mb"] if settings["append"] else None
+    max_emails = settings["append_emails"]
+    if size_mb is None:
+        print(f"Resuming {output_file} from its last checkpoint...")
+    elif max_emails is not None:
+        print(f"Appending {max_emails:,} emails (at most {size_mb}MB) to {output_file}...")
+    else:
+        print(f"Appending {size_mb}MB to {output_file}...")
+    stats = engine.resume_corpus(
+        output_file,
+        size_mb * 1024 * 1024 if size_mb is not None else None,
+        max_emails=max_emails,
+        exact_size=settings["exact_size"],
+        metrics_path=settings["metrics_path"],
+        profile_path=settings["profile_path"],
+    )
+    print_summary(output_file, stats, print_counts)
+    return stats
+
+
+def print_summary(output_file, stats, print_counts):
+    """Print the summary of a generated corpus; print_counts(stats) adds the script's email counts."""
+    current_size = stats["size"]
+    email_count = stats["emails"]
+    print(f"\n✅ Generated {output_file}")
+    if sinks.is_regular_output(output_file) and stats.get("format", "mbox") != "eml-zip":
+        print(f"   Index: {mbox_index.index_path(output_file)}")
+    if stats.get("manifest"):
+        print(f"   Manifest: {stats['manifest']}")
+    print(f"   Size: {current_size / 1024 / 1024:.2f} MB")
+    if stats.get("format", "mbox") != "mbox":
+        print(f"   ZIP ({stats['format']}): {stats['compressed_size'] / 1024 / 1024:.2f} MB ({stats['compressed_size'] / current_size:.1%} of the mbox bytes)")
+    elif stats.get("compressed_size"):
+        print(f"   Compressed: {stats['compressed_size'] / 1024 / 1024:.2f} MB ({stats['compressed_size'] / current_size:.1%})")
+    print_counts(stats)
+    duplicates = stats.get("duplicates_exact", 0) + stats.get("duplicates_header", 0)
+    if duplicates or stats.get("duplicates_forward"):
+        print(
+            f"   Duplicates: {stats['duplicates_exact']:,} exact, {stats['duplicates_header']:,} header variants, "
+            f"{stats['duplicates_forward']:,} re-forwarded copies"
+        )
+        print(f"   Expected unique ContentHashes: {email_count - duplicates:,}")
+    for name, scenario in stats.get("stress", {}).items():
+        if "thread" in scenario:
+            print(
+                f"   Stress {name}: thread {scenario['thread']:,}, {scenario['messages']:,} messages, depth {scenario['max_depth']:,}, "
+                f"longest References {scenario['longest_references_bytes'] / 1024:,.1f} KB"
+            )
+        elif name == "recipients":
+            print(
+                f"   Stress {name}: {scenario['messages']:,} emails with {scenario['recipients']:,} To/Cc addresses "
+                f"(Cc header {scenario['header_bytes'] / 1024:,.1f} KB)"
+            )
+        else:
+            print(f"   Stress {name}: {scenario['messages']:,} email of {scenario['bytes'] / 1024 / 1024:,.1f} MB")
+    if "added_size" in stats:
+        print(f"   Added: {stats['added_size'] / 1024 / 1024:.2f} MB, {stats['added_emails']:,} emails")
+    print(f"   Average email size: {current_size / email_count:.0f} bytes")
@@ -0,0 +1,238 @@
+"""
+Sample data and text bodies shared by the corpus generators.
+
+One set of subjects, people and body templates is used for every message
+shape, so threaded and attachment-carrying emails look alike.
+"""
+
+import random
+import textwrap
+from functools import lru_cache
+
+SUBJECTS = [
+    "Q4 Financial Report",
+    "Team Meeting Notes",
+    "Project Status Update",
+    "RE: Budget Approval",
+    "FW: Client Feedback",
+    "Weekly Newsletter",
+    "Action Required: Review Document",
+    "Invitation: Company All-Hands",
+    "Your Amazon.com order has shipped",
+    "GitHub: New pull request in evermail/evermail",
+    "Stripe: Payment successful",
+    "Zoom: Meeting reminder",
+    "LinkedIn: You appeared in 8 searches this week",
+    "Important Security Update",
+    "RE: Question about implementation",
+    "Holiday Schedule 2024",
+    "New features released!",
+    "Server maintenance notification",
+]
+
+FROM_ADDRESSES = [
+    "alice@example.com",
+    "bob@company.com",
+    "charlie@startup.io",
+    "david@enterprise.org",
+    "eve@consulting.com",
+    "frank@agency.net",
+    "grace@university.edu",
+    "henry@government.gov",
+]
+
+FROM_NAMES = [
+    "Alice Johnson",
+    "Bob Smith",
+    "Charlie Davis",
+    "David Wilson",
+    "Eve Martinez",
+    "Frank Anderson",
+    "Grace Lee",
+    "Henry Taylor",
+]
+
+TO_ADDRESSES = [
+    "you@yourcompany.com",
+    "team@company.com",
+    "engineering@startup.io",
+]
+
+SENDER_POOL = list(zip(FROM_NAMES, FROM_ADDRESSES))
+BASE_SUBJECTS = [
+    subject.replace("RE: ", "").replace("FW: ", "").replace("Fwd: ", "")
+    for subject in SUBJECTS
+]
+
+REPLY_INTROS = [
+    "Thanks for the quick response.",
+    "Adding a few notes inline.",
+    "Circling back on this.",
+    "Appreciate the context. See my answers below.",
+]
+
+FORWARD_INTROS = [
+    "Forwarding for visibility.",
+    "Sharing this thread with you.",
+    "FYI - see conversation below.",
+]
+
+# Sentences appended to bodies that a profile draws longer than their template.
+FILLER_SENTENCES = [
+    "I went through the numbers again this morning and most of them line up with last quarter.",
+    "The open question is still whether we can ship the migration before the freeze.",
+    "Legal asked for another review of the retention wording, so I added them to the thread.",
+    "Customer feedback on the beta has been positive, with a few requests around search.",
+    "We should keep an eye on storage costs as the archive keeps growing.",
+    "I moved the sync to Thursday so that everyone in the Berlin office can join.",
+    "Attached notes cover the decisions we made and the items that are still open.",
+    "Please double-check the figures in the second table before we send this out.",
+    "The vendor confirmed the renewal terms but wants a signed copy by the end of the month.",
+    "Let me know if anything here conflicts with what you heard from the support team.",
+]
+FILLER_BLOCK_BYTES = 64 * 1024
+
+# Extra recipients for profiles with a recipients distribution.
+RECIPIENT_POOL_SIZE = 8192
+
+BODY_TEMPLATES = [
+    """Hi team,
+
+Just wanted to follow up on yesterday's discussion. I think we should move forward with the proposed changes.
+
+Let me know your thoughts.
+
+Best regards,
+{sender}""",
+    """Hello,
+
+Please find attached the report you requested. Let me know if you need any clarifications.
+
+Thanks!
+{sender}""",
+    """Quick update:
+
+- Completed tasks A, B, and C
+- Working on task D
+- Blocked on task E (waiting for approval)
+
+Will send detailed update by EOD.
+
+{sender}""",
+    """Hi,
+
+I've reviewed the document and have a few comments:
+
+1. Section 2.3 needs more detail
+2. The timeline in section 4 seems optimistic
+3. Budget allocation should be revised
+
+Can we schedule a call to discuss?
+
+Best,
+{sender}""",
+    """Team,
+
+Reminder: We have our weekly standup tomorrow at 10 AM.
+
+Agenda:
+- Sprint review
+- Blockers discussion
+- Next week planning
+
+See you there!
+{sender}""",
+]
+
+
+def build_body_preview(body):
+    """Store just a short preview for quoting to keep memory usage low."""
+    trimmed_lines = [line.strip() for line in body.strip().splitlines()[:5]]
+    preview = "\n".join(line for line in trimmed_lines if line)
+    return preview or "(no additional content)"
+
+
+@lru_cache(maxsize=None)
+def template_body(template, sender_name):
+    """Encoded body and quoting preview for a BODY_TEMPLATES entry, computed once per sender."""
+    body = template.format(sender=sender_name)
+    return body.encode('utf-8'), build_body_preview(body)
+
+
+@lru_cache(maxsize=1)
+def filler_block():
+    """About FILLER_BLOCK_BYTES of wrapped paragraphs, encoded once."""
+    paragraphs = []
+    size = 0
+    while size < FILLER_BLOCK_BYTES:
+        count = len(paragraphs)
+        sentences = FILLER_SENTENCES[count % 7:] + FILLER_SENTENCES[:count % 7]
+        paragraphs.append(textwrap.fill(" ".join(sentences[:3 + count % 4]), width=72))
+        size += len(paragraphs[-1]) + 2
+    return ("\n\n".join(paragraphs) + "\n").encode('utf-8')
+
+
+def extend_body(body, size):
+    """Grow an encoded body to about size bytes with filler paragraphs; never shrinks it."""
+    missing = size - len(body) - 2
+    if missing <= 0:
+        return body
+    block = filler_block()
+    repeats, rest = divmod(missing, len(block))
+    cut = block.rfind(b" ", 0, rest) if rest else 0
+    return body + b"\n\n" + block * repeats + block[:max(cut, 0)]
+
+
+@lru_cache(maxsize=1)
+def recipient_pool():
+    return [f"Recipient {n:04d} <recipient{n:04d}@example.org>".encode('utf-8') for n in range(RECIPIENT_POOL_SIZE)]
+
+
+def cc_header(count):
+    """Folded Cc header with count addresses (at most RECIPIENT_POOL_SIZE) from the pool."""
+    pool = recipient_pool()
+    count = min(count, len(pool))
+    start = random.randrange(len(pool))
+    addresses = pool[start:start + count]
+    if len(addresses) < count:
+        addresses += pool[:count - len(addresses)]
+    return b"Cc: " + b",\n ".join(addresses) + b"\n"
+
+
+def format_reply_body(sender_name, thread):
+    quoted_lines = "\n".join(f"> {line}" for line in thread.last_preview.splitlines())
+    intro = random.choice(REPLY_INTROS)
+    return (
+        f"{intro}\n\n"
+        f"On {thread.last_date}, {thread.last_sender[0]} wrote:\n"
+        f"{quoted_lines}\n\n"
+        f"Thanks,\n{sender_name}"
+    )
+
+
+def format_forward_body(thread, to_email, sender_name):
+    intro = random.choice(FORWARD_INTROS)
+    previous_name, previous_email = thread.last_sender
+    forwarded_block = (
+        "--- Forwarded message ---\n"
+        f"From: {previous_name} <{previous_email}>\n"
+        f"Date: {thread.last_date}\n"
+        f"Subject: {thread.subject}\n"
+        f"To: {to_email}\n\n"
+        f"{thread.last_preview}\n"
+        "--- End forwarded message ---"
+    )
+    return f"{intro}\n\n{forwarded_block}\n\nThanks,\n{sender_name}"
+
+
+def forwarded_copy_body(original_from, original_date, subject, to_email, body, sender_name):
+    """Encoded body of a message that forwards an earlier message again, quoting its text body."""
+    intro = random.choice(FORWARD_INTROS)
+    return (
+        f"{intro}\n\n"
+        "---------- Forwarded message ---------\n"
+        f"From: {original_from}\n"
+        f"Date: {original_date}\n"
+        f"Subject: {subject}\n"
+        f"To: {to_email}\n\n"
+    ).encode('utf-8') + body + f"\n\nThanks,\n{sender_name}".encode('utf-8')
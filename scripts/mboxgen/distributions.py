@@ -0,0 +1,220 @@
+"""
+Empirical distributions for message sizes and shapes, loaded from a profile.
+
+Real mailboxes are heavy-tailed: most messages are a few KB and a handful are
+huge. A profile is a JSON file that describes the distributions the engine
+draws from instead of its flat defaults:
+
+    {
+      "body_bytes": {"buckets": [[200, 1000, 60], [1000, 8000, 35], [8000, 64000, 5]]},
+      "attachments_per_message": {"values": [0, 1, 2, 5], "weights": [80, 15, 4, 1]},
+      "attachment_bytes": {"buckets": [[1000, 50000, 70], [50000, 5000000, 30]]},
+      "recipients": {"values": [1, 2, 5, 50], "weights": [70, 20, 9, 1]}
+    }
+
+Every key is optional. "values"/"weights" is a discrete distribution; a
+"buckets" entry [low, high, weight] picks the bucket by weight and a value
+uniformly in [low, high). Built-in profiles live in mboxgen/profiles and can
+be named without a path (e.g. "heavy-tail").
+
+Sampling uses Vose alias tables, built once per distribution, so each draw is
+one uniform number and one table lookup whatever the number of values. Draws
+are made in batches of SAMPLE_BATCH; with NumPy installed a batch is a few
+vectorized operations, otherwise one list comprehension over random.random().
+Both are seeded from `random`, so output stays reproducible for a seed (but
+differs between the two backends).
+"""
+
+import json
+import os
+import random
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_KEYS = ("body_bytes", "attachments_per_message", "attachment_bytes", "recipients")
+SAMPLE_BATCH = 4096
+
+
+def backend():
+    """Name of the sampling backend in use, part of corpus cache keys."""
+    return "numpy" if numpy is not None else "python"
+
+
+def build_alias_table(weights):
+    """Vose's alias method: (probabilities, aliases) for O(1) weighted picks."""
+    count = len(weights)
+    total = float(sum(weights))
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    return probabilities, aliases
+
+
+@lru_cache(maxsize=16)
+def shared_alias_table(weights):
+    """build_alias_table for a tuple of weights, built once per process and shared read-only."""
+    return build_alias_table(weights)
+
+
+class Distribution:
+    """One empirical distribution, sampled in batches through an alias table."""
+
+    def __init__(self, name, spec):
+        self.name = name
+        if "buckets" in spec:
+            buckets = spec["buckets"]
+            self._lows = [int(low) for low, _, _ in buckets]
+            self._spans = [int(high) - int(low) for low, high, _ in buckets]
+            weights = [weight for _, _, weight in buckets]
+        else:
+            self._lows = [int(value) for value in spec["values"]]
+            self._spans = [0] * len(self._lows)
+            weights = spec["weights"]
+            if len(weights) != len(self._lows):
+                raise ValueError(f"{name}: values and weights must have the same length")
+        if not weights or any(weight < 0 for weight in weights) or sum(weights) <= 0:
+            raise ValueError(f"{name}: weights must be non-negative and add up to more than 0")
+        if any(low < 0 for low in self._lows) or any(span < 0 for span in self._spans):
+            raise ValueError(f"{name}: values must be non-negative and buckets must have low <= high")
+        if isinstance(weights, tuple):
+            # Large fixed tables (e.g. the Zipf term ranks) are reused across instances.
+            self._probabilities, self._aliases = shared_alias_table(weights)
+        else:
+            self._probabilities, self._aliases = build_alias_table(weights)
+        self._uniform = not any(self._spans)
+        self._batch = []
+        if numpy is not None:
+            self._rng = numpy.random.default_rng(random.getrandbits(64))
+            self._np_probabilities = numpy.array(self._probabilities)
+            self._np_aliases = numpy.array(self._aliases)
+            self._np_lows = numpy.array(self._lows, dtype=numpy.int64)
+            self._np_spans = numpy.array(self._spans, dtype=numpy.int64)
+
+    def mean(self):
+        """Expected value, for summaries and size planning."""
+        count = len(self._lows)
+        weights = [0.0] * count
+        for i, (probability, alias) in enumerate(zip(self._probabilities, self._aliases)):
+            weights[i] += probability / count
+            weights[alias] += (1.0 - probability) / count
+        return sum(weight * (low + span / 2) for weight, low, span in zip(weights, self._lows, self._spans))
+
+    def sample(self, count):
+        """A list of count draws; consecutive calls continue the same random stream."""
+        columns = len(self._lows)
+        if numpy is not None:
+            draws = self._rng.random(count) * columns
+            picks = draws.astype(numpy.int64)
+            picks = numpy.where(draws - picks < self._np_probabilities[picks], picks, self._np_aliases[picks])
+            values = self._np_lows[picks]
+            if not self._uniform:
+                values = values + (self._rng.random(count) * self._np_spans[picks]).astype(numpy.int64)
+            return values.tolist()
+        probabilities, aliases, lows, spans = self._probabilities, self._aliases, self._lows, self._spans
+        picks = [
+            column if draw - column < probabilities[column] else aliases[column]
+            for draw in (random.random() * columns for _ in range(count))
+            for column in (int(draw),)
+        ]
+        if self._uniform:
+            return [lows[pick] for pick in picks]
+        return [lows[pick] + int(random.random() * spans[pick]) for pick in picks]
+
+    def draw(self):
+        if not self._batch:
+            self._batch = self.sample(SAMPLE_BATCH)
+            # Values are popped from the end.
+            self._batch.reverse()
+        return self._batch.pop()
+
+
+def split_zero(spec):
+    """Split a count distribution spec into the share of draws that are 0 and a spec of the rest.
+
+    Drawing 0 with that share and from the rest otherwise gives the original
+    distribution. The rest is None when every draw is 0.
+    """
+    zero = 0.0
+    if "buckets" in spec:
+        total = sum(weight for _, _, weight in spec["buckets"])
+        buckets = []
+        for low, high, weight in spec["buckets"]:
+            low, high = int(low), int(high)
+            if low > 0:
+                buckets.append([low, high, weight])
+            elif high - low <= 1:
+                zero += weight
+            else:
+                zero += weight / (high - low)
+                buckets.append([1, high, weight * (high - low - 1) / (high - low)])
+        rest = {"buckets": buckets} if buckets else None
+    else:
+        total = sum(spec["weights"])
+        values, weights = [], []
+        for value, weight in zip(spec["values"], spec["weights"]):
+            if int(value) == 0:
+                zero += weight
+            else:
+                values.append(value)
+                weights.append(weight)
+        rest = {"values": values, "weights": weights} if values else None
+    if zero >= total:
+        return 1.0, None
+    return zero / total, rest
+
+
+class Profile:
+    """The distributions of one profile; missing keys are None (built-in behavior)."""
+
+    def __init__(self, spec):
+        unknown = set(spec) - set(PROFILE_KEYS) - {"name", "description"}
+        if unknown:
+            raise ValueError(f"unknown profile keys: {', '.join(sorted(unknown))} (expected {', '.join(PROFILE_KEYS)})")
+        self.name = spec.get("name", "custom")
+        for key in PROFILE_KEYS:
+            setattr(self, key, Distribution(key, spec[key]) if key in spec else None)
+
+
+def load_profile(name_or_path):
+    """Read a profile spec (a dict) from a JSON file or a built-in profile name.
+
+    The spec is validated by building a Profile from it once; callers pass the
+    plain dict on (it pickles cheaply to shard workers) and build their own.
+    """
+    path = name_or_path
+    if not os.path.exists(path):
+        builtin = os.path.join(PROFILE_DIR, f"{name_or_path}.json")
+        if not os.path.exists(builtin):
+            available = ", ".join(sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json")))
+            raise ValueError(f"no profile file or built-in profile named '{name_or_path}' (built-in: {available})")
+        path = builtin
+    with open(path, encoding="utf-8") as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from None
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+    state = random.getstate()
+    try:
+        Profile(spec)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{path}: malformed distribution ({e})") from None
+    finally:
+        random.setstate(state)
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return spec
@@ -0,0 +1,151 @@
+"""
+Buffered binary output for the corpus generators.
+
+Messages are handed over as bytes and gathered into large batches that are
+written with a single os.writev call (or one joined write where writev is not
+available), instead of one small text-mode write per message. The target can
+be any output understood by mboxgen.sinks (file, stdout, pipe, socket), and
+batches can be compressed on a background thread.
+"""
+
+import os
+import time
+
+from mboxgen import sinks
+
+WRITE_BATCH_BYTES = 8 * 1024 * 1024
+# Linux IOV_MAX; writev rejects longer buffer lists.
+MAX_IOVECS = 1024
+
+# Exact-size mode stops emitting regular messages once fewer than this many
+# bytes would remain, then writes one standalone message padded to fill the
+# rest. Standalone messages are always smaller than this.
+EXACT_SIZE_RESERVE = 4096
+PAD_LINE = b"x" * 75 + b"\n"
+
+
+def preallocate(fd, size):
+    """Reserve size bytes for fd where the platform supports it; best effort."""
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        pass
+
+
+def pad_message(message, size):
+    """Grow a message (ending in a blank line) to exactly size bytes.
+
+    Filler lines go just before the trailing blank line, so they land at the
+    end of a text/plain body or in the epilogue of a multipart message.
+    """
+    missing = size - len(message)
+    if missing < 0:
+        raise ValueError(f"Message of {len(message)} bytes cannot be padded down to {size} bytes")
+    if missing == 0:
+        return message
+    full_lines, rest = divmod(missing, len(PAD_LINE))
+    padding = PAD_LINE * full_lines
+    if rest:
+        padding += b"x" * (rest - 1) + b"\n"
+    return message[:-1] + padding + message[-1:]
+
+
+class BatchWriter:
+    """Collect bytes and write them to path in large writev batches.
+
+    `position` counts every (uncompressed) byte handed to write(), flushed or
+    not. When preallocate_size is given and path is an uncompressed regular
+    file, the file is reserved up front and truncated back to `position` on
+    close. With compression ("gzip" or "zstd") batches go to a
+    sinks.CompressorThread instead. With a telemetry object (see
+    mboxgen.telemetry) the time spent flushing is reported as the "io" stage;
+    for compressed output that includes waiting for the compressor. With an
+    offset an existing file is continued from that byte (see
+    sinks.open_output) and `position` starts there.
+    """
+
+    def __init__(
+        self, path, preallocate_size=0, batch_bytes=WRITE_BATCH_BYTES, telemetry=None, compression=None, offset=None
+    ):
+        self._fd, is_regular = sinks.open_output(path, offset)
+        self._batch_bytes = batch_bytes
+        self._pending = []
+        self._pending_bytes = 0
+        self._compressor = sinks.CompressorThread(self._fd, compression) if compression else None
+        self._preallocated = preallocate_size > 0 and is_regular and not compression
+        self._telemetry = telemetry
+        self.position = offset or 0
+        if self._preallocated:
+            preallocate(self._fd, preallocate_size)
+
+    @property
+    def compressed_bytes(self):
+        """Bytes written after compression, or None for uncompressed output."""
+        return self._compressor.compressed_bytes if self._compressor else None
+
+    def write(self, data):
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        self.position += len(data)
+        if self._pending_bytes >= self._batch_bytes or len(self._pending) >= MAX_IOVECS:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self._telemetry is not None:
+            start = time.perf_counter()
+            self._flush()
+            self._telemetry.add("io", time.perf_counter() - start)
+        else:
+            self._flush()
+
+    def _flush(self):
+        if self._compressor is not None:
+            self._compressor.submit(self._pending)
+        elif hasattr(os, "writev"):
+            buffers = self._pending
+            remaining = self._pending_bytes
+            while True:
+                written = os.writev(self._fd, buffers)
+                remaining -= written
+                if remaining <= 0:
+                    break
+                # Short write: drop fully written buffers and trim a partial one.
+                i = 0
+                while written >= len(buffers[i]):
+                    written -= len(buffers[i])
+                    i += 1
+                buffers = [memoryview(buffers[i])[written:]] + buffers[i + 1:]
+        else:
+            sinks.write_all(self._fd, b"".join(self._pending))
+        self._pending = []
+        self._pending_bytes = 0
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._fd < 0:
+            return
+        try:
+            self.flush()
+        finally:
+            try:
+                # Always stop the compressor thread before its fd is closed.
+                if self._compressor is not None:
+                    self._compressor.finish()
+                if self._preallocated:
+                    os.ftruncate(self._fd, self.position)
+            finally:
+                os.close(self._fd)
+                self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
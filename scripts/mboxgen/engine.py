@@ -0,0 +1,858 @@
+"""
+Single-pass corpus engine shared by the generate-test-mbox*.py entry points.
+
+For every email the engine decides whether it starts, continues or stays
+outside a thread, composes the headers and text body, and lets a ShapeMix
+(see mboxgen.shapes) wrap the body in its MIME structure. Threads, attachments
+and any other shape therefore mix freely in one streaming pass, and the
+generator scripts only parse arguments and print summaries.
+
+Large corpora can be split across worker processes: each shard gets its own
+byte budget, seed, thread state and date window, and the shards are joined in
+order together with their index sidecars. Output can go to any target
+understood by mboxgen.sinks, optionally compressed, or be packaged as a ZIP of
+.eml files or a Takeout-style ZIP (see mboxgen.ziparchive). Single-worker
+mbox files can be checkpointed, then resumed or grown without regenerating
+them (see mboxgen.checkpoint).
+"""
+
+import contextlib
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+
+from mboxgen import bodytext
+from mboxgen import checkpoint
+from mboxgen import content
+from mboxgen import distributions
+from mboxgen import emit
+from mboxgen import index as mbox_index
+from mboxgen import manifest as mbox_manifest
+from mboxgen import mimeshapes  # noqa: F401  (registers the encoding and MIME-structure shapes)
+from mboxgen import replay
+from mboxgen import sinks
+from mboxgen import templates
+from mboxgen import ziparchive
+from mboxgen.shapes import PlainShape, ShapeMix, encoded_attachment_size, write_attachment_payload
+from mboxgen.stress import ScenarioWriter
+from mboxgen.telemetry import Telemetry, merge_stages, run_profiled
+from mboxgen.threads import DEFAULT_MAX_ACTIVE_THREADS, ThreadPool, ThreadState, draw_thread_length
+
+THREAD_START_CHANCE = 0.25
+THREAD_CONTINUE_CHANCE = 0.4
+
+# Lower bound on the size of one generated email, used to give each parallel
+# shard a date window that cannot overlap the next one.
+MIN_EMAIL_BYTES = 512
+COPY_BUFFER_SIZE = 16 * 1024 * 1024
+BODY_TEXTS = ("templates", "zipf")
+# Leading bytes of a synthesized body used for the preview that replies quote.
+PREVIEW_BYTES = 400
+
+# Stats that are summed when shards are merged; peak_active_threads takes the max.
+SUMMED_STATS = (
+    "size",
+    "emails",
+    "threaded_emails",
+    "thread_starts",
+    "threads_retired",
+    "emails_with_attachments",
+    "attachments",
+    "duplicates_exact",
+    "duplicates_header",
+    "duplicates_forward",
+)
+
+
+def create_thread(thread_id):
+    """Create a new thread with random participants, base subject and target length."""
+    subject = random.choice(content.BASE_SUBJECTS)
+    participant_count = random.randint(2, min(4, len(content.SENDER_POOL)))
+    participants = tuple(random.sample(content.SENDER_POOL, participant_count))
+    required_followups = random.randint(1, 3)
+    return ThreadState(
+        thread_id,
+        subject,
+        participants,
+        required_followups,
+        draw_thread_length(required_followups),
+    )
+
+
+def pick_thread_sender(thread, previous_sender):
+    """Pick a sender from thread participants, avoiding repeats when possible."""
+    candidates = [p for p in thread.participants if p is not previous_sender]
+    if not candidates:
+        candidates = thread.participants
+    return random.choice(candidates)
+
+
+def pick_thread_recipient(thread, sender_email):
+    """Pick a recipient in the thread, falling back to default pool if needed."""
+    candidates = [email for _, email in thread.participants if email != sender_email]
+    if not candidates:
+        candidates = content.TO_ADDRESSES
+    return random.choice(candidates)
+
+
+def compose_email(index, clock, minter, thread=None, thread_action="single", profile=None, synthesizer=None):
+    """Headers and text body of one email (optionally as part of a thread).
+
+    Returns (headers, body, message_id, sender, date_str, body_preview,
+    references, recipients): headers run from the `From ` line through any
+    In-Reply-To / References lines, body is the encoded text body that a shape
+    wraps, references is the References header value ("" when there is none)
+    and recipients counts the To and Cc addresses.
+    With a profile (see mboxgen.distributions) the body is extended to a drawn
+    length and extra recipients go to a Cc header. With a synthesizer (a
+    mboxgen.bodytext.ZipfText) the body starts with synthesized text, sized by
+    the profile's body_bytes when there is one.
+    """
+    mbox_date, date_str = clock.dates(index)
+    thread_headers = b""
+    references = ""
+
+    if thread:
+        sender = pick_thread_sender(thread, thread.last_sender)
+        sender_name, sender_email = sender
+        to_email = pick_thread_recipient(thread, sender_email)
+        base_subject = thread.subject
+
+        if thread_action == "start" or not thread.references:
+            subject = base_subject
+            body, body_preview = content.template_body(random.choice(content.BODY_TEMPLATES), sender_name)
+        else:
+            if thread_action == "forward":
+                subject = f"Fwd: {base_subject}"
+                text = content.format_forward_body(thread, to_email, sender_name)
+            else:
+                subject = f"Re: {base_subject}"
+                text = content.format_reply_body(sender_name, thread)
+            body = text.encode('utf-8')
+            body_preview = content.build_body_preview(text)
+            in_reply_to, references = thread.reply_target()
+            thread_headers = (
+                f"In-Reply-To: {in_reply_to}\n"
+                f"References: {references}\n"
+            ).encode('utf-8')
+    else:
+        sender_name = random.choice(content.FROM_NAMES)
+        sender_email = random.choice(content.FROM_ADDRESSES)
+        sender = (sender_name, sender_email)
+        to_email = random.choice(content.TO_ADDRESSES)
+        subject = random.choice(content.SUBJECTS)
+        body, body_preview = content.template_body(random.choice(content.BODY_TEMPLATES), sender_name)
+
+    message_id = minter.mint(index)
+    headers = templates.render_headers(
+        mbox_date, date_str, message_id, sender_name, sender_email, to_email, subject
+    )
+    if thread_headers:
+        headers += thread_headers
+    recipients = 1
+    if profile is not None and profile.recipients is not None:
+        extra_recipients = profile.recipients.draw() - 1
+        if extra_recipients > 0:
+            headers += content.cc_header(extra_recipients)
+            recipients += min(extra_recipients, content.RECIPIENT_POOL_SIZE)
+    body_size = profile.body_bytes.draw() if profile is not None and profile.body_bytes is not None else None
+    if synthesizer is not None:
+        fresh = synthesizer.body(body_size)
+        body_preview = content.build_body_preview(fresh[:PREVIEW_BYTES].decode('utf-8', 'ignore'))
+        # Replies and forwards keep their quoted part after the new text.
+        body = fresh + b"\n\n" + (body if thread_headers else sender_name.encode('utf-8'))
+    elif body_size is not None:
+        body = content.extend_body(body, body_size)
+    return headers, body, message_id, sender, date_str, body_preview, references, recipients
+
+
+def compose_forwarded_copy(index, clock, minter, original):
+    """Headers and body of a new email that forwards a cached message (a replay.CachedMessage) again."""
+    mbox_date, date_str = clock.dates(index)
+    sender_name, sender_email = random.choice(content.SENDER_POOL)
+    to_email = random.choice(content.TO_ADDRESSES)
+    subject = original.header(b"Subject")
+    message_id = minter.mint(index)
+    headers = templates.render_headers(
+        mbox_date, date_str, message_id, sender_name, sender_email, to_email, f"Fwd: {subject.removeprefix('Fwd: ')}"
+    )
+    body = content.forwarded_copy_body(
+        original.header(b"From"), original.header(b"Date"), subject, to_email, original.body, sender_name
+    )
+    return headers, body, message_id
+
+
+def write_corpus(
+    f,
+    index_writer,
+    target_size,
+    base_date,
+    telemetry,
+    start_index=0,
+    exact_size=False,
+    threads=True,
+    max_active_threads=DEFAULT_MAX_ACTIVE_THREADS,
+    mix=None,
+    shape_options=None,
+    profile=None,
+    body_text="templates",
+    duplicate_ratio=0.0,
+    duplicate_modes=("exact",),
+    replay_cache_bytes=replay.DEFAULT_CACHE_BYTES,
+    max_emails=None,
+    checkpointer=None,
+    resume=None,
+    manifest=None,
+    stress=None,
+):
+    """Write emails to a writer until target_size bytes are written.
+
+    mix maps shape names to weights (default: plain only) and shape_options
+    are passed to the shapes; with threads=False every email is standalone.
+    profile is a distributions spec (see mboxgen.distributions.load_profile)
+    for body lengths, recipients and attachment counts and sizes. body_text
+    "zipf" writes synthesized Zipf-distributed text instead of the templates.
+    With a duplicate_ratio, that share of emails replays an earlier one in one
+    of duplicate_modes (see mboxgen.replay), from an LRU cache of at most
+    replay_cache_bytes. With max_emails, at most that many emails are written.
+    With a checkpointer (see mboxgen.checkpoint) the generator state is
+    saved every checkpointer.interval bytes and at the end; resume is such a
+    saved state to continue from, in which case target_size counts the bytes
+    already written too. manifest is a mboxgen.manifest.ManifestWriter that
+    gets every email and thread; it is finished after the final checkpoint.
+    stress (see mboxgen.stress.parse_stress) writes those scenarios first;
+    regular emails then fill whatever is left of target_size.
+    Every email gets a record in index_writer (see mboxgen.index), and
+    progress and stage timings go to telemetry. With exact_size the last email
+    is a padded standalone plain email that makes the output exactly
+    target_size bytes.
+    """
+    if resume is None:
+        clock = templates.DateClock(base_date)
+        minter = templates.MessageIdMinter()
+        profile = distributions.Profile(profile) if profile else None
+        shapes = ShapeMix(mix, profile=profile, **(shape_options or {}))
+        synthesizer = bodytext.ZipfText() if body_text == "zipf" else None
+        shape_counts = {}
+        current_size = 0
+        email_count = 0
+        pool = ThreadPool(max_active_threads, track_retired=manifest is not None)
+        threaded_email_count = 0
+        thread_starts = 0
+        emails_with_attachments = 0
+        attachment_count = 0
+        duplicate_counts = dict.fromkeys(replay.DUPLICATE_MODES, 0)
+    else:
+        clock, minter, profile, shapes, synthesizer, pool = (
+            resume[name] for name in ("clock", "minter", "profile", "shapes", "synthesizer", "pool")
+        )
+        shape_counts = resume["shape_counts"]
+        duplicate_counts = resume["duplicate_counts"]
+        current_size = resume["size"]
+        email_count = resume["emails"]
+        threaded_email_count = resume["threaded_emails"]
+        thread_starts = resume["thread_starts"]
+        emails_with_attachments = resume["emails_with_attachments"]
+        attachment_count = resume["attachments"]
+        random.setstate(resume["random"])
+    plain = PlainShape()
+    replays = replay.ReplayCache(replay_cache_bytes) if duplicate_ratio > 0 else None
+    start_size = current_size
+    start_emails = email_count
+    email_limit = email_count + max_emails if max_emails is not None else -1
+    next_checkpoint = current_size + checkpointer.interval if checkpointer else float("inf")
+
+    def snapshot():
+        return {
+            "manifest": manifest.snapshot() if manifest else None,
+            "size": current_size,
+            "emails": email_count,
+            "random": random.getstate(),
+            "clock": clock,
+            "minter": minter,
+            "profile": profile,
+            "shapes": shapes,
+            "synthesizer": synthesizer,
+            "pool": pool,
+            "shape_counts": shape_counts,
+            "duplicate_counts": duplicate_counts,
+            "threaded_emails": threaded_email_count,
+            "thread_starts": thread_starts,
+            "emails_with_attachments": emails_with_attachments,
+            "attachments": attachment_count,
+        }
+
+    telemetry.counters = lambda: {
+        "threaded_emails": threaded_email_count,
+        "active_threads": len(pool),
+        "with_attachments": emails_with_attachments,
+    }
+    telemetry.reset_lap()
+
+    stress_stats = None
+    if stress and resume is None:
+        scenarios = ScenarioWriter(f, index_writer, clock, minter, telemetry, start_index, manifest)
+        stress_stats = scenarios.write(stress)
+        current_size = scenarios.size
+        email_count = scenarios.emails
+        threaded_email_count = scenarios.threaded_emails
+        thread_starts = scenarios.thread_starts
+        emails_with_attachments = scenarios.emails_with_attachments
+        attachment_count = scenarios.attachments
+
+    while current_size < target_size and email_count != email_limit:
+        if current_size >= next_checkpoint:
+            checkpointer.save(f, index_writer, snapshot())
+            next_checkpoint = current_size + checkpointer.interval
+            telemetry.reset_lap()
+        thread = None
+        thread_action = "single"
+        replay_mode = None
+        recording = replays is not None
+
+        if replays and random.random() < duplicate_ratio:
+            original = replays.pick()
+            replay_mode = replay.pick_mode(duplicate_modes)
+            if replay_mode != "forward":
+                if replay_mode == "exact":
+                    chunks = original.chunks
+                else:
+                    _, date_str = clock.dates(start_index + email_count)
+                    chunks = replay.header_variant(original, start_index + email_count, date_str)
+                email_bytes = sum(len(chunk) for chunk in chunks)
+                if not exact_size or target_size - current_size - email_bytes >= emit.EXACT_SIZE_RESERVE:
+                    telemetry.lap("synthesis")
+                    for chunk in chunks:
+                        f.write(chunk)
+                    index_writer.add(
+                        current_size,
+                        email_bytes,
+                        original.message_id,
+                        thread_id=original.thread_id,
+                        has_attachment=original.attachments > 0,
+                    )
+                    current_size += email_bytes
+                    email_count += 1
+                    duplicate_counts[replay_mode] += 1
+                    if original.attachments:
+                        emails_with_attachments += 1
+                        attachment_count += original.attachments
+                    if manifest:
+                        manifest.message(
+                            email_bytes, original.recipients, original.attachments, original.attachment_bytes
+                        )
+                    telemetry.lap("io")
+                    telemetry.tick(current_size - start_size, email_count - start_emails)
+                    continue
+                # No room for this replay before the exact-size padding: write a new email instead.
+                replay_mode = None
+
+        if threads and replay_mode is None:
+            thread = pool.pick_pending()
+            if thread:
+                thread_action = random.choices(["reply", "forward"], weights=[0.8, 0.2])[0]
+            elif pool and random.random() < THREAD_CONTINUE_CHANCE:
+                thread = pool.pick_active()
+                thread_action = random.choices(["reply", "forward"], weights=[0.75, 0.25])[0]
+            elif random.random() < THREAD_START_CHANCE:
+                thread = create_thread(thread_starts + 1)
+                thread_action = "start"
+                thread_starts += 1
+        telemetry.lap("threading")
+
+        if replay_mode == "forward":
+            headers, body, message_id = compose_forwarded_copy(start_index + email_count, clock, minter, original)
+            recipients = 1
+            shape = plain
+            duplicate_counts["forward"] += 1
+        else:
+            headers, body, message_id, sender, date_str, body_preview, references, recipients = compose_email(
+                start_index + email_count,
+                clock,
+                minter,
+                thread=thread,
+                thread_action=thread_action,
+                profile=profile,
+                synthesizer=synthesizer,
+            )
+            shape = shapes.pick()
+        head, segments = shape.render(start_index + email_count, body)
+        if shape.rewrites_headers:
+            headers = shape.rewrite_headers(headers)
+        email_bytes = len(headers) + len(head)
+        for payload_size, after in segments:
+            email_bytes += encoded_attachment_size(payload_size) + len(after)
+
+        if exact_size and target_size - current_size - email_bytes < emit.EXACT_SIZE_RESERVE:
+            # Not enough room left for another regular email: finish with a
+            # standalone plain one padded to the exact remaining size.
+            if thread_action == "start":
+                thread_starts -= 1
+            if replay_mode == "forward":
+                duplicate_counts["forward"] -= 1
+            thread = None
+            headers, body, message_id, *_, recipients = compose_email(start_index + email_count, clock, minter)
+            shape = plain
+            head, segments = plain.render(start_index + email_count, body)
+            head = emit.pad_message(headers + head, target_size - current_size)[len(headers):]
+            email_bytes = len(headers) + len(head)
+            # The padding message is a filler, never a replay source.
+            recording = False
+        telemetry.lap("synthesis")
+
+        attachment_bytes = sum(payload_size for payload_size, _ in segments)
+        recording = recording and email_bytes <= replay.MAX_MESSAGE_BYTES
+        out = replay.Recorder(f) if recording else f
+        out.write(headers)
+        out.write(head)
+        for payload_size, after in segments:
+            telemetry.lap("io")
+            write_attachment_payload(out, payload_size)
+            telemetry.lap("attachment_encoding")
+            out.write(after)
+        if recording:
+            replays.add(
+                replay.CachedMessage(
+                    out.chunks,
+                    email_bytes,
+                    message_id,
+                    thread.thread_id if thread else 0,
+                    len(segments),
+                    attachment_bytes,
+                    recipients,
+                    body,
+                )
+            )
+        index_writer.add(
+            current_size,
+            email_bytes,
+            message_id,
+            thread_id=thread.thread_id if thread else 0,
+            has_attachment=bool(segments),
+        )
+        current_size += email_bytes
+        email_count += 1
+        shape_counts[shape.name] = shape_counts.get(shape.name, 0) + 1
+        if segments:
+            emails_with_attachments += 1
+            attachment_count += len(segments)
+        if manifest:
+            manifest.message(email_bytes, recipients, len(segments), attachment_bytes)
+        telemetry.lap("io")
+
+        if thread:
+            thread.add_message(message_id, references, sender, date_str, body_preview)
+            if thread_action == "start":
+                pool.activate(thread)
+            else:
+                pool.record_followup(thread)
+            threaded_email_count += 1
+            if pool.retired_threads:
+                manifest.threads(pool.retired_threads)
+                pool.retired_threads.clear()
+        telemetry.lap("threading")
+        telemetry.tick(current_size - start_size, email_count - start_emails)
+
+    if checkpointer:
+        checkpointer.save(f, index_writer, snapshot())
+    if manifest:
+        # After the checkpoint: an append truncates these lines and rewrites them.
+        manifest.finish(pool.active_threads(), duplicate_counts)
+    stats = {
+        "size": current_size,
+        "emails": email_count,
+        "threaded_emails": threaded_email_count,
+        "thread_starts": thread_starts,
+        "threads_retired": pool.retired,
+        "peak_active_threads": pool.peak_active,
+        "emails_with_attachments": emails_with_attachments,
+        "attachments": attachment_count,
+        "duplicates_exact": duplicate_counts["exact"],
+        "duplicates_header": duplicate_counts["header"],
+        "duplicates_forward": duplicate_counts["forward"],
+        "shapes": shape_counts,
+        "stages": dict(telemetry.stages),
+    }
+    if stress_stats is not None:
+        stats["stress"] = stress_stats
+    return stats
+
+
+def plan_shards(target_size, workers):
+    """Split target_size into per-worker byte budgets with non-overlapping date windows.
+
+    Each shard's first email index is derived from the bytes that precede it,
+    divided by MIN_EMAIL_BYTES. No email is smaller than that, so a shard can
+    never run past the date window of the shard that follows it.
+    """
+    shard_size, remainder = divmod(target_size, workers)
+    shards = []
+    offset = 0
+    for shard_index in range(workers):
+        size = shard_size + (1 if shard_index < remainder else 0)
+        shards.append(
+            {
+                "index": shard_index,
+                "target_size": size,
+                "start_index": offset // MIN_EMAIL_BYTES,
+                "seed": random.getrandbits(64),
+            }
+        )
+        offset += size
+    return shards
+
+
+def open_index_writer(output_file):
+    """IndexWriter for the output's sidecar, or a NullIndexWriter for streamed outputs."""
+    if sinks.is_regular_output(output_file):
+        return mbox_index.IndexWriter(mbox_index.index_path(output_file))
+    return mbox_index.NullIndexWriter()
+
+
+def open_writers(stack, output_file, target_size, telemetry, compression=None, archive_format="mbox"):
+    """(writer, index_writer) for output_file, entered on an ExitStack.
+
+    EML ZIPs split messages on index records themselves and have no sidecar;
+    a Takeout ZIP keeps one, with offsets into the mbox inside the archive.
+    """
+    if archive_format == "eml-zip":
+        writer = stack.enter_context(ziparchive.EmlZipWriter(output_file, telemetry))
+        return writer, writer
+    index_writer = stack.enter_context(open_index_writer(output_file))
+    if archive_format == "takeout-zip":
+        return stack.enter_context(ziparchive.TakeoutZipWriter(output_file, telemetry)), index_writer
+    writer = emit.BatchWriter(output_file, target_size, telemetry=telemetry, compression=compression)
+    return stack.enter_context(writer), index_writer
+
+
+def write_file(
+    output_file,
+    target_size,
+    base_date,
+    telemetry,
+    options,
+    profile_path=None,
+    compression=None,
+    archive_format="mbox",
+    manifest_path=None,
+):
+    """Write one mbox (plus its index, for files, and manifest) with write_corpus, optionally under cProfile."""
+
+    def run():
+        with contextlib.ExitStack() as stack:
+            f, index_writer = open_writers(stack, output_file, target_size, telemetry, compression, archive_format)
+            manifest = stack.enter_context(mbox_manifest.ManifestWriter(manifest_path)) if manifest_path else None
+            stats = write_corpus(f, index_writer, target_size, base_date, telemetry, manifest=manifest, **options)
+        stats["compressed_size"] = f.compressed_bytes
+        return stats
+
+    return run_profiled(profile_path, run) if profile_path else run()
+
+
+def generate_shard(shard, base_date, shard_path, options):
+    """Worker entry point: write one shard with its own seed and thread state.
+
+    options are passed through to write_corpus. Shards never print progress;
+    they time stages when shard["timing"] is set, run under cProfile when
+    shard["profile"] names an output file and write <shard_path>.manifest.jsonl
+    when shard["manifest"] is set.
+    """
+    random.seed(shard["seed"])
+    telemetry = Telemetry(shard["target_size"], progress=False, timing=shard["timing"])
+    stats = write_file(
+        shard_path,
+        shard["target_size"],
+        base_date,
+        telemetry,
+        dict(options, start_index=shard["start_index"]),
+        shard["profile"],
+        manifest_path=mbox_manifest.manifest_path(shard_path) if shard["manifest"] else None,
+    )
+    stats["index"] = shard["index"]
+    return stats
+
+
+def concatenate_shards(shard_paths, output_file, total_size, compression=None, archive_format="mbox"):
+    """Join shard files in order; each shard ends on a blank line so `From ` separators stay valid.
+
+    Returns the compressed (or archive) size for compressed and ZIP output,
+    otherwise None. EML ZIPs are split into messages with the shard indexes.
+    """
+    if archive_format == "eml-zip":
+        with ziparchive.EmlZipWriter(output_file) as out:
+            for shard_path in shard_paths:
+                with open(shard_path, 'rb') as src, mbox_index.IndexReader(mbox_index.index_path(shard_path)) as index:
+                    for record in index:
+                        remaining = record.length
+                        while remaining and (chunk := src.read(min(remaining, COPY_BUFFER_SIZE))):
+                            out.write(chunk)
+                            remaining -= len(chunk)
+                        out.add(record.offset, record.length, "")
+                os.remove(shard_path)
+        return out.compressed_bytes
+
+    if archive_format == "takeout-zip" or compression or not sinks.is_regular_output(output_file):
+        if archive_format == "takeout-zip":
+            out = ziparchive.TakeoutZipWriter(output_file)
+        else:
+            out = emit.BatchWriter(output_file, compression=compression)
+        with out:
+            for shard_path in shard_paths:
+                with open(shard_path, 'rb') as src:
+                    while chunk := src.read(COPY_BUFFER_SIZE):
+                        out.write(chunk)
+                os.remove(shard_path)
+        return out.compressed_bytes
+
+    with open(output_file, 'wb') as out:
+        emit.preallocate(out.fileno(), total_size)
+        for shard_path in shard_paths:
+            with open(shard_path, 'rb') as src:
+                remaining = os.fstat(src.fileno()).st_size
+                if hasattr(os, "copy_file_range"):
+                    try:
+                        while remaining > 0:
+                            copied = os.copy_file_range(src.fileno(), out.fileno(), remaining)
+                            if copied == 0:
+                                break
+                            remaining -= copied
+                        continue
+                    except OSError:
+                        # Cross-filesystem or unsupported; fall back to buffered copy below.
+                        pass
+                shutil.copyfileobj(src, out, COPY_BUFFER_SIZE)
+            os.remove(shard_path)
+    return None
+
+
+def merge_stats(results):
+    """Combine per-shard stats into totals for the whole corpus."""
+    totals = {key: sum(stats[key] for stats in results) for key in SUMMED_STATS}
+    totals["peak_active_threads"] = max(stats["peak_active_threads"] for stats in results)
+    totals["shapes"] = {}
+    for stats in results:
+        for name, count in stats["shapes"].items():
+            totals["shapes"][name] = totals["shapes"].get(name, 0) + count
+    totals["stages"] = merge_stages(stats["stages"] for stats in results)
+    return totals
+
+
+def generate_parallel(
+    target_size,
+    output_file,
+    base_date,
+    workers,
+    options,
+    telemetry,
+    profile_path=None,
+    compression=None,
+    archive_format="mbox",
+    manifest_path=None,
+):
+    """Generate shards on a process pool and join them into output_file.
+
+    Shards are uncompressed temporary files next to the output (in the temp
+    directory for streamed outputs); compression and ZIP packaging happen while
+    joining. With
+    profile_path each shard writes its own profile to <profile_path>.shard-NNNN.
+    Shard manifests are merged into manifest_path.
+    """
+    shards = plan_shards(target_size, workers)
+    for shard in shards:
+        shard["timing"] = telemetry.timing
+        shard["profile"] = f"{profile_path}.shard-{shard['index']:04d}" if profile_path else None
+        shard["manifest"] = manifest_path is not None
+    output_dir = os.path.dirname(os.path.abspath(output_file)) if sinks.is_regular_output(output_file) else None
+    shard_dir = tempfile.mkdtemp(prefix=".mbox-shards-", dir=output_dir)
+    shard_paths = [os.path.join(shard_dir, f"shard-{s['index']:04d}.mbox") for s in shards]
+
+    try:
+        results = []
+        with multiprocessing.Pool(processes=workers) as pool:
+            jobs = [
+                pool.apply_async(generate_shard, (shard, base_date, shard_path, options))
+                for shard, shard_path in zip(shards, shard_paths)
+            ]
+            for job in jobs:
+                stats = job.get()
+                results.append(stats)
+                print(
+                    f"Shard {stats['index'] + 1}/{workers} done "
+                    f"({stats['emails']:,} emails, {stats['size'] / 1024 / 1024:.1f} MB)"
+                )
+                telemetry.report(
+                    sum(stats["size"] for stats in results),
+                    sum(stats["emails"] for stats in results),
+                    event="shard",
+                    stages=merge_stages(stats["stages"] for stats in results),
+                )
+
+        print("Joining shards...")
+        if sinks.is_regular_output(output_file) and archive_format != "eml-zip":
+            mbox_index.merge_shard_indexes(
+                [mbox_index.index_path(path) for path in shard_paths],
+                [stats["size"] for stats in results],
+                [stats["thread_starts"] for stats in results],
+                mbox_index.index_path(output_file),
+            )
+        if manifest_path:
+            mbox_manifest.merge_shard_manifests(
+                [mbox_manifest.manifest_path(path) for path in shard_paths],
+                [stats["thread_starts"] for stats in results],
+                manifest_path,
+            )
+        compressed_size = concatenate_shards(
+            shard_paths, output_file, sum(stats["size"] for stats in results), compression, archive_format
+        )
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    totals = merge_stats(results)
+    totals["compressed_size"] = compressed_size
+    return totals
+
+
+def generate_corpus(
+    output_file,
+    target_size,
+    base_date,
+    workers=1,
+    compression=None,
+    archive_format="mbox",
+    metrics_path=None,
+    profile_path=None,
+    checkpoint_interval=None,
+    manifest_path=None,
+    **options,
+):
+    """Generate output_file and its index sidecar; returns the stats dict.
+
+    output_file can be any mboxgen.sinks target; compression is None, "gzip"
+    or "zstd"; archive_format is one of mboxgen.ziparchive.FORMATS. options
+    are passed to write_corpus. metrics_path ("-" for stderr) receives
+    JSON-lines metrics (see mboxgen.telemetry); profile_path receives a
+    cProfile dump, one per shard when workers > 1. With checkpoint_interval
+    (bytes) an uncompressed single-worker mbox file gets checkpoints that
+    resume_corpus can continue from (see mboxgen.checkpoint). manifest_path
+    receives the expected-results manifest (see mboxgen.manifest).
+    """
+    if sinks.is_regular_output(output_file):
+        # A checkpoint left by an earlier corpus at this path no longer matches it.
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(checkpoint.checkpoint_path(output_file))
+    telemetry = Telemetry(target_size, Telemetry.open_metrics(metrics_path))
+    try:
+        if checkpoint_interval:
+            if workers > 1 or compression or archive_format != "mbox" or not sinks.is_regular_output(output_file):
+                raise ValueError("Checkpoints need a single worker writing an uncompressed mbox file")
+            run = {
+                "base_date": base_date,
+                "target_size": target_size,
+                "options": options,
+                "manifest_path": manifest_path,
+            }
+            options = dict(options, checkpointer=checkpoint.Checkpointer(output_file, run, checkpoint_interval))
+        if workers > 1:
+            print(f"  - Using {workers} worker processes")
+            stats = generate_parallel(
+                target_size,
+                output_file,
+                base_date,
+                workers,
+                options,
+                telemetry,
+                profile_path,
+                compression,
+                archive_format,
+                manifest_path,
+            )
+        else:
+            stats = write_file(
+                output_file,
+                target_size,
+                base_date,
+                telemetry,
+                options,
+                profile_path,
+                compression,
+                archive_format,
+                manifest_path,
+            )
+        stats["format"] = archive_format
+        stats["manifest"] = manifest_path
+        telemetry.finish(stats["size"], stats["emails"], stages=stats["stages"])
+    finally:
+        telemetry.close()
+    return stats
+
+
+def resume_corpus(
+    output_file,
+    added_size=None,
+    max_emails=None,
+    exact_size=False,
+    metrics_path=None,
+    profile_path=None,
+    checkpoint_interval=checkpoint.CHECKPOINT_INTERVAL_BYTES,
+):
+    """Continue a checkpointed mbox file from its last checkpoint; returns the stats dict.
+
+    Without added_size this finishes the interrupted run the checkpoint
+    belongs to. With added_size (bytes) the corpus grows by that much, or by
+    max_emails emails if that comes first, using the options it was generated
+    with; exact_size pads the addition to exactly added_size. Messages
+    already in the file are never read. Stats count the whole corpus, with
+    "added_size" and "added_emails" for this run; stage timings cover this
+    run only. A manifest written with the corpus is brought up to date too.
+    """
+    index_file = mbox_index.index_path(output_file)
+    saved = checkpoint.load(output_file, index_file)
+    run, state = saved["run"], saved["state"]
+    if run.get("manifest_path") and not os.path.exists(run["manifest_path"]):
+        raise ValueError(f"{run['manifest_path']} is missing; the checkpoint needs the manifest")
+    options = dict(run["options"])
+    if added_size is None:
+        target_size = run["target_size"]
+    else:
+        target_size = state["size"] + added_size
+        options["exact_size"] = exact_size
+    telemetry = Telemetry(target_size - state["size"], Telemetry.open_metrics(metrics_path))
+    checkpointer = checkpoint.Checkpointer(
+        output_file, dict(run, target_size=target_size, options=options), checkpoint_interval
+    )
+
+    def resume():
+        with contextlib.ExitStack() as stack:
+            index_writer = stack.enter_context(mbox_index.IndexWriter(index_file, resume_count=state["emails"]))
+            f = stack.enter_context(
+                emit.BatchWriter(output_file, target_size, telemetry=telemetry, offset=state["size"])
+            )
+            manifest = None
+            if run.get("manifest_path"):
+                manifest = stack.enter_context(mbox_manifest.ManifestWriter(run["manifest_path"], state["manifest"]))
+            return write_corpus(
+                f,
+                index_writer,
+                target_size,
+                run["base_date"],
+                telemetry,
+                max_emails=max_emails,
+                checkpointer=checkpointer,
+                resume=state,
+                manifest=manifest,
+                **options,
+            )
+
+    try:
+        stats = run_profiled(profile_path, resume) if profile_path else resume()
+        stats["compressed_size"] = None
+        stats["format"] = "mbox"
+        stats["manifest"] = run.get("manifest_path")
+        stats["added_size"] = stats["size"] - state["size"]
+        stats["added_emails"] = stats["emails"] - state["emails"]
+        telemetry.finish(stats["added_size"], stats["added_emails"], stages=stats["stages"])
+    finally:
+        telemetry.close()
+    return stats
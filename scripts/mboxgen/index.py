@@ -0,0 +1,194 @@
+"""
+Byte-offset index sidecar written next to every generated mbox (<mbox>.idx).
+
+Layout (little-endian):
+
+    header  16 bytes  magic b"EVMBXIDX", version u16, record size u16, reserved u32
+    record  32 bytes  offset u64, length u64, Message-ID hash u64,
+                      thread id u32 (0 = standalone), flags u8, 3 pad bytes
+
+`offset` points at the message's `From ` line and `length` covers the whole
+message including its trailing blank line, so offset + length of one record is
+the offset of the next. The Message-ID hash is the first 8 bytes of BLAKE2b
+over the ID normalized the way MailboxProcessingService does (angle brackets
+trimmed, lower-cased). The record count is (file size - 16) / 32, which lets
+consumers mmap the file and jump to any record directly.
+
+For compressed outputs (test.mbox.gz) offsets refer to the decompressed mbox.
+Streamed outputs (stdout, pipes, sockets) get no index.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+MAGIC = b"EVMBXIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<QQQIB3x")
+
+FLAG_ATTACHMENT = 0x01
+
+INDEX_SUFFIX = ".idx"
+WRITE_BATCH_RECORDS = 4096
+MERGE_BATCH_RECORDS = 65536
+
+IndexRecord = namedtuple("IndexRecord", "offset length message_id_hash thread_id flags")
+
+
+def index_path(mbox_path):
+    return f"{mbox_path}{INDEX_SUFFIX}"
+
+
+def message_id_hash(message_id):
+    normalized = message_id.strip().strip("<>").lower().encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(normalized, digest_size=8).digest(), "little")
+
+
+class IndexWriter:
+    """Append fixed-width records to an index file, flushing in batches.
+
+    With resume_count the existing index is kept up to its first resume_count
+    records (anything after them is dropped) and new records follow them.
+    """
+
+    def __init__(self, path, resume_count=None):
+        if resume_count is None:
+            self._file = open(path, "wb")
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+            self.count = 0
+        else:
+            self._file = open(path, "r+b")
+            end = HEADER.size + resume_count * RECORD.size
+            if os.fstat(self._file.fileno()).st_size < end:
+                self._file.close()
+                raise ValueError(f"{path} has fewer than {resume_count:,} records")
+            self._file.truncate(end)
+            self._file.seek(end)
+            self.count = resume_count
+        self._pending = []
+
+    def add(self, offset, length, message_id, thread_id=0, has_attachment=False):
+        flags = FLAG_ATTACHMENT if has_attachment else 0
+        self._pending.append(RECORD.pack(offset, length, message_id_hash(message_id), thread_id, flags))
+        self.count += 1
+        if len(self._pending) >= WRITE_BATCH_RECORDS:
+            self._flush()
+
+    def _flush(self):
+        self._file.write(b"".join(self._pending))
+        self._pending.clear()
+
+    def sync(self):
+        """Write pending records and fsync the file."""
+        self._flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class NullIndexWriter:
+    """IndexWriter stand-in for outputs without a sidecar (stdout, pipes, sockets)."""
+
+    count = 0
+
+    def add(self, offset, length, message_id, thread_id=0, has_attachment=False):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+class IndexReader:
+    """Random access to an index file through mmap."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{path} is too small to be an mbox index")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} mbox index")
+        self._count = (size - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return IndexRecord(*RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size))
+
+    def __iter__(self):
+        body = memoryview(self._map)[HEADER.size:HEADER.size + self._count * RECORD.size]
+        try:
+            for fields in RECORD.iter_unpack(body):
+                yield IndexRecord(*fields)
+        finally:
+            body.release()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def merge_shard_indexes(shard_index_paths, shard_sizes, shard_thread_counts, output_path):
+    """Concatenate per-shard indexes, rebasing offsets and thread ids onto the joined mbox."""
+    base_offset = 0
+    base_thread = 0
+    with open(output_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+        for path, size, thread_count in zip(shard_index_paths, shard_sizes, shard_thread_counts):
+            with open(path, "rb") as src:
+                src.seek(HEADER.size)
+                while True:
+                    chunk = src.read(RECORD.size * MERGE_BATCH_RECORDS)
+                    if not chunk:
+                        break
+                    out.write(
+                        b"".join(
+                            RECORD.pack(
+                                offset + base_offset,
+                                length,
+                                mid_hash,
+                                thread_id + base_thread if thread_id else 0,
+                                flags,
+                            )
+                            for offset, length, mid_hash, thread_id, flags in RECORD.iter_unpack(chunk)
+                        )
+                    )
+            os.remove(path)
+            base_offset += size
+            base_thread += thread_count
@@ -0,0 +1,191 @@
+"""
+Expected-results manifest written while a corpus is generated (<mbox>.manifest.jsonl).
+
+Ingestion benchmarks can check their results against the manifest instead
+of scanning the corpus again. It is a JSON-lines file:
+
+    {"type": "thread", "thread": 12, "root": "<...>", "subject": "...",
+     "messages": 7, "depth": 3, "participants": 3}
+    ...
+    {"type": "totals", "emails": ..., "bytes": ..., ...}
+
+There is one "thread" line per conversation, written when the thread is
+retired (threads still active at the end follow at the end). `thread` is
+the id in the .idx sidecar (see mboxgen.index). `root` is the root
+Message-ID, which ingestion uses as the thread key. `messages` counts the
+thread's distinct messages. `depth` is the largest References count of any
+message in the thread, which is what CalculateThreadDepth returns: 0 for a
+lone root, N for a reply whose References lists N Message-IDs. References
+are trimmed at MAX_REFERENCES (see mboxgen.threads) or at the --stress
+references cap (see mboxgen.stress), so depth never exceeds the cap.
+
+The last line holds the totals:
+- email and byte counts, threaded and standalone emails (exact and
+  header-variant duplicates, see mboxgen.replay, are counted as neither);
+- recipients (To plus Cc addresses);
+- emails with attachments, attachment parts and decoded attachment bytes
+  (streamed binary attachments; forwarded message/rfc822 parts are not
+  counted);
+- a message size histogram keyed by power-of-two upper bounds;
+- duplicate counts and the expected number of unique ContentHashes.
+
+Lines are buffered and written in batches, and only counters are kept in
+memory, so the manifest costs a few counter updates per email.
+"""
+
+import json
+import os
+
+MANIFEST_SUFFIX = ".manifest.jsonl"
+WRITE_BATCH_LINES = 1024
+
+# Totals that are added up when shard manifests are merged.
+SUMMED_TOTALS = (
+    "emails",
+    "bytes",
+    "threads",
+    "threaded_emails",
+    "standalone_emails",
+    "recipients",
+    "emails_with_attachments",
+    "attachments",
+    "attachment_bytes",
+    "expected_unique_content_hashes",
+)
+
+
+def manifest_path(output_path):
+    return f"{output_path}{MANIFEST_SUFFIX}"
+
+
+def new_totals():
+    totals = dict.fromkeys(SUMMED_TOTALS, 0)
+    totals["max_depth"] = 0
+    totals["size_histogram"] = {}
+    totals["duplicates"] = {}
+    return totals
+
+
+def thread_record(thread):
+    return {
+        "type": "thread",
+        "thread": thread.thread_id,
+        "root": thread.references.split(" ", 1)[0],
+        "subject": thread.subject,
+        "messages": thread.messages,
+        "depth": thread.max_depth,
+        "participants": len(thread.participants),
+    }
+
+
+class ManifestWriter:
+    """Stream thread lines and keep running totals for one corpus.
+
+    resume is a snapshot() to continue from (see mboxgen.checkpoint): the
+    file is cut back to the snapshot's offset and its totals are restored.
+    """
+
+    def __init__(self, path, resume=None):
+        self.path = path
+        if resume is None:
+            self._file = open(path, "wb")
+            self._totals = new_totals()
+            self._sizes = [0] * 64  # count per (size - 1).bit_length()
+        else:
+            self._file = open(path, "r+b")
+            self._file.truncate(resume["offset"])
+            self._file.seek(resume["offset"])
+            self._totals = resume["totals"]
+            self._sizes = resume["sizes"]
+        self._pending = []
+
+    def message(self, size, recipients, attachments, attachment_bytes):
+        """Count one written email."""
+        totals = self._totals
+        totals["emails"] += 1
+        totals["bytes"] += size
+        totals["recipients"] += recipients
+        if attachments:
+            totals["emails_with_attachments"] += 1
+            totals["attachments"] += attachments
+            totals["attachment_bytes"] += attachment_bytes
+        self._sizes[(size - 1).bit_length()] += 1
+
+    def threads(self, threads):
+        """Write a line per finished thread."""
+        totals = self._totals
+        for thread in threads:
+            totals["threads"] += 1
+            totals["threaded_emails"] += thread.messages
+            if thread.max_depth > totals["max_depth"]:
+                totals["max_depth"] = thread.max_depth
+            self._pending.append(json.dumps(thread_record(thread), ensure_ascii=False).encode('utf-8') + b"\n")
+        if len(self._pending) >= WRITE_BATCH_LINES:
+            self._flush()
+
+    def _flush(self):
+        self._file.write(b"".join(self._pending))
+        self._pending.clear()
+
+    def snapshot(self):
+        """Flush and fsync, then return the state a resumed ManifestWriter needs."""
+        self._flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.tell(), "totals": json.loads(json.dumps(self._totals)), "sizes": list(self._sizes)}
+
+    def finish(self, active_threads, duplicates):
+        """Write the still-active threads and the totals line.
+
+        duplicates maps duplicate modes (see mboxgen.replay) to counts.
+        """
+        self.threads(active_threads)
+        totals = self._totals
+        copies = duplicates.get("exact", 0) + duplicates.get("header", 0)
+        totals["standalone_emails"] = totals["emails"] - totals["threaded_emails"] - copies
+        totals["size_histogram"] = {str(1 << bits): count for bits, count in enumerate(self._sizes) if count}
+        totals["duplicates"] = dict(duplicates)
+        totals["expected_unique_content_hashes"] = totals["emails"] - copies
+        self._pending.append(json.dumps(dict(type="totals", **totals)).encode('utf-8') + b"\n")
+        self._flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def merge_shard_manifests(shard_manifest_paths, shard_thread_counts, output_path):
+    """Concatenate per-shard manifests, rebasing thread ids like mbox_index.merge_shard_indexes."""
+    totals = new_totals()
+    base_thread = 0
+    with open(output_path, "wb") as out:
+        for path, thread_count in zip(shard_manifest_paths, shard_thread_counts):
+            with open(path, "rb") as src:
+                lines = []
+                for line in src:
+                    record = json.loads(line)
+                    if record["type"] == "thread":
+                        record["thread"] += base_thread
+                        lines.append(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+                        if len(lines) >= WRITE_BATCH_LINES:
+                            out.write(b"".join(lines))
+                            lines.clear()
+                        continue
+                    for key in SUMMED_TOTALS:
+                        totals[key] += record[key]
+                    totals["max_depth"] = max(totals["max_depth"], record["max_depth"])
+                    for field in ("size_histogram", "duplicates"):
+                        for key, count in record[field].items():
+                            totals[field][key] = totals[field].get(key, 0) + count
+                out.write(b"".join(lines))
+            os.remove(path)
+            base_thread += thread_count
+        totals["size_histogram"] = dict(sorted(totals["size_histogram"].items(), key=lambda item: int(item[0])))
+        out.write(json.dumps(dict(type="totals", **totals)).encode('utf-8') + b"\n")
@@ -0,0 +1,326 @@
+"""
+Encoding and MIME-structure variety shapes, for decoder benchmarks.
+
+The default shapes send every body as 7bit/8bit UTF-8 text/plain and every
+attachment in one multipart/mixed layout. The shapes here cover the other
+decoding paths a MIME parser has:
+
+    quoted-printable  text/plain, Content-Transfer-Encoding: quoted-printable
+    base64-body       text/plain, Content-Transfer-Encoding: base64
+    charset           text/plain in a legacy charset (ISO-8859-1/2/7,
+                      windows-1252, KOI8-R, Shift_JIS, GB2312)
+    encoded-words     text/plain with RFC 2047 encoded From and Subject
+    alternative       multipart/alternative with a text and a
+                      quoted-printable HTML part
+    rfc822            multipart/mixed forwarding a message/rfc822 part,
+                      nested up to MAX_NESTING levels deep
+
+The "mime-variety" --mix preset (see mboxgen.shapes.MIX_PRESETS) mixes all
+of them with plain messages. Encodings are cached: encoded bodies up to
+CACHED_BODY_BYTES (template bodies repeat constantly), encoded header lines,
+HTML renderings and nested-message headers are each computed once, so
+turning the expensive encodings on costs little generation speed.
+"""
+
+import base64
+import binascii
+import html
+import random
+import zlib
+from email.header import Header
+from functools import lru_cache, partial
+
+from mboxgen import content
+from mboxgen.shapes import PlainShape, register_shape, transfer_encoding
+
+# Bodies up to this size have their encoded forms cached; larger ones are
+# mostly unique and are encoded on every use.
+CACHED_BODY_BYTES = 16 * 1024
+ENCODING_CACHE_ENTRIES = 2048
+
+# (MIME charset label, Python codec, closing line in that script)
+CHARSETS = (
+    ("ISO-8859-1", "iso-8859-1", "Mit freundlichen Grüßen, à bientôt, señor García."),
+    ("windows-1252", "cp1252", "“Thanks” — the €1,250 invoice is attached…"),
+    ("ISO-8859-2", "iso-8859-2", "Dziękuję bardzo, pozdrawiam. Příliš žluťoučký kůň."),
+    ("ISO-8859-7", "iso-8859-7", "Ευχαριστώ πολύ, τα λέμε αύριο."),
+    ("KOI8-R", "koi8-r", "С уважением, отдел продаж."),
+    ("Shift_JIS", "shift_jis", "よろしくお願いします。資料をお送りします。"),
+    ("GB2312", "gb2312", "谢谢，祝工作顺利。"),
+)
+
+# Appended to encoded subjects so the encoded words carry non-ASCII text.
+SUBJECT_SUFFIXES = ("Überprüfung", "réunion", "reunión", "przegląd", "отчёт", "会議の資料", "συνάντηση", "报告")
+
+# Nesting depth of forwarded messages, drawn per message.
+NESTING_DEPTHS = (1, 1, 1, 2, 3)
+MAX_NESTING = max(NESTING_DEPTHS)
+NESTED_DATE = "Mon, 01 Jan 2024 08:00:00 +0000"
+
+TEXT_PART_HEADERS = b"Content-Type: text/plain; charset=UTF-8\nContent-Transfer-Encoding: "
+
+
+def single_part_headers(content_type, encoding):
+    return (
+        b"MIME-Version: 1.0\n"
+        b"Content-Type: " + content_type + b"\n"
+        b"Content-Transfer-Encoding: " + encoding + b"\n"
+        b"X-Mailer: Example Mail Client 1.0\n"
+        b"\n"
+    )
+
+
+QUOTED_PRINTABLE_HEADERS = single_part_headers(b"text/plain; charset=UTF-8", b"quoted-printable")
+BASE64_HEADERS = single_part_headers(b"text/plain; charset=UTF-8", b"base64")
+
+
+@lru_cache(maxsize=ENCODING_CACHE_ENTRIES)
+def _cached_encoding(encoder, body):
+    return encoder(body)
+
+
+def encode_body(encoder, body):
+    """encoder(body), cached for bodies up to CACHED_BODY_BYTES."""
+    if len(body) > CACHED_BODY_BYTES:
+        return encoder(body)
+    return _cached_encoding(encoder, body)
+
+
+def quoted_printable(body):
+    return binascii.b2a_qp(body)
+
+
+def base64_lines(body):
+    """76-column base64 lines, ending in a newline."""
+    return base64.encodebytes(body)
+
+
+def transcode(codec, closing, body):
+    """The UTF-8 body in another charset (unmappable characters become "?"), plus a closing line."""
+    return (body.decode('utf-8', 'replace') + "\n\n" + closing).encode(codec, 'replace')
+
+
+# (MIME headers, encoder) per charset
+CHARSET_ENCODERS = tuple(
+    (single_part_headers(b"text/plain; charset=" + label.encode('ascii'), b"8bit"), partial(transcode, codec, closing))
+    for label, codec, closing in CHARSETS
+)
+
+
+def html_document(body):
+    """A small HTML rendering of a text body: one <p> per paragraph."""
+    paragraphs = body.decode('utf-8', 'replace').split("\n\n")
+    rendered = "\n".join(f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>" for paragraph in paragraphs)
+    return (
+        '<html><head><meta charset="UTF-8"></head><body style="font-family: Arial, sans-serif;">\n'
+        f"{rendered}\n</body></html>"
+    ).encode('utf-8')
+
+
+def html_quoted_printable(body):
+    return binascii.b2a_qp(html_document(body))
+
+
+def fingerprint(data):
+    """Stable choice key (hash() of str/bytes changes between processes)."""
+    return zlib.crc32(data)
+
+
+@lru_cache(maxsize=4096)
+def encoded_subject_line(line):
+    """An RFC 2047 version of a "Subject: ...\\n" line, with a non-ASCII suffix."""
+    subject = line[len(b"Subject: "):-1].decode('utf-8')
+    suffix = SUBJECT_SUFFIXES[fingerprint(line) % len(SUBJECT_SUFFIXES)]
+    encoded = Header(f"{subject} – {suffix}", "utf-8", header_name="Subject").encode(linesep="\n")
+    return f"Subject: {encoded}\n".encode('ascii')
+
+
+@lru_cache(maxsize=4096)
+def encoded_from_line(line):
+    """An RFC 2047 version of a "From: Name <address>\\n" line (ISO-8859-1 display name)."""
+    name, _, address = line[len(b"From: "):-1].decode('utf-8').rpartition(" ")
+    return f"From: {Header(name, 'iso-8859-1').encode()} {address}\n".encode('ascii')
+
+
+@lru_cache(maxsize=None)
+def nested_headers(sender, to_email, subject):
+    """Headers of a forwarded message, up to (not including) its Message-ID value."""
+    sender_name, sender_email = sender
+    return (
+        f"From: {sender_name} <{sender_email}>\n"
+        f"To: {to_email}\n"
+        f"Subject: {subject}\n"
+        f"Date: {NESTED_DATE}\n"
+        "MIME-Version: 1.0\n"
+        "Message-ID: "
+    ).encode('utf-8')
+
+
+@register_shape
+class QuotedPrintableShape:
+    """text/plain in quoted-printable."""
+
+    name = "quoted-printable"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        return QUOTED_PRINTABLE_HEADERS + encode_body(quoted_printable, body) + b"\n\n", ()
+
+
+@register_shape
+class Base64BodyShape:
+    """text/plain in base64."""
+
+    name = "base64-body"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        return BASE64_HEADERS + encode_body(base64_lines, body) + b"\n", ()
+
+
+@register_shape
+class CharsetShape:
+    """text/plain transcoded to a random legacy charset, sent as 8bit."""
+
+    name = "charset"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        headers, encoder = random.choice(CHARSET_ENCODERS)
+        return headers + encode_body(encoder, body) + b"\n\n", ()
+
+
+@register_shape
+class EncodedWordsShape:
+    """text/plain whose From display name and Subject are RFC 2047 encoded words."""
+
+    name = "encoded-words"
+    rewrites_headers = True
+
+    def __init__(self, **options):
+        self.plain = PlainShape()
+
+    def rewrite_headers(self, headers):
+        from_at = headers.find(b"\nFrom: ") + 1
+        from_end = headers.find(b"\n", from_at) + 1
+        subject_at = headers.find(b"\nSubject: ", from_end - 1) + 1
+        subject_end = headers.find(b"\n", subject_at) + 1
+        return b"".join(
+            (
+                headers[:from_at],
+                encoded_from_line(headers[from_at:from_end]),
+                headers[from_end:subject_at],
+                encoded_subject_line(headers[subject_at:subject_end]),
+                headers[subject_end:],
+            )
+        )
+
+    def render(self, index, body):
+        return self.plain.render(index, body)
+
+
+@register_shape
+class AlternativeShape:
+    """multipart/alternative: the text body plus a quoted-printable HTML rendering."""
+
+    name = "alternative"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        boundary = f"----=_Alt_{index}_{random.randint(1000, 9999)}".encode('ascii')
+        head = b"".join(
+            [
+                b'MIME-Version: 1.0\nContent-Type: multipart/alternative; boundary="',
+                boundary,
+                b'"\n\n--',
+                boundary,
+                b"\n",
+                TEXT_PART_HEADERS,
+                transfer_encoding(body),
+                b"\n\n",
+                body,
+                b"\n\n--",
+                boundary,
+                b"\nContent-Type: text/html; charset=UTF-8\nContent-Transfer-Encoding: quoted-printable\n\n",
+                encode_body(html_quoted_printable, body),
+                b"\n\n--",
+                boundary,
+                b"--\n\n",
+            ]
+        )
+        return head, ()
+
+
+@register_shape
+class ForwardedMessageShape:
+    """multipart/mixed with a short note and the body forwarded as message/rfc822.
+
+    The forwarded message can itself forward a message, down to a depth drawn
+    from NESTING_DEPTHS; the innermost one carries the body.
+    """
+
+    name = "rfc822"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        depth = random.choice(NESTING_DEPTHS)
+        senders = [random.choice(content.SENDER_POOL) for _ in range(depth)]
+        subjects = [random.choice(content.SUBJECTS) for _ in range(depth)]
+        to_email = random.choice(content.TO_ADDRESSES)
+        serial = random.randint(1000, 9999)
+
+        # Innermost message first, then wrap it once per level.
+        message = b"".join(
+            [
+                nested_headers(senders[-1], to_email, subjects[-1]),
+                f"<nested.{index:x}.{depth}@mail.example.org>\n".encode('ascii'),
+                TEXT_PART_HEADERS,
+                transfer_encoding(body),
+                b"\n\n",
+                body,
+                b"\n",
+            ]
+        )
+        for level in range(depth - 1, -1, -1):
+            boundary = f"----=_Fwd_{index}_{level}_{serial}".encode('ascii')
+            if level:
+                prefix = nested_headers(senders[level - 1], to_email, subjects[level - 1])
+                prefix += f"<nested.{index:x}.{level}@mail.example.org>\n".encode('ascii')
+            else:
+                prefix = b"MIME-Version: 1.0\n"
+            message = b"".join(
+                [
+                    prefix,
+                    b'Content-Type: multipart/mixed; boundary="',
+                    boundary,
+                    b'"\n\n--',
+                    boundary,
+                    b"\n",
+                    TEXT_PART_HEADERS,
+                    b"7bit\n\nForwarding the message below.\n\n--",
+                    boundary,
+                    b'\nContent-Type: message/rfc822\nContent-Disposition: attachment; filename="forwarded-',
+                    str(level + 1).encode('ascii'),
+                    b'.eml"\n\n',
+                    message,
+                    b"\n--",
+                    boundary,
+                    b"--\n",
+                ]
+            )
+        return message + b"\n", ()
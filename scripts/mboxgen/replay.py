@@ -0,0 +1,135 @@
+"""
+Replay of previously written messages, for ContentHash deduplication tests.
+
+MailboxProcessingService hashes every message as SHA-256 over the mailbox id,
+Message-ID, Subject, Date, From address, snippet and text/HTML bodies, and
+skips messages whose hash it has already seen. With a duplicate ratio the
+engine replays earlier messages from a ReplayCache instead of composing new
+ones, in one of three modes:
+
+    exact    the cached bytes again; same ContentHash
+    header   the same message with an extra Received header (a second
+             delivery); transport headers are not hashed, so same ContentHash
+    forward  a new message (new Message-ID, Date and "Fwd:" subject) that
+             quotes the original; a new ContentHash
+
+The cache keeps the encoded chunks of recent messages (no copies are made)
+and evicts the least recently used ones past a byte budget. Picking,
+touching and evicting an entry are all O(1), and a replay costs one write of
+bytes that already exist, so duplicate-heavy corpora are cheaper to generate.
+"""
+
+import random
+from collections import OrderedDict
+
+DUPLICATE_MODES = ("exact", "header", "forward")
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Larger messages (big attachments) are never cached or replayed.
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+RELAY_HEADER = (
+    "Received: from relay{relay}.example.net (relay{relay}.example.net [10.0.{relay}.25])\n"
+    "    by mx.example.com (Postfix) with ESMTP id DUP{number:06d}; {date}\n"
+)
+
+
+class CachedMessage:
+    """Encoded chunks of one written message plus what its index and manifest records need."""
+
+    __slots__ = ("chunks", "size", "message_id", "thread_id", "attachments", "attachment_bytes", "recipients", "body")
+
+    def __init__(self, chunks, size, message_id, thread_id, attachments, attachment_bytes, recipients, body):
+        self.chunks = chunks
+        self.size = size
+        self.message_id = message_id
+        self.thread_id = thread_id
+        self.attachments = attachments
+        self.attachment_bytes = attachment_bytes
+        self.recipients = recipients
+        self.body = body  # text body, quoted by forwarded copies
+
+    def header(self, name):
+        """Value of a header (e.g. b"Subject") from the message's own header block, as str."""
+        headers = self.chunks[0]
+        at = headers.find(b"\n" + name + b": ")
+        if at < 0:
+            return ""
+        start = at + len(name) + 3
+        return headers[start:headers.find(b"\n", start)].decode('utf-8')
+
+
+class Recorder:
+    """Writer wrapper that also keeps the written chunks for the cache."""
+
+    __slots__ = ("f", "chunks")
+
+    def __init__(self, f):
+        self.f = f
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return self.f.write(data)
+
+
+class ReplayCache:
+    """Bounded LRU of CachedMessage entries with O(1) random picks."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> CachedMessage, least recently used first
+        self._keys = []  # for random picks
+        self._positions = {}  # key -> index in _keys
+        self._next_key = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, entry):
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = entry
+        self._positions[key] = len(self._keys)
+        self._keys.append(key)
+        self.size += entry.size
+        while self.size > self.max_bytes and len(self._keys) > 1:
+            self._evict()
+
+    def _evict(self):
+        key, entry = self._entries.popitem(last=False)
+        self.size -= entry.size
+        position = self._positions.pop(key)
+        last = self._keys.pop()
+        if last != key:
+            self._keys[position] = last
+            self._positions[last] = position
+
+    def pick(self):
+        """A random cached message, which becomes the most recently used."""
+        key = self._keys[random.randrange(len(self._keys))]
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+
+def header_variant(entry, number, date_str):
+    """The cached message with an extra Received header after the envelope line."""
+    first = entry.chunks[0]
+    line_end = first.index(b"\n") + 1
+    relay = RELAY_HEADER.format(relay=number % 250 + 1, number=number, date=date_str).encode('utf-8')
+    return [first[:line_end] + relay + first[line_end:]] + entry.chunks[1:]
+
+
+def parse_modes(spec):
+    """Parse "exact,header" into a tuple of DUPLICATE_MODES; raises ValueError."""
+    modes = tuple(dict.fromkeys(mode.strip() for mode in spec.split(",") if mode.strip()))
+    for mode in modes:
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"unknown duplicate mode '{mode}' (choose from {', '.join(DUPLICATE_MODES)})")
+    if not modes:
+        raise ValueError("at least one duplicate mode is needed")
+    return modes
+
+
+def pick_mode(modes):
+    return modes[0] if len(modes) == 1 else random.choice(modes)
@@ -0,0 +1,264 @@
+"""
+Message shapes: the MIME structure wrapped around an email's text body.
+
+A shape turns the body chosen by the engine into (head, segments): the MIME
+headers and parts up to the first streamed attachment payload, then one
+(payload_size, after) pair per attachment, where payload_size raw bytes are
+streamed as base64 and followed by the `after` bytes (the next part's
+headers, or the closing boundary). A message without attachments has no
+segments. Shapes register themselves by name in SHAPES, and a ShapeMix picks
+one per message from a weighted profile such as "plain=70,attachment=30".
+
+New shapes only need a class with `name`, `rewrites_headers` and render(),
+plus the @register_shape decorator; they become available to --mix in every
+generator. A shape with rewrites_headers = True also gets the message's
+header block (envelope line through Subject) passed through
+rewrite_headers(headers). Shapes receive the engine's options, including
+`profile` (a mboxgen.distributions.Profile or None) for empirical size
+distributions. The encoding and MIME-structure shapes live in
+mboxgen.mimeshapes.
+"""
+
+import base64
+import random
+from functools import lru_cache
+
+SHAPES = {}
+
+DEFAULT_MIX = {"plain": 1}
+
+# Named mixes accepted by parse_mix in place of "name=weight,..." lists.
+MIX_PRESETS = {
+    "mime-variety": {
+        "plain": 30,
+        "quoted-printable": 15,
+        "base64-body": 10,
+        "charset": 10,
+        "encoded-words": 10,
+        "alternative": 15,
+        "rfc822": 10,
+    },
+}
+
+# Attachment types and sizes (in bytes)
+ATTACHMENT_TYPES = [
+    ("application/pdf", "document.pdf", 50000),  # 50KB PDF
+    ("image/jpeg", "photo.jpg", 200000),  # 200KB JPEG
+    ("application/vnd.ms-excel", "spreadsheet.xlsx", 75000),  # 75KB Excel
+    ("application/msword", "document.doc", 60000),  # 60KB Word
+    ("text/csv", "data.csv", 30000),  # 30KB CSV
+    ("application/zip", "archive.zip", 150000),  # 150KB ZIP
+    ("image/png", "screenshot.png", 180000),  # 180KB PNG
+    ("application/json", "data.json", 25000),  # 25KB JSON
+]
+
+# Attachment payloads are produced and encoded in chunks of this many raw bytes.
+# 57 raw bytes encode to exactly one 76-column base64 line (RFC 2045), so every
+# chunk ends on a line boundary and memory stays constant for any attachment size.
+BASE64_LINE_BYTES = 57
+ATTACHMENT_CHUNK_BYTES = BASE64_LINE_BYTES * 16 * 1024  # ~912KB raw, ~1.2MB encoded
+
+PLAIN_MIME_HEADERS = (
+    b"MIME-Version: 1.0\n"
+    b"Content-Type: text/plain; charset=UTF-8\n"
+    b"Content-Transfer-Encoding: 7bit\n"
+    b"X-Mailer: Example Mail Client 1.0\n"
+    b"\n"
+)
+# Bodies with non-ASCII text (e.g. from mboxgen.bodytext) are sent as 8bit.
+PLAIN_MIME_HEADERS_8BIT = PLAIN_MIME_HEADERS.replace(b"7bit", b"8bit")
+
+
+def transfer_encoding(body):
+    return b"7bit" if body.isascii() else b"8bit"
+
+
+def encoded_attachment_size(size_bytes):
+    """Return the number of bytes write_attachment_payload emits for size_bytes of data"""
+    full_lines, tail = divmod(size_bytes, BASE64_LINE_BYTES)
+    size = full_lines * 77  # 76 base64 characters + newline
+    if tail:
+        size += (tail + 2) // 3 * 4 + 1
+    return size
+
+
+def write_attachment_payload(f, size_bytes):
+    """Stream size_bytes of random data to f as 76-column base64 lines.
+
+    Payload bytes come from random.randbytes in bulk, and each chunk is encoded
+    and written before the next one is generated.
+    """
+    written = 0
+    remaining = size_bytes
+    while remaining > 0:
+        chunk_size = min(remaining, ATTACHMENT_CHUNK_BYTES)
+        encoded = base64.encodebytes(random.randbytes(chunk_size))
+        f.write(encoded)
+        written += len(encoded)
+        remaining -= chunk_size
+    return written
+
+
+def register_shape(cls):
+    """Class decorator that makes a shape selectable by its name."""
+    SHAPES[cls.name] = cls
+    return cls
+
+
+def parse_mix(spec):
+    """Parse "name=weight,name=weight" into a {name: weight} dict.
+
+    A bare name counts as weight 1, and a MIX_PRESETS name stands for its
+    mix. Raises ValueError for unknown shapes, negative weights or a mix
+    whose weights add up to zero.
+    """
+    if spec.strip() in MIX_PRESETS:
+        return dict(MIX_PRESETS[spec.strip()])
+    mix = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SHAPES:
+            raise ValueError(
+                f"unknown shape '{name}' (available: {', '.join(sorted(SHAPES))}; presets: {', '.join(MIX_PRESETS)})"
+            )
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"weight for '{name}' must be a number") from None
+        if mix[name] < 0:
+            raise ValueError(f"weight for '{name}' must not be negative")
+    if sum(mix.values()) <= 0:
+        raise ValueError("at least one shape needs a positive weight")
+    return mix
+
+
+def format_mix(mix):
+    """Inverse of parse_mix, for progress output and cache keys."""
+    return ",".join(f"{name}={weight:g}" for name, weight in mix.items())
+
+
+class ShapeMix:
+    """Weighted choice of shape instances.
+
+    Cumulative weights are computed once, so picking a shape costs one
+    random.choices call; a mix with a single shape makes no random call at all.
+    options are passed to every shape's constructor (e.g. attachment_size).
+    """
+
+    def __init__(self, weights=None, **options):
+        weights = {name: weight for name, weight in (weights or DEFAULT_MIX).items() if weight > 0}
+        self.shapes = [SHAPES[name](**options) for name in weights]
+        self._cum_weights = []
+        total = 0.0
+        for weight in weights.values():
+            total += weight
+            self._cum_weights.append(total)
+        self._bind_pick()
+
+    def _bind_pick(self):
+        if len(self.shapes) == 1:
+            only = self.shapes[0]
+            self.pick = lambda: only
+
+    def __getstate__(self):
+        # The single-shape shortcut is a lambda, which cannot be pickled (see mboxgen.checkpoint).
+        state = self.__dict__.copy()
+        state.pop("pick", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_pick()
+
+    def pick(self):
+        return random.choices(self.shapes, cum_weights=self._cum_weights)[0]
+
+
+@register_shape
+class PlainShape:
+    """Single text/plain part."""
+
+    name = "plain"
+    rewrites_headers = False
+
+    def __init__(self, **options):
+        pass
+
+    def render(self, index, body):
+        headers = PLAIN_MIME_HEADERS if body.isascii() else PLAIN_MIME_HEADERS_8BIT
+        return headers + body + b"\n\n", ()
+
+
+@lru_cache(maxsize=None)
+def attachment_part_headers(content_type, filename):
+    return (
+        f"Content-Type: {content_type}\n"
+        "Content-Transfer-Encoding: base64\n"
+        f'Content-Disposition: attachment; filename="{filename}"\n'
+        "\n"
+    ).encode('utf-8')
+
+
+@register_shape
+class AttachmentShape:
+    """multipart/mixed with the text body and streamed base64 attachments.
+
+    Without a profile every message gets one attachment sized from
+    ATTACHMENT_TYPES. A profile's attachments_per_message decides how many
+    (0 renders a plain message) and its attachment_bytes how large;
+    attachment_size (bytes) fixes the size either way.
+    """
+
+    name = "attachment"
+    rewrites_headers = False
+
+    def __init__(self, attachment_size=None, profile=None, **options):
+        self.attachment_size = attachment_size
+        self.counts = profile.attachments_per_message if profile else None
+        self.sizes = profile.attachment_bytes if profile else None
+        self.plain = PlainShape()
+
+    def pick_attachment(self, number):
+        content_type, filename, size_bytes = random.choice(ATTACHMENT_TYPES)
+        if self.attachment_size is not None:
+            size_bytes = self.attachment_size
+        elif self.sizes is not None:
+            size_bytes = self.sizes.draw()
+        if number > 1:
+            stem, _, extension = filename.rpartition(".")
+            filename = f"{stem}-{number}.{extension}"
+        return attachment_part_headers(content_type, filename), size_bytes
+
+    def render(self, index, body):
+        count = self.counts.draw() if self.counts is not None else 1
+        if count == 0:
+            return self.plain.render(index, body)
+        part_headers, size_bytes = self.pick_attachment(1)
+        boundary = f"----=_Part_{index}_{random.randint(1000, 9999)}".encode('ascii')
+        head = b"".join(
+            [
+                b'MIME-Version: 1.0\nContent-Type: multipart/mixed; boundary="',
+                boundary,
+                b'"\n\nThis is a multi-part message in MIME format.\n\n--',
+                boundary,
+                b"\nContent-Type: text/plain; charset=UTF-8\nContent-Transfer-Encoding: ",
+                transfer_encoding(body),
+                b"\n\n",
+                body,
+                b"\n\n--",
+                boundary,
+                b"\n",
+                part_headers,
+            ]
+        )
+        segments = []
+        for number in range(2, count + 1):
+            next_headers, next_size = self.pick_attachment(number)
+            segments.append((size_bytes, b"\n--" + boundary + b"\n" + next_headers))
+            size_bytes = next_size
+        segments.append((size_bytes, b"\n--" + boundary + b"--\n\n"))
+        return head, segments
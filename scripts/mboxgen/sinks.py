@@ -0,0 +1,194 @@
+"""
+Output targets for the corpus generators.
+
+A target is a file path, "-" for stdout, an existing named pipe, or a socket
+address ("tcp://host:port" or "unix:/path/to/socket"). Regular files get an
+index sidecar and are preallocated; streams get neither, and their writes block
+when the reader falls behind, which is the back-pressure that keeps memory
+bounded.
+
+Output can be compressed with gzip or zstd on the fly. Compression runs on a
+background thread fed through a bounded queue of write batches: zlib and zstd
+release the GIL while compressing, so generation keeps running in parallel,
+and a full queue stalls the generator instead of buffering without limit.
+"""
+
+import os
+import queue
+import socket
+import stat
+import sys
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+COMPRESSIONS = ("gzip", "zstd")
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Write batches (up to WRITE_BATCH_BYTES each, see mboxgen.emit) waiting for
+# the compressor thread before the generator blocks.
+COMPRESS_QUEUE_BATCHES = 8
+
+# Kernel buffer sizes requested for pipes and sockets; best effort.
+PIPE_BUFFER_BYTES = 1024 * 1024
+SOCKET_BUFFER_BYTES = 4 * 1024 * 1024
+F_SETPIPE_SZ = 1031  # Linux fcntl command; not exposed by the fcntl module before 3.10
+
+
+def is_stdout(target):
+    return target == "-"
+
+
+def socket_address(target):
+    """(family, address) for a socket target, or None for anything else."""
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Socket target must look like tcp://host:port, got {target}")
+        return socket.AF_INET, (host.strip("[]"), int(port))
+    if target.startswith("unix:"):
+        return socket.AF_UNIX, target[len("unix:"):].removeprefix("//")
+    return None
+
+
+def is_regular_output(target):
+    """True when target is (or will be created as) a regular file."""
+    if is_stdout(target) or socket_address(target):
+        return False
+    try:
+        return stat.S_ISREG(os.stat(target).st_mode)
+    except FileNotFoundError:
+        return True
+
+
+def infer_compression(target, compression=None):
+    """The requested compression, or the one implied by a .gz / .zst file name."""
+    if compression is None and is_regular_output(target):
+        compression = COMPRESSION_SUFFIXES.get(os.path.splitext(target)[1])
+    if compression == "zstd" and zstd is None:
+        raise ValueError("zstd output needs Python 3.14+ or the zstandard package (pip install zstandard)")
+    return compression
+
+
+def reserve_stdout(target):
+    """Send print() output to stderr when the corpus itself goes to stdout."""
+    if is_stdout(target):
+        sys.stdout = sys.stderr
+
+
+def open_output(target, offset=None):
+    """Open target for writing; returns (fd, is_regular_file).
+
+    With an offset an existing file is kept up to offset bytes (the rest is
+    cut off) and writing continues there.
+    """
+    if is_stdout(target):
+        fd = os.dup(sys.__stdout__.fileno())
+    else:
+        address = socket_address(target)
+        if address:
+            family, addr = address
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_BYTES)
+                sock.connect(addr)
+            except OSError:
+                sock.close()
+                raise
+            return sock.detach(), False
+        if offset is None:
+            fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        else:
+            fd = os.open(target, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+            os.ftruncate(fd, offset)
+            os.lseek(fd, offset, os.SEEK_SET)
+
+    mode = os.fstat(fd).st_mode
+    if stat.S_ISFIFO(mode) and fcntl is not None:
+        try:
+            fcntl.fcntl(fd, F_SETPIPE_SZ, PIPE_BUFFER_BYTES)
+        except OSError:
+            pass
+    return fd, stat.S_ISREG(mode)
+
+
+def write_all(fd, data):
+    """os.write until every byte of data has been written."""
+    data = memoryview(data)
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def new_compressor(compression):
+    """An object with compress(bytes) and flush() for the given compression."""
+    if compression == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == "zstd":
+        if hasattr(zstd, "ZstdCompressor") and hasattr(zstd.ZstdCompressor, "compressobj"):
+            return zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()  # zstandard package
+        return zstd.ZstdCompressor(level=ZSTD_LEVEL)  # compression.zstd
+    raise ValueError(f"Unknown compression '{compression}' (choose from {', '.join(COMPRESSIONS)})")
+
+
+class CompressorThread:
+    """Compress write batches on a background thread and write them to fd.
+
+    submit() blocks while COMPRESS_QUEUE_BATCHES batches are waiting. An error
+    on the thread (e.g. the reader closed the pipe) is re-raised in the
+    generator on the next submit() or on finish().
+    """
+
+    def __init__(self, fd, compression):
+        self._fd = fd
+        self._compressor = new_compressor(compression)
+        self._queue = queue.Queue(maxsize=COMPRESS_QUEUE_BATCHES)
+        self._error = None
+        self.compressed_bytes = 0
+        self._thread = threading.Thread(target=self._run, name="mbox-compressor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    self._write(self._compressor.flush())
+                    return
+                self._write(self._compressor.compress(b"".join(batch)))
+        except BaseException as e:
+            self._error = e
+            # Keep draining so a blocked submit() can notice the error.
+            while self._queue.get() is not None:
+                pass
+
+    def _write(self, data):
+        if data:
+            write_all(self._fd, data)
+            self.compressed_bytes += len(data)
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, batch):
+        self._check()
+        self._queue.put(batch)
+
+    def finish(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._check()
@@ -0,0 +1,342 @@
+"""
+Stress scenarios: pathological mailboxes for finding the scaling limits of ingestion.
+
+With --stress the corpus starts with the named scenarios, and regular emails
+fill the rest of the requested size:
+
+- mega-thread=N: one conversation of N messages (default 100,000). Each
+  reply answers a random earlier message, so every message lands in the same
+  thread while reply depth only grows with log N.
+- deep-thread=N: one unbroken reply chain of N messages (default 10,000).
+  The last reply's References lists all N-1 ancestors, which is the depth
+  CalculateThreadDepth reports, and its header runs to hundreds of KB.
+- recipients=N: one ingestion batch (BATCH_MESSAGES emails) with N To/Cc
+  addresses each (default 5,000).
+- huge-message=MB: one email of about MB megabytes (default 1,100), nearly
+  all of it a streamed base64 attachment.
+- references=folded|full|N: how References headers are written. "folded"
+  (the default) puts one Message-ID per line and "full" writes one unfolded
+  line however long it gets. A number N caps the chain at N Message-IDs: the
+  root and the newest N-1, the way mail clients trim it.
+
+Generation is linear in the bytes written, and memory does not grow with the
+size of a message. A thread keeps one parent per message in a 32-bit array,
+plus the References chain of the newest message, rendered once. A reply to
+that message or one of its ancestors extends or trims the rendered chain
+instead of joining it again. Other replies walk up from their parent only
+until they meet the rendered chain. Recipient entries have a fixed width, so
+header lengths are computed rather than built. Large headers are written in
+HEADER_CHUNK_BYTES pieces and attachments are streamed as usual (see
+mboxgen.shapes).
+"""
+
+import itertools
+import random
+from array import array
+
+from mboxgen import content
+from mboxgen import templates
+from mboxgen.shapes import BASE64_LINE_BYTES, AttachmentShape, PlainShape, encoded_attachment_size, write_attachment_payload
+from mboxgen.threads import ThreadState
+
+# Scenario names, in the order they are written, and their default sizes.
+SCENARIOS = {
+    "mega-thread": 100_000,
+    "deep-thread": 10_000,
+    "recipients": 5_000,
+    "huge-message": 1_100,
+}
+REFERENCE_MODES = ("folded", "full")
+
+# Emails per ingestion batch (MailboxProcessingService.BatchSize); the recipients scenario fills one.
+BATCH_MESSAGES = 500
+# Large headers are written in pieces of about this size.
+HEADER_CHUNK_BYTES = 64 * 1024
+# Recipient headers up to this size are built once and reused for the whole batch.
+RECIPIENT_CACHE_BYTES = 16 * 1024 * 1024
+THREAD_PARTICIPANTS = 4
+RECIPIENT_DOMAIN = "example.org"
+
+
+def parse_stress(spec):
+    """Parse "name[=value],..." into {scenario: value, "references": mode}.
+
+    A bare name uses its default from SCENARIOS. Raises ValueError for unknown
+    names, values below 1 and a spec without any scenario.
+    """
+    stress = {}
+    references = "folded"
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition("=")
+        name, value = name.strip(), value.strip()
+        if name == "references":
+            if value in REFERENCE_MODES:
+                references = value
+                continue
+            try:
+                references = int(value)
+            except ValueError:
+                references = 0
+            if references < 2:
+                raise ValueError("references must be folded, full or a cap of at least 2 Message-IDs")
+            continue
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name}' (available: {', '.join(SCENARIOS)}, references)")
+        try:
+            stress[name] = int(value) if value else SCENARIOS[name]
+        except ValueError:
+            raise ValueError(f"value for '{name}' must be a whole number") from None
+        if stress[name] < 1:
+            raise ValueError(f"value for '{name}' must be at least 1")
+    if not stress:
+        raise ValueError(f"name at least one scenario ({', '.join(SCENARIOS)})")
+    stress["references"] = references
+    return stress
+
+
+def format_stress(stress):
+    """Inverse of parse_stress, for progress output."""
+    return ",".join(f"{name}={value}" for name, value in stress.items())
+
+
+class ReferenceChain:
+    """The reply tree of one thread and the References header of each reply.
+
+    Messages are numbered from 0 (the root) in the order they are added, and
+    message N has the Message-ID minted for email first_index + N. The chain
+    of the newest rendered message lives in one buffer, with the end offset
+    of every Message-ID on it.
+    """
+
+    def __init__(self, minter, first_index, mode="folded"):
+        self.minter = minter
+        self.first_index = first_index
+        self.cap = mode if isinstance(mode, int) else None
+        self.separator = b" " if mode == "full" else b"\n "
+        self.parents = array("I")
+        self.depths = array("I")
+        self.max_depth = 0  # References count of the deepest message, before any cap
+        self.longest = 0
+        self._path = array("I")
+        self._ends = array("Q")
+        self._buffer = bytearray()
+
+    def __len__(self):
+        return len(self.parents)
+
+    def message_id(self, number):
+        return self.minter.mint(self.first_index + number).encode("utf-8")
+
+    def add(self, parent=None):
+        """Add the next message, a reply to parent (None for the root)."""
+        depth = 1 if parent is None else self.depths[parent] + 1
+        self.parents.append(0 if parent is None else parent)
+        self.depths.append(depth)
+        self.max_depth = max(self.max_depth, depth - 1)
+
+    def references(self, parent):
+        """The References value of a reply to parent, in chunks of at most HEADER_CHUNK_BYTES."""
+        self._render(parent)
+        with memoryview(self._buffer) as view:
+            if self.cap is None or len(self._path) <= self.cap:
+                pieces = [view]
+            else:
+                # The root, then the newest cap - 1 ancestors (each piece starts with its separator).
+                pieces = [view[:self._ends[0]], view[self._ends[len(self._path) - self.cap]:]]
+            chunks = [
+                bytes(piece[at:at + HEADER_CHUNK_BYTES]) for piece in pieces for at in range(0, len(piece), HEADER_CHUNK_BYTES)
+            ]
+        self.longest = max(self.longest, sum(map(len, chunks)))
+        return chunks
+
+    def _render(self, parent):
+        """Make the rendered chain end at parent, reusing its longest prefix."""
+        walked = []
+        node = parent
+        while True:
+            depth = self.depths[node]
+            if depth <= len(self._path) and self._path[depth - 1] == node:
+                break
+            walked.append(node)
+            if depth == 1:
+                depth = 0
+                break
+            node = self.parents[node]
+        del self._path[depth:]
+        del self._ends[depth:]
+        del self._buffer[self._ends[-1] if depth else 0:]
+        for node in reversed(walked):
+            if self._path:
+                self._buffer += self.separator
+            self._buffer += self.message_id(node)
+            self._path.append(node)
+            self._ends.append(len(self._buffer))
+
+
+def recipient_width(count):
+    return max(4, len(str(count - 1)))
+
+
+def recipient_header_size(count):
+    """Length of the Cc header recipient_chunks(count) writes (0 for a single recipient)."""
+    if count < 2:
+        return 0
+    width = recipient_width(count)
+    entry = len(f"Recipient {0:0{width}d} <recipient{0:0{width}d}@{RECIPIENT_DOMAIN}>")
+    return len(b"Cc: ") + (count - 1) * entry + (count - 2) * len(b",\n ") + 1
+
+
+def recipient_chunks(count):
+    """Yield a folded Cc header with count - 1 distinct addresses (the To address is the count-th)."""
+    width = recipient_width(count)
+    pieces = []
+    size = 0
+    for number in range(count - 1):
+        entry = f"Recipient {number:0{width}d} <recipient{number:0{width}d}@{RECIPIENT_DOMAIN}>".encode("ascii")
+        piece = (b",\n " if number else b"Cc: ") + entry
+        pieces.append(piece)
+        size += len(piece)
+        if size >= HEADER_CHUNK_BYTES:
+            yield b"".join(pieces)
+            pieces = []
+            size = 0
+    if count > 1:
+        pieces.append(b"\n")
+        yield b"".join(pieces)
+
+
+class ScenarioWriter:
+    """Write stress scenarios to a corpus writer, with index records, manifest lines and telemetry.
+
+    The counters (size, emails, threaded_emails, thread_starts,
+    emails_with_attachments, attachments) are where write_corpus continues
+    from.
+    """
+
+    def __init__(self, f, index_writer, clock, minter, telemetry, start_index=0, manifest=None):
+        self.f = f
+        self.index_writer = index_writer
+        self.clock = clock
+        self.minter = minter
+        self.telemetry = telemetry
+        self.start_index = start_index
+        self.manifest = manifest
+        self.plain = PlainShape()
+        self.size = 0
+        self.emails = 0
+        self.threaded_emails = 0
+        self.thread_starts = 0
+        self.emails_with_attachments = 0
+        self.attachments = 0
+
+    def write(self, stress):
+        """Write every scenario in stress (see parse_stress); returns {scenario: its stats}."""
+        stats = {}
+        for name in SCENARIOS:
+            if name == "mega-thread" and name in stress:
+                stats[name] = self.thread(stress[name], stress["references"], deep=False)
+            elif name == "deep-thread" and name in stress:
+                stats[name] = self.thread(stress[name], stress["references"], deep=True)
+            elif name == "recipients" and name in stress:
+                stats[name] = self.recipients(stress[name])
+            elif name == "huge-message" and name in stress:
+                stats[name] = self.huge_message(stress[name])
+        return stats
+
+    def _headers(self, sender, subject):
+        index = self.start_index + self.emails
+        mbox_date, date_str = self.clock.dates(index)
+        message_id = self.minter.mint(index)
+        headers = templates.render_headers(
+            mbox_date, date_str, message_id, sender[0], sender[1], random.choice(content.TO_ADDRESSES), subject
+        )
+        return headers, message_id
+
+    def _body(self, sender):
+        body, _ = content.template_body(random.choice(content.BODY_TEMPLATES), sender[0])
+        head, _ = self.plain.render(self.start_index + self.emails, body)
+        return head
+
+    def _write(self, pieces, size, message_id, thread_id=0, recipients=1, segments=()):
+        """Write one email: size bytes of pieces (any iterable), then the attachment segments."""
+        self.telemetry.lap("synthesis")
+        email_bytes = size
+        for payload_size, after in segments:
+            email_bytes += encoded_attachment_size(payload_size) + len(after)
+        for piece in pieces:
+            self.f.write(piece)
+        for payload_size, after in segments:
+            self.telemetry.lap("io")
+            write_attachment_payload(self.f, payload_size)
+            self.telemetry.lap("attachment_encoding")
+            self.f.write(after)
+        self.index_writer.add(self.size, email_bytes, message_id, thread_id=thread_id, has_attachment=bool(segments))
+        if self.manifest:
+            self.manifest.message(email_bytes, recipients, len(segments), sum(size for size, _ in segments))
+        self.size += email_bytes
+        self.emails += 1
+        if segments:
+            self.emails_with_attachments += 1
+            self.attachments += len(segments)
+        self.telemetry.lap("io")
+        self.telemetry.tick(self.size, self.emails)
+        return email_bytes
+
+    def thread(self, length, references="folded", deep=False):
+        """One thread of length messages: a single reply chain when deep, else replies to random earlier messages."""
+        self.thread_starts += 1
+        thread_id = self.thread_starts
+        subject = random.choice(content.BASE_SUBJECTS)
+        participants = tuple(random.sample(content.SENDER_POOL, THREAD_PARTICIPANTS))
+        chain = ReferenceChain(self.minter, self.start_index + self.emails, references)
+        for number in range(length):
+            sender = participants[number % len(participants)]
+            if number == 0:
+                headers, message_id = self._headers(sender, subject)
+                pieces = [headers]
+                parent = None
+            else:
+                headers, message_id = self._headers(sender, f"Re: {subject}")
+                parent = number - 1 if deep else random.randrange(number)
+                pieces = [headers, b"In-Reply-To: " + chain.message_id(parent) + b"\nReferences: "]
+                pieces += chain.references(parent)
+                pieces.append(b"\n")
+            pieces.append(self._body(sender))
+            self._write(pieces, sum(map(len, pieces)), message_id, thread_id)
+            chain.add(parent)
+        self.threaded_emails += length
+        # References count of the deepest reply, as CalculateThreadDepth reports it.
+        max_depth = chain.max_depth if chain.cap is None else min(chain.max_depth, chain.cap)
+        if self.manifest:
+            record = ThreadState(thread_id, subject, participants, 0, 0)
+            record.references = chain.message_id(0).decode("utf-8")
+            record.messages = length
+            record.max_depth = max_depth
+            self.manifest.threads([record])
+        return {"thread": thread_id, "messages": length, "max_depth": max_depth, "longest_references_bytes": chain.longest}
+
+    def recipients(self, count):
+        """BATCH_MESSAGES emails, each with one To address and count - 1 Cc addresses."""
+        header_size = recipient_header_size(count)
+        cached = list(recipient_chunks(count)) if header_size <= RECIPIENT_CACHE_BYTES else None
+        for _ in range(BATCH_MESSAGES):
+            sender = random.choice(content.SENDER_POOL)
+            headers, message_id = self._headers(sender, random.choice(content.SUBJECTS))
+            body = self._body(sender)
+            chunks = cached if cached is not None else recipient_chunks(count)
+            pieces = itertools.chain((headers,), chunks, (body,))
+            self._write(pieces, len(headers) + header_size + len(body), message_id, recipients=count)
+        return {"messages": BATCH_MESSAGES, "recipients": count, "header_bytes": header_size}
+
+    def huge_message(self, megabytes):
+        """One email with a single attachment sized so the whole email is about megabytes MB."""
+        payload_size = megabytes * 1024 * 1024 * BASE64_LINE_BYTES // (BASE64_LINE_BYTES // 3 * 4 + 1)
+        sender = random.choice(content.SENDER_POOL)
+        headers, message_id = self._headers(sender, random.choice(content.SUBJECTS))
+        body, _ = content.template_body(random.choice(content.BODY_TEMPLATES), sender[0])
+        head, segments = AttachmentShape(attachment_size=payload_size).render(self.start_index + self.emails, body)
+        email_bytes = self._write((headers, head), len(headers) + len(head), message_id, segments=segments)
+        return {"messages": 1, "bytes": email_bytes}
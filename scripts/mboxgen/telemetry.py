@@ -0,0 +1,149 @@
+"""
+Progress output, stage timings and a JSON-lines metrics stream for the generators.
+
+Progress is printed at most once per interval rather than every N messages,
+and the clock is only read every TICK_CHECK_EVERY messages, so a multi-GB run
+no longer spends time on thousands of stdout writes per second.
+
+Stage timings use laps: generators call lap(stage) at each stage boundary of
+their loop, and code that runs nested inside a lap (for example a write
+batch flushing to disk) reports its own time with add(stage, seconds). That
+nested time is subtracted from the enclosing lap so no time is counted twice.
+Timing is only switched on when a metrics stream is requested.
+"""
+
+import json
+import sys
+import time
+
+PROGRESS_INTERVAL_SECONDS = 2.0
+TICK_CHECK_EVERY = 256
+
+STAGES = ("synthesis", "threading", "attachment_encoding", "io")
+
+
+class Telemetry:
+    """Throttled progress lines plus optional per-stage timings and metrics lines."""
+
+    def __init__(
+        self,
+        target_size,
+        metrics_file=None,
+        progress=True,
+        timing=None,
+        interval=PROGRESS_INTERVAL_SECONDS,
+    ):
+        self.target_size = target_size
+        self.progress = progress
+        self.interval = interval
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.counters = lambda: {}
+        self._metrics_file = metrics_file
+        self._start = time.perf_counter()
+        self._last_report = self._start
+        self._last_lap = self._start
+        self._nested = 0.0
+        self._ticks = 0
+
+        if timing is None:
+            timing = metrics_file is not None
+        self.timing = timing
+        if not timing:
+            self.lap = self._skip_lap
+            self.add = self._skip_add
+
+    @staticmethod
+    def open_metrics(path):
+        """Open a metrics destination: a file path, or "-" for stderr."""
+        if path is None:
+            return None
+        if path == "-":
+            return sys.stderr
+        return open(path, "w", encoding="utf-8", buffering=1)
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] += now - self._last_lap - self._nested
+        self._last_lap = now
+        self._nested = 0.0
+
+    def add(self, stage, seconds):
+        self.stages[stage] += seconds
+        self._nested += seconds
+
+    def _skip_lap(self, stage):
+        pass
+
+    def _skip_add(self, stage, seconds):
+        pass
+
+    def reset_lap(self):
+        """Start the next lap now, so idle time before it is not charged to a stage."""
+        self._last_lap = time.perf_counter()
+        self._nested = 0.0
+
+    def tick(self, current_size, emails):
+        """Call once per message; reports when the interval has elapsed."""
+        self._ticks += 1
+        if self._ticks % TICK_CHECK_EVERY:
+            return
+        now = time.perf_counter()
+        if now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        self.report(current_size, emails, now=now)
+
+    def report(self, current_size, emails, event="progress", now=None, stages=None):
+        now = now or time.perf_counter()
+        elapsed = max(now - self._start, 1e-9)
+        counters = self.counters()
+        mb = current_size / 1024 / 1024
+        if self.progress and event == "progress":
+            progress = (current_size / self.target_size) * 100 if self.target_size else 0.0
+            details = "".join(f", {name.replace('_', ' ')}: {value:,}" for name, value in counters.items())
+            print(
+                f"Progress: {progress:.1f}% ({emails:,} emails{details}, "
+                f"{mb:.1f} MB, {mb / elapsed:.1f} MB/s)"
+            )
+        if self._metrics_file is not None:
+            record = {
+                "event": event,
+                "elapsed": round(elapsed, 3),
+                "bytes": current_size,
+                "emails": emails,
+                "mb_per_s": round(mb / elapsed, 2),
+                "emails_per_s": round(emails / elapsed, 1),
+                "counters": counters,
+                "stages": {
+                    name: round(seconds, 4) for name, seconds in (stages or self.stages).items()
+                },
+            }
+            self._metrics_file.write(json.dumps(record) + "\n")
+
+    def finish(self, current_size, emails, stages=None):
+        """Write the final metrics line."""
+        self.report(current_size, emails, event="done", stages=stages)
+
+    def close(self):
+        if self._metrics_file not in (None, sys.stderr, sys.stdout):
+            self._metrics_file.close()
+
+
+def merge_stages(stage_dicts):
+    """Sum per-stage seconds from several runs (e.g. parallel shards)."""
+    totals = dict.fromkeys(STAGES, 0.0)
+    for stages in stage_dicts:
+        for name, seconds in stages.items():
+            totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+def run_profiled(path, func, *args, **kwargs):
+    """Run func under cProfile and write the stats to path (view with python3 -m pstats)."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
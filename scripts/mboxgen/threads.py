@@ -0,0 +1,189 @@
+"""
+Thread simulator for the corpus generators.
+
+Active threads live in indexed pools: picking a random thread, adding one and
+retiring one are all O(1) (swap-with-last removal), so hundreds of thousands of
+concurrent conversations cost no more per message than a dozen.
+
+Each thread draws a heavy-tailed (Pareto) target length when it starts and is
+retired once it reaches it; when the active pool is full a random thread is
+retired to make room, so new conversations keep starting for the whole run.
+Replies usually extend the newest branch but sometimes answer an earlier
+message, which keeps thread depth (References count) below thread length.
+"""
+
+import random
+
+DEFAULT_MAX_ACTIVE_THREADS = 100_000
+
+THREAD_LENGTH_ALPHA = 1.1  # Pareto shape; smaller means a heavier tail
+MAX_THREAD_LENGTH = 5_000
+BRANCH_CHANCE = 0.15
+
+# Longest References chain kept per thread. Longer chains keep the root (which
+# ingestion uses as the thread key) and the most recent ancestors, the way
+# mail clients trim References.
+MAX_REFERENCES = 100
+
+
+def draw_thread_length(required_followups):
+    """Total messages in a new thread: the start, its required follow-ups and a heavy tail."""
+    extra = int(random.paretovariate(THREAD_LENGTH_ALPHA)) - 1
+    return min(MAX_THREAD_LENGTH, 1 + required_followups + extra)
+
+
+class ThreadState:
+    """Compact per-thread state: the References chain plus what the next reply quotes."""
+
+    __slots__ = (
+        "thread_id",
+        "subject",
+        "participants",
+        "references",
+        "depth",
+        "max_depth",
+        "messages",
+        "last_sender",
+        "last_date",
+        "last_preview",
+        "required_followups",
+        "remaining",
+        "active_slot",
+        "pending_slot",
+    )
+
+    def __init__(self, thread_id, subject, participants, required_followups, length):
+        self.thread_id = thread_id
+        self.subject = subject
+        self.participants = participants  # tuple of (name, email) from the shared pool
+        self.references = ""  # space-separated Message-IDs from the root to the newest message
+        self.depth = 0  # References count of the newest message (0 for the root)
+        self.max_depth = 0
+        self.messages = 0
+        self.last_sender = None
+        self.last_date = None
+        self.last_preview = None
+        self.required_followups = required_followups
+        self.remaining = length
+        self.active_slot = -1
+        self.pending_slot = -1
+
+    @property
+    def last_message_id(self):
+        return self.references[self.references.rfind(" ") + 1:]
+
+    def reply_target(self):
+        """Return (in_reply_to, references) for the next reply.
+
+        Usually the newest message; with BRANCH_CHANCE an earlier message in the
+        chain, which starts a new branch at a shallower depth.
+        """
+        if self.depth > 0 and random.random() < BRANCH_CHANCE:
+            ids = self.references.split(" ")
+            parent = random.randrange(len(ids) - 1)
+            return ids[parent], " ".join(ids[:parent + 1])
+        return self.last_message_id, self.references
+
+    def add_message(self, message_id, references, sender, date_str, body_preview):
+        """Record a message whose References header was `references` ("" for the start)."""
+        chain = f"{references} {message_id}" if references else message_id
+        depth = chain.count(" ")
+        if depth >= MAX_REFERENCES:
+            ids = chain.split(" ")
+            ids = ids[:1] + ids[-(MAX_REFERENCES - 1):]
+            chain = " ".join(ids)
+        self.references = chain
+        self.depth = depth
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.messages += 1
+        self.last_sender = sender
+        self.last_date = date_str
+        self.last_preview = body_preview
+        self.remaining -= 1
+
+
+class _IndexedPool:
+    """Unordered set of threads with O(1) add, remove and random choice."""
+
+    def __init__(self, slot_attr):
+        self._items = []
+        self._slot_attr = slot_attr
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, thread):
+        setattr(thread, self._slot_attr, len(self._items))
+        self._items.append(thread)
+
+    def remove(self, thread):
+        slot = getattr(thread, self._slot_attr)
+        last = self._items.pop()
+        if last is not thread:
+            self._items[slot] = last
+            setattr(last, self._slot_attr, slot)
+        setattr(thread, self._slot_attr, -1)
+
+    def choice(self):
+        return self._items[random.randrange(len(self._items))]
+
+
+class ThreadPool:
+    """Active threads, plus the subset that still owes required follow-ups.
+
+    With track_retired, retired threads are also appended to retired_threads
+    for the caller to consume (and clear).
+    """
+
+    def __init__(self, max_active=DEFAULT_MAX_ACTIVE_THREADS, track_retired=False):
+        self.max_active = max_active
+        self._active = _IndexedPool("active_slot")
+        self._pending = _IndexedPool("pending_slot")
+        self.retired = 0
+        self.peak_active = 0
+        self.retired_threads = [] if track_retired else None
+
+    def __len__(self):
+        return len(self._active)
+
+    def pick_pending(self):
+        return self._pending.choice() if self._pending else None
+
+    def pick_active(self):
+        return self._active.choice() if self._active else None
+
+    def active_threads(self):
+        return list(self._active)
+
+    def activate(self, thread):
+        """Add a thread after its first message; retire a random one if the pool is full."""
+        if len(self._active) >= self.max_active:
+            self.retire(self._active.choice())
+        self._active.add(thread)
+        if thread.required_followups > 0:
+            self._pending.add(thread)
+        self.peak_active = max(self.peak_active, len(self._active))
+        if thread.remaining <= 0:
+            self.retire(thread)
+
+    def record_followup(self, thread):
+        """Update pools after a reply/forward has been added to thread."""
+        if thread.required_followups > 0:
+            thread.required_followups -= 1
+            if thread.required_followups == 0:
+                self._pending.remove(thread)
+        if thread.remaining <= 0:
+            self.retire(thread)
+
+    def retire(self, thread):
+        if thread.active_slot >= 0:
+            self._active.remove(thread)
+            self.retired += 1
+            if self.retired_threads is not None:
+                self.retired_threads.append(thread)
+        if thread.pending_slot >= 0:
+            self._pending.remove(thread)
@@ -0,0 +1,573 @@
+"""
+Upload load driver: stream generated mailboxes into blob and queue endpoints.
+
+Reproduces the upload path in front of MailboxProcessingService without cloud
+services or intermediate files. Each mailbox is generated by a generator
+script writing to stdout, so it is byte-identical to the CLI with the same
+seed and options. It is streamed block by block into the blob REST API that
+the web app's uploader (wwwroot/js/azure-blob-upload.js) uses: Put Block for
+every BLOCK_BYTES block, then Put Block List. Once the blob is committed, the
+mailbox's processing message goes onto the mailbox-ingestion queue with the
+JSON body QueueService writes (MailboxId, UploadId, EncryptionStateId,
+EnqueuedAt).
+
+The endpoints can be Azurite (the defaults; requests are signed with SharedKey
+using Azurite's well-known development account), a storage account, or any
+HTTP server that answers 2xx. StandIn is a minimal in-process endpoint for
+both that checks block lists and keeps the queue messages.
+
+Mailboxes are uploaded concurrently on one asyncio loop and share a pool of
+keep-alive connections per endpoint. For every Put Block the driver records
+how long it waited for the generator and how long the request took. Per
+mailbox it records time to first byte (from starting the generator to sending
+the first block), end-to-end throughput, and commit and enqueue latency.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import re
+import ssl
+import sys
+import time
+import uuid
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+from xml.sax.saxutils import escape, unescape
+
+from mboxgen import batch
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+GENERATORS = {
+    "threaded": SCRIPTS_DIR / "generate-test-mbox.py",
+    "attachments": SCRIPTS_DIR / "generate-test-mbox-with-attachments.py",
+}
+
+# Block size of the web app's uploader.
+BLOCK_BYTES = 4 * 1024 * 1024
+CONTAINER = "mailbox-archives"
+INGESTION_QUEUE = "mailbox-ingestion"
+API_VERSION = "2021-08-06"
+# Azurite's public development account.
+AZURITE_ACCOUNT = "devstoreaccount1"
+AZURITE_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+BLOB_ENDPOINT = f"http://127.0.0.1:10000/{AZURITE_ACCOUNT}"
+QUEUE_ENDPOINT = f"http://127.0.0.1:10001/{AZURITE_ACCOUNT}"
+# Generator stderr lines kept for error messages.
+STDERR_TAIL_LINES = 20
+
+Response = namedtuple("Response", "status reason headers body")
+
+
+def shared_key(account, key, method, path, query, headers):
+    """Authorization header value for a Blob or Queue REST request (SharedKey)."""
+    canonical_headers = "".join(
+        f"{name}:{value}\n"
+        for name, value in sorted((name.lower(), value.strip()) for name, value in headers.items())
+        if name.startswith("x-ms-")
+    )
+    resource = f"/{account}{path}" + "".join(f"\n{name.lower()}:{value}" for name, value in sorted(query))
+    length = headers.get("Content-Length", "")
+    fields = [method, "", "", "" if length == "0" else length, "", headers.get("Content-Type", "")] + [""] * 6
+    string_to_sign = "\n".join(fields) + "\n" + canonical_headers + resource
+    digest = hmac.new(base64.b64decode(key), string_to_sign.encode("utf-8"), hashlib.sha256).digest()
+    return f"SharedKey {account}:{base64.b64encode(digest).decode('ascii')}"
+
+
+async def _read_chunked(reader):
+    parts = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(parts)
+        parts.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one endpoint; at most size requests in flight."""
+
+    def __init__(self, endpoint, size):
+        parts = urlsplit(endpoint)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) endpoint: {endpoint}")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.opened = 0
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, target, headers, body=b""):
+        async with self._slots:
+            for attempt in (0, 1):
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+                    self.opened += 1
+                try:
+                    response, keep_alive = await self._exchange(reader, writer, method, target, headers, body)
+                except (OSError, asyncio.IncompleteReadError):
+                    writer.close()
+                    # The server may have closed an idle keep-alive connection; retry once on a new one.
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return response
+
+    async def _exchange(self, reader, writer, method, target, headers, body):
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.netloc}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before the response")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        status = int(status)
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and response_headers.get("connection", "").lower() != "close"
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            payload = b""
+        elif "content-length" in response_headers:
+            payload = await reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = await _read_chunked(reader)
+        else:
+            payload = await reader.read()
+            keep_alive = False
+        return Response(status, reason, response_headers, payload), keep_alive
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+class StorageClient:
+    """The Blob and Queue REST calls of the upload path, signed with SharedKey when a key is set."""
+
+    def __init__(
+        self,
+        blob_endpoint=BLOB_ENDPOINT,
+        queue_endpoint=QUEUE_ENDPOINT,
+        connections=8,
+        account=AZURITE_ACCOUNT,
+        key=AZURITE_KEY,
+    ):
+        self.blob = ConnectionPool(blob_endpoint, connections)
+        self.queue = ConnectionPool(queue_endpoint, connections)
+        self.account = account
+        self.key = key
+
+    async def _call(self, pool, method, resource, query=(), body=b"", content_type=None, ok=(201,)):
+        path = pool.base_path + quote(resource)
+        headers = {"x-ms-date": formatdate(usegmt=True), "x-ms-version": API_VERSION, "Content-Length": str(len(body))}
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.key:
+            headers["Authorization"] = shared_key(self.account, self.key, method, path, query, headers)
+        target = f"{path}?{urlencode(query, quote_via=quote)}" if query else path
+        response = await pool.request(method, target, headers, body)
+        if response.status not in ok:
+            detail = response.body[:300].decode("utf-8", "replace").strip()
+            raise RuntimeError(f"{method} {target}: {response.status} {response.reason} {detail}".rstrip())
+        return response
+
+    async def create_container(self, container=CONTAINER):
+        await self._call(self.blob, "PUT", f"/{container}", [("restype", "container")], ok=(201, 409))
+
+    async def create_queue(self, queue=INGESTION_QUEUE):
+        await self._call(self.queue, "PUT", f"/{queue}", ok=(201, 204))
+
+    async def put_block(self, blob, block_id, data, container=CONTAINER):
+        await self._call(self.blob, "PUT", f"/{container}/{blob}", [("comp", "block"), ("blockid", block_id)], data)
+
+    async def put_block_list(self, blob, block_ids, container=CONTAINER):
+        body = '<?xml version="1.0" encoding="utf-8"?><BlockList>'
+        body += "".join(f"<Latest>{block_id}</Latest>" for block_id in block_ids) + "</BlockList>"
+        await self._call(
+            self.blob, "PUT", f"/{container}/{blob}", [("comp", "blocklist")], body.encode("utf-8"), "application/xml"
+        )
+
+    async def put_message(self, text, queue=INGESTION_QUEUE):
+        body = f"<QueueMessage><MessageText>{escape(text)}</MessageText></QueueMessage>"
+        await self._call(self.queue, "POST", f"/{queue}/messages", body=body.encode("utf-8"), content_type="application/xml")
+
+    def close(self):
+        self.blob.close()
+        self.queue.close()
+
+
+def block_id(index):
+    """Block ID as the web app's uploader makes it: base64 of "block-" plus the zero-padded index."""
+    return base64.b64encode(f"block-{index:010d}".encode("ascii")).decode("ascii")
+
+
+def processing_message(mailbox):
+    """The mailbox-ingestion message body, as QueueService.EnqueueMailboxProcessingAsync serializes it."""
+    return json.dumps(
+        {
+            "MailboxId": mailbox["mailbox_id"],
+            "UploadId": mailbox["upload_id"],
+            "EncryptionStateId": mailbox["encryption_state_id"],
+            "EnqueuedAt": datetime.now(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z"),
+        },
+        separators=(",", ":"),
+    )
+
+
+def plan_mailboxes(count, size_mb, tenants=1, seed=None, generator="threaded", generator_args=()):
+    """One dict per mailbox: IDs, blob path, seed and the generator command line.
+
+    IDs are new GUIDs on every run, as the web app creates them; the seed only
+    decides the content, so the same seed uploads the same bytes again.
+    """
+    tenant_ids = [str(uuid.uuid4()) for _ in range(tenants)]
+    mailboxes = []
+    for number in range(1, count + 1):
+        name = f"mailbox-{number:03d}"
+        tenant_id = tenant_ids[(number - 1) % tenants]
+        mailbox_id = str(uuid.uuid4())
+        mailbox_seed = batch.job_seed(seed, "upload", name)
+        command = [sys.executable, str(GENERATORS[generator]), str(size_mb), "-"]
+        if mailbox_seed is not None:
+            command += ["--seed", str(mailbox_seed)]
+        mailboxes.append(
+            {
+                "name": name,
+                "tenant_id": tenant_id,
+                "mailbox_id": mailbox_id,
+                "upload_id": str(uuid.uuid4()),
+                "encryption_state_id": str(uuid.uuid4()),
+                # Same layout as BlobStorageService.GenerateUploadSasTokenAsync.
+                "blob": f"{tenant_id}/{mailbox_id}/{uuid.uuid4()}_{name}.mbox",
+                "seed": mailbox_seed,
+                "command": command + list(generator_args),
+            }
+        )
+    return mailboxes
+
+
+async def _drain_lines(stream, tail):
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        tail.append(line.decode("utf-8", "replace").rstrip())
+
+
+async def _read_block(stream, size):
+    try:
+        return await stream.readexactly(size)
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+
+
+async def upload_mailbox(client, mailbox, block_bytes=BLOCK_BYTES, blocks_in_flight=1, on_chunk=None):
+    """Generate one mailbox and stream it into its blob, then enqueue it; returns its stats.
+
+    At most blocks_in_flight Put Block requests (and blocks in memory) at a
+    time; 1 uploads block after block like the browser does.
+    on_chunk(mailbox, index, size, wait_seconds, latency_seconds) is called per block.
+    """
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *mailbox["command"], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    drain = asyncio.create_task(_drain_lines(process.stderr, stderr_tail))
+    slots = asyncio.Semaphore(blocks_in_flight)
+    pending = set()
+    errors = []
+    block_ids = []
+    waits = []
+    latencies = []
+    size = 0
+    first_byte = None
+
+    async def put(index, data, wait):
+        try:
+            sent = time.perf_counter()
+            await client.put_block(mailbox["blob"], block_ids[index], data)
+            latency = time.perf_counter() - sent
+            latencies.append(latency)
+            if on_chunk:
+                on_chunk(mailbox, index, len(data), wait, latency)
+        finally:
+            slots.release()
+
+    def finished(task):
+        pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            errors.append(task.exception())
+
+    try:
+        while not errors:
+            await slots.acquire()
+            read_start = time.perf_counter()
+            data = await _read_block(process.stdout, block_bytes)
+            wait = time.perf_counter() - read_start
+            if not data:
+                slots.release()
+                break
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            waits.append(wait)
+            size += len(data)
+            block_ids.append(block_id(len(block_ids)))
+            task = asyncio.create_task(put(len(block_ids) - 1, data, wait))
+            pending.add(task)
+            task.add_done_callback(finished)
+        await asyncio.gather(*pending, return_exceptions=True)
+        if errors:
+            raise RuntimeError(f"{mailbox['name']}: {errors[0]}")
+        returncode = await process.wait()
+        await drain
+        if returncode != 0:
+            raise RuntimeError(f"{mailbox['name']}: generator failed ({returncode}): " + "\n".join(stderr_tail))
+
+        commit_start = time.perf_counter()
+        await client.put_block_list(mailbox["blob"], block_ids)
+        commit = time.perf_counter() - commit_start
+        enqueue_start = time.perf_counter()
+        await client.put_message(processing_message(mailbox))
+        enqueue = time.perf_counter() - enqueue_start
+    finally:
+        for task in pending:
+            task.cancel()
+        if process.returncode is None:
+            process.kill()
+        # wait() returns only once both pipes are closed, so read them to the end.
+        while await process.stdout.read(block_bytes):
+            pass
+        await drain
+        await process.wait()
+
+    stats = {key: mailbox[key] for key in ("name", "tenant_id", "mailbox_id", "upload_id", "encryption_state_id", "blob", "seed")}
+    stats.update(
+        bytes=size,
+        blocks=len(block_ids),
+        seconds=time.perf_counter() - start,
+        ttfb_seconds=first_byte or 0.0,
+        generate_seconds=sum(waits),
+        put_block_seconds=sum(latencies),
+        commit_seconds=commit,
+        enqueue_seconds=enqueue,
+        latencies=latencies,
+    )
+    return stats
+
+
+async def run_uploads(client, mailboxes, concurrency, block_bytes=BLOCK_BYTES, blocks_in_flight=1, on_chunk=None, on_done=None):
+    """Upload every mailbox, concurrency at a time; returns (stats in completion order, wall seconds).
+
+    on_done(stats, done, total) is called as mailboxes finish.
+    """
+    start = time.perf_counter()
+    await client.create_container()
+    await client.create_queue()
+    waiting = deque(mailboxes)
+    results = []
+
+    async def worker():
+        while waiting:
+            stats = await upload_mailbox(client, waiting.popleft(), block_bytes, blocks_in_flight, on_chunk)
+            results.append(stats)
+            if on_done:
+                on_done(stats, len(results), len(mailboxes))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(mailboxes)))]
+    try:
+        # Unlike gather, wait does not cancel the workers itself, so each is
+        # cancelled once below and can stop its generator cleanly.
+        done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return results, time.perf_counter() - start
+
+
+def percentiles(seconds):
+    """p50/p95/p99/max of a list of durations, in milliseconds."""
+    if not seconds:
+        return {}
+    ordered = sorted(seconds)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def mailbox_summary(stats):
+    """JSON-friendly figures for one uploaded mailbox."""
+    summary = {key: value for key, value in stats.items() if key != "latencies"}
+    for key in ("seconds", "ttfb_seconds", "generate_seconds", "put_block_seconds", "commit_seconds", "enqueue_seconds"):
+        summary[key] = round(summary[key], 3)
+    summary["mb_per_s"] = round(stats["bytes"] / 1024 / 1024 / max(stats["seconds"], 1e-9), 2)
+    summary["block_latency"] = percentiles(stats["latencies"])
+    return summary
+
+
+def summarize(results, wall_seconds, concurrency, client):
+    """Consolidated latency and throughput figures for a finished run, as a JSON-friendly dict."""
+    total_bytes = sum(stats["bytes"] for stats in results)
+    stage_seconds = {
+        stage: round(sum(stats[f"{stage}_seconds"] for stats in results), 3)
+        for stage in ("generate", "put_block", "commit", "enqueue")
+    }
+    return {
+        "concurrency": concurrency,
+        "mailboxes": [mailbox_summary(stats) for stats in sorted(results, key=lambda stats: stats["name"])],
+        "bytes": total_bytes,
+        "blocks": sum(stats["blocks"] for stats in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "mb_per_s": round(total_bytes / 1024 / 1024 / max(wall_seconds, 1e-9), 2),
+        "block_latency": percentiles([latency for stats in results for latency in stats["latencies"]]),
+        "ttfb": percentiles([stats["ttfb_seconds"] for stats in results]),
+        "commit_latency": percentiles([stats["commit_seconds"] for stats in results]),
+        "enqueue_latency": percentiles([stats["enqueue_seconds"] for stats in results]),
+        "stage_seconds": stage_seconds,
+        # Where mailboxes spent their time: waiting for generated bytes, or for Put Block.
+        "bound_by": "generator" if stage_seconds["generate"] > stage_seconds["put_block"] else "upload",
+        "connections": {"blob": client.blob.opened, "queue": client.queue.opened},
+    }
+
+
+class StandIn:
+    """In-process blob and queue endpoint for the upload path, served at one base URL.
+
+    Staged block sizes are kept (not their bytes), block lists are checked
+    against them, and queue messages are kept per queue.
+    """
+
+    def __init__(self):
+        self.staged = {}  # blob path -> {block id: length}
+        self.blobs = {}  # blob path -> committed length
+        self.messages = {}  # queue name -> [message text]
+        self.requests = 0
+        self._server = None
+        self._handlers = {}  # task -> writer of each open connection
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening; returns the endpoint URL (for both blobs and queues)."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/{AZURITE_ACCOUNT}"
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Closing the client connections ends their handlers (readline sees EOF).
+            for writer in self._handlers.values():
+                writer.close()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers))
+            await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length)
+                self.requests += 1
+                status, reason, payload = self._handle(method, target, body)
+                writer.write(
+                    f"HTTP/1.1 {status} {reason}\r\nContent-Length: {len(payload)}\r\n"
+                    f"x-ms-version: {API_VERSION}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._handlers[task]
+            writer.close()
+
+    def _handle(self, method, target, body):
+        parts = urlsplit(target)
+        query = dict(parse_qsl(parts.query))
+        path = unquote(parts.path)
+        names = path.strip("/").split("/")
+        if method == "PUT" and query.get("comp") == "block":
+            self.staged.setdefault(path, {})[query.get("blockid", "")] = len(body)
+            return 201, "Created", b""
+        if method == "PUT" and query.get("comp") == "blocklist":
+            block_ids = [unescape(block_id) for block_id in re.findall(r"<Latest>(.*?)</Latest>", body.decode("utf-8"))]
+            staged = self.staged.pop(path, {})
+            missing = [block_id for block_id in block_ids if block_id not in staged]
+            if missing:
+                return 400, "InvalidBlockList", f"{len(missing)} blocks were never staged\n".encode("utf-8")
+            self.blobs[path] = sum(staged[block_id] for block_id in block_ids)
+            return 201, "Created", b""
+        if method == "PUT" and query.get("restype") == "container":
+            return 201, "Created", b""
+        if method == "POST" and len(names) == 3 and names[2] == "messages":
+            match = re.search(r"<MessageText>(.*)</MessageText>", body.decode("utf-8"), re.S)
+            if not match:
+                return 400, "InvalidXmlDocument", b"no MessageText\n"
+            self.messages.setdefault(names[1], []).append(unescape(match.group(1)))
+            return 201, "Created", b"<?xml version=\"1.0\" encoding=\"utf-8\"?><QueueMessagesList/>"
+        if method == "PUT" and len(names) == 2:
+            return 201, "Created", b""
+        return 400, "UnsupportedOperation", f"{method} {target} is not part of the upload path\n".encode("utf-8")
+
+    def check(self, results, container=CONTAINER, queue=INGESTION_QUEUE):
+        """Problems found comparing what arrived with what was uploaded (empty when all is well)."""
+        problems = []
+        enqueued = set()
+        for text in self.messages.get(queue, []):
+            try:
+                enqueued.add(json.loads(text)["MailboxId"])
+            except (ValueError, KeyError):
+                problems.append(f"malformed queue message: {text[:100]}")
+        for stats in results:
+            path = f"/{AZURITE_ACCOUNT}/{container}/{stats['blob']}"
+            if self.blobs.get(path) != stats["bytes"]:
+                problems.append(f"{stats['name']}: blob has {self.blobs.get(path)} bytes, uploaded {stats['bytes']:,}")
+            if stats["mailbox_id"] not in enqueued:
+                problems.append(f"{stats['name']}: no {queue} message for MailboxId {stats['mailbox_id']}")
+        return problems
@@ -0,0 +1,254 @@
+"""
+Structural checks for generated mbox files, run in parallel over an mmap.
+
+The file is split into byte ranges, one per worker. Each worker maps the file,
+moves its range start to the next envelope line and checks every message that
+starts inside the range, using find() calls on the map (which run in C and
+never copy the body) rather than Python line loops.
+
+A line starting with "From " counts as an envelope when it follows a blank
+line (or starts the file) and looks like "From <sender> <asctime date>". Any
+other line starting with "From " is an unescaped body line: mbox readers that
+split on every "From " line (mboxo, MimeKit) would cut the message there.
+
+Per message the checks are: a header/body separator, a Message-ID header,
+an opening and a closing delimiter for every declared MIME boundary, and
+(when an .idx sidecar is given) an index record with the same offset and
+length.
+"""
+
+import bisect
+import heapq
+import mmap
+import multiprocessing
+import os
+import re
+from array import array
+
+from mboxgen import index as mbox_index
+
+# Problems kept per worker; all of them are still counted.
+MAX_PROBLEMS_PER_WORKER = 1000
+
+ENVELOPE_RE = re.compile(
+    rb"From \S+ (?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) "
+    rb"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) [ \d]\d \d\d:\d\d:\d\d \d{4}\Z"
+)
+BOUNDARY_RE = re.compile(rb'boundary="?([^"\s;]+)')
+
+
+def from_lines(data, start):
+    """Yield (offset, line) for every line that starts with "From " at or after start."""
+    if start == 0 and data[:5] == b"From ":
+        offset = 0
+    else:
+        offset = data.find(b"\nFrom ", max(start - 1, 0)) + 1
+        if offset == 0:
+            return
+    while True:
+        line_end = data.find(b"\n", offset)
+        if line_end < 0:
+            line_end = len(data)
+        yield offset, data[offset:line_end]
+        offset = data.find(b"\nFrom ", line_end) + 1
+        if offset == 0:
+            return
+
+
+def is_envelope(data, start, line):
+    return (start == 0 or data[start - 2:start] == b"\n\n") and ENVELOPE_RE.match(line) is not None
+
+
+def header_value(headers, name):
+    """Value of the first `name` header (matched as written, e.g. b"\nMessage-ID:"), or None."""
+    at = headers.find(name)
+    if at < 0:
+        return None
+    return headers[at + len(name):headers.find(b"\n", at + 1)].strip()
+
+
+def has_attachment(data, start, end):
+    """Whether the body in data[start:end] has an attachment part.
+
+    Forwarded message/rfc822 parts carry an attachment disposition too, but
+    (as in the generator's counts and the manifest) they do not count.
+    """
+    at = data.find(b"\nContent-Disposition: attachment", start, end)
+    while at >= 0:
+        part_start = max(data.rfind(b"\n\n", start, at), start)
+        part_end = data.find(b"\n\n", at, end)
+        if data.find(b"\nContent-Type: message/rfc822", part_start, end if part_end < 0 else part_end) < 0:
+            return True
+        at = data.find(b"\nContent-Disposition: attachment", at + 1, end)
+    return False
+
+
+def plan_ranges(size, workers):
+    """Split [0, size) into contiguous byte ranges, one per worker."""
+    step = max(1, -(-size // workers))
+    return [(start, min(size, start + step)) for start in range(0, size, step)]
+
+
+def check_range(path, start, end, index_file=None):
+    """Verify the messages whose envelope starts in [start, end).
+
+    Returns a dict with totals, problems as (message number within the range,
+    offset, kind, detail) tuples, and the Message-ID hashes as an array('Q').
+    """
+    totals = {
+        "messages": 0,
+        "bytes": 0,
+        "multipart": 0,
+        "with_attachments": 0,
+        "replies": 0,
+        "unescaped_from_lines": 0,
+        "problems": 0,
+    }
+    problems = []
+    hashes = array("Q")
+
+    def problem(number, offset, kind, detail=""):
+        totals["problems"] += 1
+        if len(problems) < MAX_PROBLEMS_PER_WORKER:
+            problems.append((number, offset, kind, detail))
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return {"totals": totals, "problems": problems, "hashes": hashes, "start": start}
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # Envelopes starting in [start, end), then the one that ends the last message.
+        envelopes = []
+        body_from_lines = []
+        next_envelope = size
+        for offset, line in from_lines(data, start):
+            if is_envelope(data, offset, line):
+                if offset >= end:
+                    next_envelope = offset
+                    break
+                envelopes.append(offset)
+            elif envelopes:
+                body_from_lines.append(offset)
+        if start == 0 and (not envelopes or envelopes[0] != 0):
+            problem(0, 0, "no envelope", "file does not start with a From line")
+        if not envelopes:
+            return {"totals": totals, "problems": problems, "hashes": hashes, "start": start}
+
+        boundaries = envelopes[1:] + [next_envelope]
+        for offset in body_from_lines:
+            number = bisect.bisect_right(envelopes, offset) - 1
+            totals["unescaped_from_lines"] += 1
+            line = data[offset:offset + 60].partition(b"\n")[0]
+            problem(number, offset, "unescaped From line", line.decode("utf-8", "replace"))
+
+        for number, (message_start, message_end) in enumerate(zip(envelopes, boundaries)):
+            totals["messages"] += 1
+            totals["bytes"] += message_end - message_start
+            header_end = data.find(b"\n\n", message_start, message_end)
+            if header_end < 0:
+                problem(number, message_start, "no header/body separator")
+                continue
+            headers = data[message_start:header_end + 1]
+
+            message_id = header_value(headers, b"\nMessage-ID:") or header_value(headers, b"\nMessage-Id:")
+            if message_id:
+                hashes.append(mbox_index.message_id_hash(message_id.decode("utf-8", "replace")))
+            else:
+                problem(number, message_start, "missing Message-ID")
+            if b"\nIn-Reply-To:" in headers:
+                totals["replies"] += 1
+            if message_end == size and data[size - 1:size] != b"\n":
+                problem(number, message_start, "truncated message", "file does not end with a newline")
+
+            if b"multipart/" in headers:
+                totals["multipart"] += 1
+                if has_attachment(data, header_end, message_end):
+                    totals["with_attachments"] += 1
+                # Boundaries can be declared in nested part headers too.
+                at = data.find(b"boundary=", message_start, message_end)
+                while at >= 0:
+                    match = BOUNDARY_RE.match(data, at)
+                    at = data.find(b"boundary=", at + 9, message_end)
+                    if match is None:
+                        continue
+                    boundary = match.group(1)
+                    name = boundary.decode("ascii", "replace")
+                    if data.find(b"\n--" + boundary + b"\n", header_end - 1, message_end) < 0:
+                        problem(number, message_start, "MIME boundary never opened", name)
+                    if data.rfind(b"\n--" + boundary + b"--", header_end - 1, message_end) < 0:
+                        problem(number, message_start, "MIME boundary not closed", name)
+
+        if index_file:
+            check_index(index_file, envelopes, boundaries, problem)
+    finally:
+        data.close()
+
+    return {"totals": totals, "problems": problems, "hashes": array("Q", sorted(hashes)), "start": start}
+
+
+def check_index(index_file, envelopes, boundaries, problem):
+    """Compare the range's messages with the matching records of an .idx sidecar."""
+    with mbox_index.IndexReader(index_file) as index:
+        first = bisect.bisect_left(index, envelopes[0], key=lambda record: record.offset)
+        for number, (message_start, message_end) in enumerate(zip(envelopes, boundaries)):
+            if first + number >= len(index):
+                problem(number, message_start, "index mismatch", "no index record")
+                return
+            record = index[first + number]
+            if record.offset != message_start or record.length != message_end - message_start:
+                problem(
+                    number,
+                    message_start,
+                    "index mismatch",
+                    f"index has offset {record.offset} length {record.length}, "
+                    f"mbox has length {message_end - message_start}",
+                )
+                return
+
+
+def verify(path, workers=None, index_file=None):
+    """Verify path on a process pool; returns (totals, problems).
+
+    problems are (message number, offset, kind, detail) tuples in file order.
+    totals adds "unique_message_ids", "duplicate_message_ids" and, with an
+    index, "index_records".
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    ranges = plan_ranges(size, workers) or [(0, 0)]
+    jobs = [(path, start, end, index_file) for start, end in ranges]
+    if len(jobs) == 1:
+        results = [check_range(*jobs[0])]
+    else:
+        with multiprocessing.Pool(processes=min(workers, len(jobs))) as pool:
+            results = pool.starmap(check_range, jobs)
+
+    totals = dict.fromkeys(results[0]["totals"], 0)
+    problems = []
+    for result in results:
+        base = totals["messages"]
+        for name, value in result["totals"].items():
+            totals[name] += value
+        problems.extend((base + number, offset, kind, detail) for number, offset, kind, detail in result["problems"])
+
+    # Each worker returns its hashes sorted, so duplicates are adjacent after a merge.
+    seen = 0
+    unique = 0
+    previous = None
+    for value in heapq.merge(*(result["hashes"] for result in results)):
+        seen += 1
+        if value != previous:
+            unique += 1
+            previous = value
+    totals["unique_message_ids"] = unique
+    totals["duplicate_message_ids"] = seen - unique
+    if index_file:
+        with mbox_index.IndexReader(index_file) as index:
+            totals["index_records"] = len(index)
+        if totals["index_records"] != totals["messages"]:
+            totals["problems"] += 1
+            problems.append(
+                (totals["messages"], size, "index mismatch", f"{totals['index_records']:,} index records")
+            )
+    return totals, problems
@@ -0,0 +1,403 @@
+"""
+Virtual corpora: any byte range of a seeded synthetic mbox, generated on demand.
+
+A 100GB+ corpus that ingestion only reads once does not need to exist on disk.
+A VirtualCorpus splits the corpus into fixed-size segments. Each segment is
+generated exactly like a parallel shard (see mboxgen.engine): its own seed
+(derived from the corpus seed), its own thread state and date window, and
+exact_size padding so it is exactly SEGMENT_BYTES long. The offset plan is
+therefore arithmetic: segment i covers [i * segment_bytes, (i + 1) *
+segment_bytes), and the last segment takes the remainder. Reading
+(offset, length) generates only the segments that range touches, byte-
+identically on every read, and keeps the most recently used ones in memory.
+
+Messages never cross a segment boundary, threads never span segments (as
+with --workers), and no message is larger than a segment. Each segment gets
+a date window after the previous one; after DATE_SPAN_YEARS of windows the
+dates start over from the base date (Message-IDs stay unique, since every
+segment mints them with its own seeded prefix).
+
+The corpus is exposed as a seekable file-like object (VirtualMbox, from
+VirtualCorpus.open()) and over HTTP with Range support (make_server), so it
+can stand in for a blob behind BlobStorageService. With workers > 1 segments
+are generated on a process pool, and a sequential reader gets the next
+segment prefetched.
+"""
+
+import io
+import json
+import random
+import signal
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mboxgen import engine
+from mboxgen import emit
+from mboxgen import index as mbox_index
+from mboxgen import templates
+from mboxgen.telemetry import Telemetry
+
+BASE_DATE = datetime(2024, 1, 1, 9, 0, 0)
+SEGMENT_BYTES = 16 * 1024 * 1024
+CACHE_SEGMENTS = 8
+DATE_SPAN_YEARS = 50
+DATE_SPAN_EMAILS = DATE_SPAN_YEARS * 365 * 24 * 60 // templates.EMAIL_INTERVAL_MINUTES
+# Largest piece written to a socket at once.
+SEND_CHUNK_BYTES = 1024 * 1024
+
+
+def ignore_interrupts():
+    """Pool initializer: Ctrl-C stops the parent, which shuts the workers down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class SegmentBuffer:
+    """In-memory writer for one segment."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+        return len(data)
+
+
+def plan_corpus(size, seed=0, segment_bytes=SEGMENT_BYTES, **options):
+    """The offset plan of a virtual corpus: a small picklable dict; raises ValueError.
+
+    options are write_corpus options (threads, mix, shape_options, profile,
+    body_text, duplicate_ratio, ...); exact_size is always on.
+    """
+    if segment_bytes < emit.EXACT_SIZE_RESERVE * 2:
+        raise ValueError(f"segments must be at least {emit.EXACT_SIZE_RESERVE * 2:,} bytes")
+    if size < segment_bytes:
+        segment_bytes = size
+    if size < emit.EXACT_SIZE_RESERVE:
+        raise ValueError(f"a virtual corpus must be at least {emit.EXACT_SIZE_RESERVE:,} bytes")
+    segments = size // segment_bytes
+    # A remainder too small to pad on its own is added to the last segment.
+    remainder = size - segments * segment_bytes
+    if remainder >= emit.EXACT_SIZE_RESERVE:
+        segments += 1
+    window = segment_bytes // engine.MIN_EMAIL_BYTES
+    return {
+        "size": size,
+        "seed": seed,
+        "segment_bytes": segment_bytes,
+        "segments": segments,
+        "date_cycle": max(1, DATE_SPAN_EMAILS // window),
+        "options": dict(options, exact_size=True),
+    }
+
+
+def segment_bounds(plan, segment):
+    """(offset, length) of a segment."""
+    start = segment * plan["segment_bytes"]
+    if segment == plan["segments"] - 1:
+        return start, plan["size"] - start
+    return start, plan["segment_bytes"]
+
+
+def render_segment(plan, segment, records=False):
+    """The bytes of one segment (and its index records with records=True).
+
+    Uses the global `random` stream, seeded per segment; callers that share
+    the process with other random users save and restore its state.
+    """
+    start, length = segment_bounds(plan, segment)
+    random.seed(random.Random(f"{plan['seed']}/segment/{segment}").getrandbits(64))
+    out = SegmentBuffer()
+    index_writer = RecordCollector(start) if records else mbox_index.NullIndexWriter()
+    window = plan["segment_bytes"] // engine.MIN_EMAIL_BYTES
+    engine.write_corpus(
+        out,
+        index_writer,
+        length,
+        BASE_DATE,
+        Telemetry(length, progress=False, timing=False),
+        start_index=(segment % plan["date_cycle"]) * window,
+        **plan["options"],
+    )
+    data = b"".join(out.parts)
+    if len(data) != length:
+        raise RuntimeError(f"segment {segment} is {len(data):,} bytes instead of {length:,}")
+    return (data, index_writer.records) if records else data
+
+
+class RecordCollector:
+    """Index writer that keeps (offset, length, message_id, thread_id, has_attachment) tuples."""
+
+    def __init__(self, base_offset):
+        self.base_offset = base_offset
+        self.records = []
+
+    def add(self, offset, length, message_id, thread_id=0, has_attachment=False):
+        self.records.append((self.base_offset + offset, length, message_id, thread_id, has_attachment))
+
+    def sync(self):
+        pass
+
+
+class VirtualCorpus:
+    """A seeded mbox of size bytes whose segments are generated on demand.
+
+    At most cache_segments segments are kept in memory. With workers > 1
+    segments are generated on that many processes, so concurrent range readers
+    run in parallel; otherwise generation runs in the calling thread, one
+    segment at a time, with the caller's `random` state preserved.
+    """
+
+    def __init__(self, size, seed=0, segment_bytes=SEGMENT_BYTES, cache_segments=CACHE_SEGMENTS, workers=1, **options):
+        self.plan = plan_corpus(size, seed, segment_bytes, **options)
+        self.size = size
+        self.cache_segments = max(1, cache_segments)
+        self._cache = OrderedDict()  # segment -> bytes, least recently used first
+        self._pending = {}  # segment -> Future (workers > 1)
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._executor = None
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=ignore_interrupts)
+        self.generated = 0
+
+    @property
+    def etag(self):
+        """Stable entity tag: the same plan always serves the same bytes."""
+        return f'"{zlib.crc32(json.dumps(self.plan, sort_keys=True, default=str).encode("utf-8")):08x}"'
+
+    def segment_at(self, offset):
+        return min(offset // self.plan["segment_bytes"], self.plan["segments"] - 1)
+
+    def _render(self, segment):
+        with self._render_lock:
+            state = random.getstate()
+            try:
+                return render_segment(self.plan, segment)
+            finally:
+                random.setstate(state)
+
+    def _store(self, segment, data):
+        self._cache[segment] = data
+        self._cache.move_to_end(segment)
+        while len(self._cache) > self.cache_segments:
+            self._cache.popitem(last=False)
+
+    def prefetch(self, segment):
+        """Start generating a segment in the background (no-op without workers)."""
+        if self._executor is None or not 0 <= segment < self.plan["segments"]:
+            return
+        with self._lock:
+            if segment not in self._cache and segment not in self._pending:
+                self._pending[segment] = self._executor.submit(render_segment, self.plan, segment)
+
+    def segment(self, segment):
+        """The bytes of one segment, from the cache or freshly generated."""
+        with self._lock:
+            data = self._cache.get(segment)
+            if data is not None:
+                self._cache.move_to_end(segment)
+                return data
+            future = self._pending.get(segment)
+            if future is None and self._executor is not None:
+                future = self._pending[segment] = self._executor.submit(render_segment, self.plan, segment)
+        data = future.result() if future is not None else self._render(segment)
+        with self._lock:
+            self._pending.pop(segment, None)
+            if segment not in self._cache:
+                self.generated += 1
+            self._store(segment, data)
+        return data
+
+    def iter_range(self, offset, length):
+        """Yield memoryviews covering [offset, offset + length), one per segment touched."""
+        end = min(offset + length, self.size)
+        while offset < end:
+            segment = self.segment_at(offset)
+            self.prefetch(segment + 1)
+            start, seg_length = segment_bounds(self.plan, segment)
+            data = self.segment(segment)
+            take = min(end, start + seg_length) - offset
+            yield memoryview(data)[offset - start:offset - start + take]
+            offset += take
+
+    def read(self, offset, length):
+        """The bytes of [offset, offset + length), clipped to the corpus size."""
+        return b"".join(self.iter_range(offset, length))
+
+    def records(self, segment):
+        """Index records (offset, length, message_id, thread_id, has_attachment) of a segment's messages."""
+        with self._render_lock:
+            state = random.getstate()
+            try:
+                return render_segment(self.plan, segment, records=True)[1]
+            finally:
+                random.setstate(state)
+
+    def open(self):
+        """A seekable, read-only binary file object over the corpus."""
+        return io.BufferedReader(VirtualMbox(self), buffer_size=SEND_CHUNK_BYTES)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class VirtualMbox(io.RawIOBase):
+    """Raw file object reading a VirtualCorpus; wrap in io.BufferedReader (VirtualCorpus.open does)."""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.corpus.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence ({whence})")
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        for piece in self.corpus.iter_range(self._position, len(view)):
+            view[filled:filled + len(piece)] = piece
+            filled += len(piece)
+        self._position += filled
+        return filled
+
+
+def parse_range(header, size):
+    """(first, last) byte positions of a "bytes=first-last" header value, or None to send everything.
+
+    Suffix ranges ("bytes=-N") and open ranges ("bytes=N-") are supported;
+    raises ValueError for unsatisfiable ranges (including "bytes=-0") and
+    multiple ranges.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    if "," in spec:
+        raise ValueError("multiple ranges are not supported")
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    if not first:
+        try:
+            suffix = int(last)
+        except ValueError:
+            return None
+        if suffix <= 0:
+            raise ValueError(f"range {header} is an empty suffix range")
+        return max(size - suffix, 0), size - 1
+    try:
+        first = int(first)
+        last = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        raise ValueError(f"range {header} is outside the {size:,} byte corpus")
+    return first, min(last, size - 1)
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD for a VirtualCorpus (self.server.corpus) at any path, with Range and x-ms-range.
+
+    Responses carry the Azure Blob headers a blob download needs
+    (x-ms-blob-type, ETag, Last-Modified), so BlobStorageService-style readers
+    can be pointed at it.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "VirtualMbox/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _common_headers(self, length):
+        corpus = self.server.corpus
+        self.send_header("Content-Type", "application/mbox")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", corpus.etag)
+        self.send_header("Last-Modified", format_datetime(BASE_DATE.replace(tzinfo=timezone.utc), usegmt=True))
+        self.send_header("x-ms-blob-type", "BlockBlob")
+        if self.headers.get("x-ms-version"):
+            self.send_header("x-ms-version", self.headers["x-ms-version"])
+
+    def _respond(self, send_body):
+        corpus = self.server.corpus
+        header = self.headers.get("x-ms-range") or self.headers.get("Range")
+        try:
+            byte_range = parse_range(header, corpus.size) if header else None
+        except ValueError as e:
+            message = f"{e}\n".encode("utf-8")
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{corpus.size}")
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(message)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(message)
+            return
+        if byte_range is None:
+            first, last = 0, corpus.size - 1
+            self.send_response(200)
+        else:
+            first, last = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{last}/{corpus.size}")
+        self._common_headers(last - first + 1)
+        self.end_headers()
+        if not send_body:
+            return
+        try:
+            for piece in corpus.iter_range(first, last - first + 1):
+                for at in range(0, len(piece), SEND_CHUNK_BYTES):
+                    self.wfile.write(piece[at:at + SEND_CHUNK_BYTES])
+        except (BrokenPipeError, ConnectionResetError):
+            # The reader hung up mid-range (e.g. a cancelled parallel download).
+            self.close_connection = True
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+def make_server(corpus, host="127.0.0.1", port=8080, verbose=False):
+    """A ThreadingHTTPServer serving corpus; call serve_forever() on it."""
+    server = ThreadingHTTPServer((host, port), RangeRequestHandler)
+    server.daemon_threads = True
+    server.corpus = corpus
+    server.verbose = verbose
+    return server
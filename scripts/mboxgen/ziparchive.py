@@ -0,0 +1,400 @@
+"""
+Streaming ZIP containers for the corpus: a ZIP of .eml files, or a Google
+Takeout-style ZIP holding one .mbox.
+
+Both writers produce the archive in a single forward pass over any
+mboxgen.sinks target, with no temporary files and no seeking: entry sizes and
+CRCs are either known before the local header is written (EML entries are
+deflated first) or follow the data in a data descriptor (the Takeout mbox,
+and EML entries larger than EML_BATCH_BYTES). Deflate runs on a thread pool;
+zlib releases the GIL while compressing, so the pool uses several cores while
+the generator keeps producing messages.
+
+Streamed entries are compressed in parallel the way pigz does it: 1MB blocks
+are deflated independently, each primed with the previous 32KB as its
+dictionary and ended with a sync flush, so their outputs concatenate into one
+valid deflate stream. Memory does not grow with the size of a streamed entry.
+
+ZIP64 records are added whenever a size, offset or the entry count does not
+fit the classic fields, so multi-GB archives and millions of entries work.
+Central directory data is kept in compact arrays (28 bytes per entry).
+"""
+
+import os
+import struct
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mboxgen import emit
+
+FORMATS = ("mbox", "eml-zip", "takeout-zip")
+TAKEOUT_MBOX_NAME = "Takeout/Mail/All mail Including Spam and Trash.mbox"
+EML_NAME_TEMPLATE = "mail/{:09d}.eml"
+
+DEFLATE_LEVEL = 6
+STREAM_BLOCK_BYTES = 1024 * 1024
+DICTIONARY_BYTES = 32 * 1024
+# EML entries are deflated in batches of about this size; a message larger
+# than this is streamed as its own entry instead.
+EML_BATCH_BYTES = 4 * 1024 * 1024
+# Deflate jobs queued per worker thread before the generator waits.
+INFLIGHT_PER_WORKER = 4
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+DATA_DESCRIPTOR64 = struct.Struct("<IIQQ")
+ZIP64_EOCD = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+EOCD = struct.Struct("<IHHHHIIH")
+
+LOCAL_SIGNATURE = 0x04034B50
+CENTRAL_SIGNATURE = 0x02014B50
+DESCRIPTOR_SIGNATURE = 0x08074B50
+ZIP64_EOCD_SIGNATURE = 0x06064B50
+ZIP64_LOCATOR_SIGNATURE = 0x07064B50
+EOCD_SIGNATURE = 0x06054B50
+
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+METHOD_DEFLATE = 8
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+EXTERNAL_ATTR = 0o100644 << 16
+MAX32 = 0xFFFFFFFF
+MAX16 = 0xFFFF
+
+# Entries are stamped 2024-01-01 00:00, the start of the generated mail, so
+# archives are byte-identical for the same seed.
+DOS_DATE = ((2024 - 1980) << 9) | (1 << 5) | 1
+DOS_TIME = 0
+
+
+def deflate_entry(data, level=DEFLATE_LEVEL):
+    """(crc32, raw deflate bytes) for one complete entry."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return zlib.crc32(data), compressor.compress(data) + compressor.flush()
+
+
+def deflate_block(data, dictionary, last, level=DEFLATE_LEVEL):
+    """Raw deflate for one block of a stream split pigz-style."""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def zip64_extra(*values):
+    """ZIP64 extended information extra field holding the given 64-bit values."""
+    if not values:
+        return b""
+    return struct.pack(f"<HH{len(values)}Q", 0x0001, 8 * len(values), *values)
+
+
+class _ZipWriter:
+    """Shared ZIP plumbing: local headers, central directory and end records."""
+
+    def __init__(self, path, telemetry=None, workers=None, level=DEFLATE_LEVEL):
+        self._out = emit.BatchWriter(path, telemetry=telemetry)
+        self._level = level
+        workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zip-deflate")
+        self._max_inflight = workers * INFLIGHT_PER_WORKER
+        self._inflight = deque()
+        self._names = []
+        self._offsets = array("Q")
+        self._compressed_sizes = array("Q")
+        self._sizes = array("Q")
+        self._crcs = array("I")
+        self._closed = False
+        self.position = 0  # uncompressed bytes handed to write()
+
+    @property
+    def compressed_bytes(self):
+        return self._out.position
+
+    def _local_header(self, name, crc, compressed_size, size, streaming=False):
+        encoded = name.encode("utf-8")
+        flags = FLAG_UTF8 | (FLAG_DATA_DESCRIPTOR if streaming else 0)
+        if streaming:
+            # Sizes follow in a ZIP64 data descriptor; zeros here, as the spec asks.
+            extra = zip64_extra(0, 0)
+            crc, compressed_field, size_field, version = 0, MAX32, MAX32, VERSION_ZIP64
+        elif size >= MAX32 or compressed_size >= MAX32:
+            extra = zip64_extra(size, compressed_size)
+            compressed_field, size_field, version = MAX32, MAX32, VERSION_ZIP64
+        else:
+            extra = b""
+            compressed_field, size_field, version = compressed_size, size, VERSION_DEFAULT
+        header = LOCAL_HEADER.pack(
+            LOCAL_SIGNATURE, version, flags, METHOD_DEFLATE, DOS_TIME, DOS_DATE,
+            crc, compressed_field, size_field, len(encoded), len(extra),
+        )
+        self._out.write(header + encoded + extra)
+
+    def _entry_name(self, i):
+        return self._names[i]
+
+    def _write_central_directory(self):
+        start = self._out.position
+        chunk = []
+        for i in range(len(self._offsets)):
+            name = self._entry_name(i).encode("utf-8")
+            offset, size, compressed_size = self._offsets[i], self._sizes[i], self._compressed_sizes[i]
+            big = [value for value in (size, compressed_size, offset) if value >= MAX32]
+            extra = zip64_extra(*big)
+            chunk.append(
+                CENTRAL_HEADER.pack(
+                    CENTRAL_SIGNATURE,
+                    MADE_BY_UNIX | (VERSION_ZIP64 if big else VERSION_DEFAULT),
+                    VERSION_ZIP64 if big else VERSION_DEFAULT,
+                    FLAG_UTF8 | (FLAG_DATA_DESCRIPTOR if self._streamed(i) else 0),
+                    METHOD_DEFLATE,
+                    DOS_TIME,
+                    DOS_DATE,
+                    self._crcs[i],
+                    MAX32 if compressed_size >= MAX32 else compressed_size,
+                    MAX32 if size >= MAX32 else size,
+                    len(name),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    EXTERNAL_ATTR,
+                    MAX32 if offset >= MAX32 else offset,
+                )
+                + name
+                + extra
+            )
+            if len(chunk) >= 4096:
+                self._out.write(b"".join(chunk))
+                chunk = []
+        if chunk:
+            self._out.write(b"".join(chunk))
+
+        count = len(self._offsets)
+        directory_size = self._out.position - start
+        if count >= MAX16 or start >= MAX32 or directory_size >= MAX32:
+            zip64_start = self._out.position
+            self._out.write(
+                ZIP64_EOCD.pack(
+                    ZIP64_EOCD_SIGNATURE, ZIP64_EOCD.size - 12, MADE_BY_UNIX | VERSION_ZIP64, VERSION_ZIP64,
+                    0, 0, count, count, directory_size, start,
+                )
+                + ZIP64_LOCATOR.pack(ZIP64_LOCATOR_SIGNATURE, 0, zip64_start, 1)
+            )
+        self._out.write(
+            EOCD.pack(
+                EOCD_SIGNATURE, 0, 0, min(count, MAX16), min(count, MAX16),
+                min(directory_size, MAX32), min(start, MAX32), 0,
+            )
+        )
+
+    def _streamed(self, i):
+        return False
+
+    def _begin_stream(self, name):
+        """Start an entry that is deflated block by block and closed by a data descriptor."""
+        self._stream_offset = self._out.position
+        self._local_header(name, 0, 0, 0, streaming=True)
+        self._block = []
+        self._block_bytes = 0
+        self._dictionary = b""
+        self._crc = 0
+        self._compressed = 0
+        self._stream_size = 0
+
+    def _stream(self, data, keep=0):
+        """Add data to the streamed entry, holding back the last `keep` bytes for _end_stream."""
+        self._block.append(data)
+        self._block_bytes += len(data)
+        if self._block_bytes >= STREAM_BLOCK_BYTES + keep:
+            block = b"".join(self._block)
+            self._block = [block[len(block) - keep:]] if keep else []
+            self._block_bytes = keep
+            self._deflate_block(block[:len(block) - keep], last=False)
+
+    def _deflate_block(self, block, last):
+        # CRC runs here, in order; zlib releases the GIL for large buffers.
+        self._crc = zlib.crc32(block, self._crc)
+        self._stream_size += len(block)
+        dictionary = self._dictionary
+        self._dictionary = block[-DICTIONARY_BYTES:] if len(block) >= DICTIONARY_BYTES else (dictionary + block)[-DICTIONARY_BYTES:]
+        for compressed in self._submit(deflate_block, block, dictionary, last, self._level):
+            self._write_compressed(compressed)
+
+    def _write_compressed(self, compressed):
+        self._out.write(compressed)
+        self._compressed += len(compressed)
+
+    def _end_stream(self, tail=None):
+        """Deflate the held-back bytes (or tail in their place) and close the entry."""
+        self._deflate_block(b"".join(self._block) if tail is None else tail, last=True)
+        self._block = []
+        self._block_bytes = 0
+        for compressed in self._drain():
+            self._write_compressed(compressed)
+        self._out.write(
+            DATA_DESCRIPTOR64.pack(DESCRIPTOR_SIGNATURE, self._crc, self._compressed, self._stream_size)
+        )
+        self._offsets.append(self._stream_offset)
+        self._crcs.append(self._crc)
+        self._compressed_sizes.append(self._compressed)
+        self._sizes.append(self._stream_size)
+
+    def _submit(self, func, *args):
+        """Queue a deflate job; returns finished results (oldest first) once too many are waiting."""
+        self._inflight.append(self._pool.submit(func, *args))
+        done = []
+        while len(self._inflight) > self._max_inflight:
+            done.append(self._inflight.popleft().result())
+        return done
+
+    def _drain(self):
+        done = [future.result() for future in self._inflight]
+        self._inflight.clear()
+        return done
+
+    def _finish_entries(self):
+        """Flush pending data into entries before the central directory is written."""
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._finish_entries()
+            self._write_central_directory()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class EmlZipWriter(_ZipWriter):
+    """ZIP with one .eml entry per generated message.
+
+    It is both the byte writer and the index writer for mboxgen.engine:
+    write() collects the current message and add() closes it as an entry,
+    dropping the mbox `From ` envelope line and the separating blank line.
+    Messages are deflated in batches on the thread pool. Once a message
+    passes EML_BATCH_BYTES, the entries before it are written and it is
+    streamed as an entry of its own, so large attachments are never held in
+    memory whole.
+    """
+
+    def __init__(self, path, telemetry=None, workers=None, level=DEFLATE_LEVEL):
+        super().__init__(path, telemetry, workers, level)
+        self._current = []
+        self._current_bytes = 0
+        self._streaming = False
+        self._streamed_entries = set()
+        self._batch = []
+        self._batch_bytes = 0
+        self.count = 0
+
+    def _entry_name(self, i):
+        return EML_NAME_TEMPLATE.format(i + 1)
+
+    def _streamed(self, i):
+        return i in self._streamed_entries
+
+    def write(self, data):
+        self.position += len(data)
+        if self._streaming:
+            # Two bytes are held back so add() can drop the blank separator line.
+            self._stream(data, keep=2)
+            return len(data)
+        self._current.append(data)
+        self._current_bytes += len(data)
+        if self._current_bytes >= EML_BATCH_BYTES:
+            self._start_streaming()
+        return len(data)
+
+    def _start_streaming(self):
+        self._submit_batch()
+        for entries in self._drain():
+            self._write_entries(entries)
+        message = b"".join(self._current)
+        self._current = []
+        self._current_bytes = 0
+        self._streamed_entries.add(len(self._offsets))
+        self._begin_stream(self._entry_name(len(self._offsets)))
+        self._streaming = True
+        self._stream(memoryview(message)[message.find(b"\n") + 1:], keep=2)
+
+    def add(self, offset, length, message_id, thread_id=0, has_attachment=False):
+        self.count += 1
+        if self._streaming:
+            tail = b"".join(self._block)
+            self._end_stream(tail[:-1] if tail.endswith(b"\n\n") else tail)
+            self._streaming = False
+            return
+        message = b"".join(self._current)
+        self._current = []
+        self._current_bytes = 0
+        start = message.find(b"\n") + 1
+        end = len(message) - 1 if message.endswith(b"\n\n") else len(message)
+        self._batch.append(message[start:end])
+        self._batch_bytes += end - start
+        if self._batch_bytes >= EML_BATCH_BYTES:
+            self._submit_batch()
+
+    def _submit_batch(self):
+        if self._batch:
+            batch = self._batch
+            self._batch = []
+            self._batch_bytes = 0
+            for sizes_and_results in self._submit(self._deflate_batch, batch):
+                self._write_entries(sizes_and_results)
+
+    def _deflate_batch(self, batch):
+        return [(len(data), *deflate_entry(data, self._level)) for data in batch]
+
+    def _write_entries(self, entries):
+        for size, crc, compressed in entries:
+            index = len(self._offsets)
+            offset = self._out.position
+            self._local_header(self._entry_name(index), crc, len(compressed), size)
+            self._out.write(compressed)
+            self._offsets.append(offset)
+            self._crcs.append(crc)
+            self._compressed_sizes.append(len(compressed))
+            self._sizes.append(size)
+
+    def _finish_entries(self):
+        self._submit_batch()
+        for entries in self._drain():
+            self._write_entries(entries)
+
+
+class TakeoutZipWriter(_ZipWriter):
+    """Google Takeout-style ZIP: the whole mbox as one streamed, ZIP64 entry.
+
+    Drop-in for emit.BatchWriter: write() takes mbox bytes, and `position`
+    counts them, so index offsets refer to the mbox inside the archive.
+    """
+
+    def __init__(self, path, telemetry=None, workers=None, level=DEFLATE_LEVEL, entry_name=TAKEOUT_MBOX_NAME):
+        super().__init__(path, telemetry, workers, level)
+        self._names.append(entry_name)
+        self._begin_stream(entry_name)
+
+    def _streamed(self, i):
+        return True
+
+    def write(self, data):
+        self.position += len(data)
+        self._stream(data)
+        return len(data)
+
+    def _finish_entries(self):
+        self._end_stream()
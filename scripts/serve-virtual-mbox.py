@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Serve a seeded synthetic .mbox over HTTP (with Range requests) without writing it to disk.
+Usage: python3 serve-virtual-mbox.py <size_mb> [--seed N] [--port 8080] [--workers N] [--mix SHAPES] [--write PATH]
+Example: python3 serve-virtual-mbox.py 1000000 --seed 42 --workers 8
+"""
+
+import argparse
+import shutil
+import sys
+
+from mboxgen import distributions
+from mboxgen import emit
+from mboxgen import engine
+from mboxgen import sinks
+from mboxgen import virtual
+from mboxgen.shapes import format_mix, parse_mix
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a seeded synthetic .mbox over HTTP (with Range requests) without writing it to disk.",
+        epilog="Example: python3 serve-virtual-mbox.py 1000000 --seed 42 --workers 8",
+    )
+    parser.add_argument("size_mb", help="Corpus size in MB")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed; the same seed always serves the same bytes (default: 0)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument(
+        "--segment-mb",
+        type=int,
+        default=virtual.SEGMENT_BYTES // 1024 // 1024,
+        help="Size of the independently generated segments; no message is larger (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-segments",
+        type=int,
+        default=virtual.CACHE_SEGMENTS,
+        help="Generated segments kept in memory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes generating segments, so parallel range readers are served in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--mix",
+        default=None,
+        help='Weighted message shapes, e.g. "plain=70,attachment=30", or a preset such as mime-variety (default: plain)',
+    )
+    parser.add_argument(
+        "--size-profile",
+        default=None,
+        metavar="NAME|PATH",
+        help="Draw body lengths, recipients and attachment counts/sizes from a distributions profile",
+    )
+    parser.add_argument("--body-text", choices=engine.BODY_TEXTS, default="templates", help="Body text source (default: templates)")
+    parser.add_argument("--no-threads", action="store_true", help="Generate standalone emails only")
+    parser.add_argument(
+        "--write",
+        default=None,
+        metavar="PATH",
+        help='Stream the corpus to PATH ("-" for stdout, a pipe or a socket) instead of serving it',
+    )
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+    if args.write:
+        sinks.reserve_stdout(args.write)
+
+    size_profile = None
+    if args.size_profile is not None:
+        try:
+            size_profile = distributions.load_profile(args.size_profile)
+        except (OSError, ValueError) as e:
+            print(f"Error: --size-profile: {e}")
+            sys.exit(1)
+
+    mix = None
+    if args.mix is not None:
+        try:
+            mix = parse_mix(args.mix)
+        except ValueError as e:
+            print(f"Error: --mix: {e}")
+            sys.exit(1)
+    if mix is None and size_profile and "attachments_per_message" in size_profile:
+        mix = {"attachment": 1}
+
+    try:
+        size_mb = int(args.size_mb)
+    except ValueError:
+        print("Error: Size must be a number")
+        sys.exit(1)
+    if size_mb < 1:
+        print("Error: Size must be at least 1 MB")
+        sys.exit(1)
+    if args.segment_mb < 1 or args.cache_segments < 1 or args.workers < 1:
+        print("Error: --segment-mb, --cache-segments and --workers must be at least 1")
+        sys.exit(1)
+
+    corpus = virtual.VirtualCorpus(
+        size_mb * 1024 * 1024,
+        seed=args.seed,
+        segment_bytes=args.segment_mb * 1024 * 1024,
+        cache_segments=args.cache_segments,
+        workers=args.workers,
+        threads=not args.no_threads,
+        mix=mix,
+        profile=size_profile,
+        body_text=args.body_text,
+    )
+    with corpus:
+        plan = corpus.plan
+        print(f"Virtual {size_mb:,}MB .mbox (seed {args.seed}), {plan['segments']:,} segments of {plan['segment_bytes'] / 1024 / 1024:.0f} MB")
+        if mix:
+            print(f"  - Message shapes: {format_mix(mix)}")
+        if size_profile:
+            print(f"  - Size profile: {size_profile['name']}")
+
+        if args.write:
+            try:
+                with corpus.open() as src, emit.BatchWriter(
+                    args.write, corpus.size, compression=sinks.infer_compression(args.write)
+                ) as out:
+                    shutil.copyfileobj(src, out, virtual.SEND_CHUNK_BYTES)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            print(f"\n✅ Wrote {args.write} ({corpus.size / 1024 / 1024:,.2f} MB, {corpus.generated:,} segments generated)")
+            sys.exit(0)
+
+        try:
+            server = virtual.make_server(corpus, args.host, args.port, verbose=args.verbose)
+        except OSError as e:
+            print(f"Error: cannot listen on {args.host}:{args.port}: {e}")
+            sys.exit(1)
+        print(f"\n🌐 Serving http://{args.host}:{server.server_address[1]}/<any path> (ETag {corpus.etag})")
+        print("   Range and x-ms-range requests return 206 with exactly the requested bytes; Ctrl-C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\nStopped ({corpus.generated:,} segments generated)")
+        finally:
+            server.server_close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Upload generated .mbox mailboxes into blob storage and the ingestion queue, N at a time, and measure it.
+Usage: python3 upload-test-mbox-load.py <size_mb> [--mailboxes N] [--concurrency N] [--stand-in] [-- generator options]
+Example: python3 upload-test-mbox-load.py 200 --mailboxes 20 --concurrency 4 --seed 42 -- --mix plain=80,attachment=20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from mboxgen import upload
+from mboxgen.telemetry import Telemetry
+
+
+def print_report(report):
+    print(f"\n✅ Uploaded {len(report['mailboxes'])} mailboxes")
+    print(f"\n   {'mailbox':<16} {'MB':>9} {'blocks':>7} {'seconds':>8} {'MB/s':>7} {'TTFB s':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for mailbox in report["mailboxes"]:
+        latency = mailbox["block_latency"]
+        print(
+            f"   {mailbox['name']:<16} {mailbox['bytes'] / 1024 / 1024:>9,.1f} {mailbox['blocks']:>7,} "
+            f"{mailbox['seconds']:>8.1f} {mailbox['mb_per_s']:>7.1f} {mailbox['ttfb_seconds']:>7.2f} "
+            f"{latency.get('p50_ms', 0):>8.1f} {latency.get('p99_ms', 0):>8.1f}"
+        )
+    print(
+        f"\n   Total: {report['bytes'] / 1024 / 1024:,.1f} MB in {report['blocks']:,} blocks, {report['wall_seconds']:.1f}s "
+        f"({report['mb_per_s']:.1f} MB/s at concurrency {report['concurrency']})"
+    )
+    for label, key in (
+        ("Put Block latency", "block_latency"),
+        ("Time to first byte", "ttfb"),
+        ("Put Block List latency", "commit_latency"),
+        ("Enqueue latency", "enqueue_latency"),
+    ):
+        figures = report[key]
+        print(
+            f"   {label}: p50 {figures['p50_ms']:,.1f} ms, p95 {figures['p95_ms']:,.1f} ms, "
+            f"p99 {figures['p99_ms']:,.1f} ms, max {figures['max_ms']:,.1f} ms"
+        )
+    stages = ", ".join(f"{stage.replace('_', ' ')} {seconds:.1f}s" for stage, seconds in report["stage_seconds"].items())
+    print(f"   Time (all mailboxes): {stages}; bound by the {report['bound_by']}")
+    print(f"   Connections opened: {report['connections']['blob']} blob, {report['connections']['queue']} queue")
+
+
+async def run(args, generator_args, metrics):
+    stand_in = None
+    blob_endpoint, queue_endpoint = args.blob_endpoint, args.queue_endpoint
+    if args.stand_in:
+        stand_in = upload.StandIn()
+        blob_endpoint = queue_endpoint = await stand_in.start()
+        print(f"Stand-in blob and queue endpoint: {blob_endpoint}")
+
+    mailboxes = upload.plan_mailboxes(
+        args.mailboxes, args.size_mb, args.tenants, args.seed, args.generator, generator_args
+    )
+    connections = args.connections or args.concurrency * args.blocks_in_flight
+    client = upload.StorageClient(blob_endpoint, queue_endpoint, connections, args.account, args.account_key)
+    print(
+        f"{len(mailboxes)} mailboxes of {args.size_mb:,} MB, {args.concurrency} at a time, "
+        f"{args.block_mb} MB blocks ({args.blocks_in_flight} in flight per mailbox), {connections} connections per endpoint"
+    )
+
+    def on_chunk(mailbox, index, size, wait, latency):
+        if metrics is not None:
+            record = {
+                "event": "chunk",
+                "mailbox": mailbox["name"],
+                "block": index,
+                "bytes": size,
+                "wait_ms": round(wait * 1000, 3),
+                "latency_ms": round(latency * 1000, 3),
+            }
+            metrics.write(json.dumps(record) + "\n")
+
+    def on_done(stats, done, total):
+        summary = upload.mailbox_summary(stats)
+        print(
+            f"[{done}/{total}] {stats['name']} uploaded ({stats['bytes'] / 1024 / 1024:.1f} MB in {stats['seconds']:.1f}s, "
+            f"{summary['mb_per_s']:.1f} MB/s, TTFB {stats['ttfb_seconds']:.2f}s)"
+        )
+        if metrics is not None:
+            metrics.write(json.dumps({"event": "mailbox", **summary}) + "\n")
+
+    try:
+        results, wall_seconds = await upload.run_uploads(
+            client,
+            mailboxes,
+            args.concurrency,
+            args.block_mb * 1024 * 1024,
+            args.blocks_in_flight,
+            on_chunk,
+            on_done,
+        )
+    finally:
+        client.close()
+        if stand_in is not None:
+            await stand_in.close()
+    report = upload.summarize(results, wall_seconds, args.concurrency, client)
+    if stand_in is not None:
+        report["stand_in"] = {
+            "requests": stand_in.requests,
+            "problems": stand_in.check(results),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # Everything after "--" is passed to the generator.
+    argv = sys.argv[1:]
+    generator_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, generator_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(
+        description="Upload generated .mbox mailboxes into blob storage and the ingestion queue, N at a time, and measure it.",
+        epilog="Options after -- go to the generator. "
+        "Example: python3 upload-test-mbox-load.py 200 --mailboxes 20 --concurrency 4 --seed 42 -- --mix plain=80,attachment=20",
+    )
+    parser.add_argument("size_mb", type=int, help="Size of each mailbox in MB")
+    parser.add_argument("--mailboxes", type=int, default=10, help="Number of mailboxes to upload (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Mailboxes generated and uploaded at once (default: 4)")
+    parser.add_argument("--tenants", type=int, default=1, help="Spread the mailboxes over this many tenant IDs (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible mailbox content (IDs are always new)")
+    parser.add_argument(
+        "--generator",
+        choices=sorted(upload.GENERATORS),
+        default="threaded",
+        help="generate-test-mbox.py (threaded) or generate-test-mbox-with-attachments.py (default: threaded)",
+    )
+    parser.add_argument("--block-mb", type=int, default=upload.BLOCK_BYTES // 1024 // 1024, help="Put Block size (default: %(default)s, as the web app)")
+    parser.add_argument(
+        "--blocks-in-flight",
+        type=int,
+        default=1,
+        help="Concurrent Put Block requests per mailbox (default: 1, block after block like the browser)",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=None,
+        help="Keep-alive connections per endpoint (default: concurrency x blocks in flight)",
+    )
+    parser.add_argument("--blob-endpoint", default=upload.BLOB_ENDPOINT, help="Blob service URL (default: Azurite, %(default)s)")
+    parser.add_argument("--queue-endpoint", default=upload.QUEUE_ENDPOINT, help="Queue service URL (default: Azurite, %(default)s)")
+    parser.add_argument("--account", default=upload.AZURITE_ACCOUNT, help="Storage account name for SharedKey signing (default: Azurite's)")
+    parser.add_argument(
+        "--account-key",
+        default=upload.AZURITE_KEY,
+        help='Storage account key for SharedKey signing (default: Azurite\'s; "" sends unsigned requests)',
+    )
+    parser.add_argument(
+        "--stand-in",
+        action="store_true",
+        help="Upload to an in-process blob and queue stand-in instead, and check what it received",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        metavar="PATH",
+        help='Write JSON lines per block, per mailbox and for the whole run to PATH ("-" for stderr)',
+    )
+    parser.add_argument("--report", default=None, metavar="PATH", help="Also write the final report to PATH as JSON")
+    args = parser.parse_args(argv)
+
+    if args.size_mb < 1:
+        print("Error: Size must be at least 1 MB")
+        sys.exit(1)
+    if min(args.mailboxes, args.concurrency, args.tenants, args.block_mb, args.blocks_in_flight, args.connections or 1) < 1:
+        print("Error: --mailboxes, --concurrency, --tenants, --block-mb, --blocks-in-flight and --connections must be at least 1")
+        sys.exit(1)
+    # Put Block accepts at most 4000 MiB.
+    if args.block_mb > 4000:
+        print("Error: --block-mb must be at most 4000")
+        sys.exit(1)
+
+    metrics = Telemetry.open_metrics(args.metrics)
+    try:
+        report = asyncio.run(run(args, generator_args, metrics))
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+        sys.exit(130)
+    if metrics is not None:
+        metrics.write(json.dumps({"event": "done", **report}) + "\n")
+        if metrics is not sys.stderr:
+            metrics.close()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   Report: {args.report}")
+    if "stand_in" in report:
+        problems = report["stand_in"]["problems"]
+        if problems:
+            print(f"\nError: the stand-in saw {len(problems)} problem(s):")
+            for problem in problems[:20]:
+                print(f"   {problem}")
+            sys.exit(1)
+        print(
+            f"   Stand-in: {len(report['mailboxes'])} blobs committed with the uploaded sizes, "
+            f"{len(report['mailboxes'])} {upload.INGESTION_QUEUE} messages received ({report['stand_in']['requests']:,} requests)"
+        )
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Verify the structure of a generated .mbox file.
+
+Checks for unescaped "From " lines in bodies, missing Message-IDs, MIME
+boundaries that are never opened or closed, and (with the .idx sidecar) that
+every index record matches a message. Prints per-message problems and totals
+to compare with the generator summary and with what MailboxProcessingService
+ingests; exits with code 1 when any problem is found.
+Usage: python3 verify-mbox.py <mbox_file> [--workers N] [--expect-messages N] [--json PATH]
+Example: python3 verify-mbox.py ~/Downloads/test-100mb.mbox
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from mboxgen import index as mbox_index
+from mboxgen import verify
+
+
+def print_report(mbox_file, totals, problems, seconds, max_problems):
+    for number, offset, kind, detail in problems[:max_problems]:
+        suffix = f": {detail}" if detail else ""
+        print(f"   message {number + 1:,} (offset {offset:,}) {kind}{suffix}")
+    if totals["problems"] > max_problems:
+        print(f"   ... {totals['problems'] - max_problems:,} more")
+
+    size_mb = totals["bytes"] / 1024 / 1024
+    icon = "✅" if totals["problems"] == 0 else "❌"
+    print(f"\n{icon} {mbox_file}: {totals['problems']:,} problem(s)")
+    print(f"   Size: {size_mb:.2f} MB")
+    print(f"   Messages: {totals['messages']:,}")
+    print(f"   Multipart messages: {totals['multipart']:,}")
+    print(f"   Messages with attachments: {totals['with_attachments']:,}")
+    print(f"   Replies (In-Reply-To): {totals['replies']:,}")
+    print(f"   Unique Message-IDs: {totals['unique_message_ids']:,} ({totals['duplicate_message_ids']:,} duplicates)")
+    print(f"   Unescaped From lines: {totals['unescaped_from_lines']:,}")
+    if "index_records" in totals:
+        print(f"   Index records: {totals['index_records']:,}")
+    print(f"   Verified in {seconds:.1f}s ({size_mb / max(seconds, 1e-9):.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Verify the structure of a generated .mbox file.",
+        epilog="Example: python3 verify-mbox.py ~/Downloads/test-100mb.mbox",
+    )
+    parser.add_argument("mbox_file", help="Path of the .mbox file to check")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Skip comparing against the <mbox>.idx sidecar even if it exists",
+    )
+    parser.add_argument(
+        "--expect-messages",
+        type=int,
+        default=None,
+        help="Fail unless the file holds exactly this many messages (e.g. the generator's email count)",
+    )
+    parser.add_argument(
+        "--max-problems",
+        type=int,
+        default=50,
+        help="Problems to print (default: 50); all of them are counted",
+    )
+    parser.add_argument("--json", default=None, metavar="PATH", help="Also write totals and problems as JSON")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.mbox_file):
+        print(f"Error: {args.mbox_file} is not a file")
+        sys.exit(1)
+    if args.workers < 1:
+        print("Error: --workers must be at least 1")
+        sys.exit(1)
+
+    index_file = mbox_index.index_path(args.mbox_file)
+    if args.no_index or not os.path.exists(index_file):
+        index_file = None
+
+    print(f"Verifying {args.mbox_file} with {args.workers} worker(s)...")
+    if index_file:
+        print(f"  - Checking against {index_file}")
+    start = time.perf_counter()
+    try:
+        totals, problems = verify.verify(args.mbox_file, args.workers, index_file)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    seconds = time.perf_counter() - start
+
+    if args.expect_messages is not None and totals["messages"] != args.expect_messages:
+        totals["problems"] += 1
+        problems.append(
+            (totals["messages"], totals["bytes"], "message count", f"expected {args.expect_messages:,}")
+        )
+
+    print_report(args.mbox_file, totals, problems, seconds, args.max_problems)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "file": args.mbox_file,
+                    "totals": totals,
+                    "problems": [
+                        {"message": number + 1, "offset": offset, "kind": kind, "detail": detail}
+                        for number, offset, kind, detail in problems
+                    ],
+                },
+                f,
+                indent=2,
+            )
+
+    sys.exit(1 if totals["problems"] else 0)